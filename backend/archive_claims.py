@@ -0,0 +1,153 @@
+"""Move closed claims out of the hot ``claims`` collection.
+
+Approved and rejected claims reviewed more than ``--days`` ago are copied
+into ``claims_archive`` in batches and removed from ``claims``. Per-company
+totals for archived claims are kept in ``claims_archive_stats`` so the
+dashboard does not have to scan the archive.
+
+Usage:
+    python archive_claims.py --days 90 --batch-size 1000
+    python archive_claims.py --rebuild-stats
+"""
+import argparse
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from typed_storage import amount_cents, date_range, to_cents
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+CLOSED_STATUSES = ["approved", "rejected"]
+DEFAULT_ARCHIVE_AFTER_DAYS = int(os.environ.get('CLAIM_ARCHIVE_AFTER_DAYS', '90'))
+DEFAULT_BATCH_SIZE = 1000
+DUPLICATE_KEY_ERROR = 11000
+
+logger = logging.getLogger(__name__)
+
+
+def stats_increments(claims: list) -> list:
+    per_company = {}
+    for claim in claims:
+        stats = per_company.setdefault(claim["company_id"], {
+            "total_claims": 0,
+            "approved_claims": 0,
+            "rejected_claims": 0,
+            "total_claim_amount_cents": 0,
+            "approved_claim_amount_cents": 0,
+        })
+        stats["total_claims"] += 1
+        stats["total_claim_amount_cents"] += amount_cents(claim)
+        if claim["status"] == "approved":
+            stats["approved_claims"] += 1
+            stats["approved_claim_amount_cents"] += amount_cents(claim)
+        else:
+            stats["rejected_claims"] += 1
+    return [
+        UpdateOne({"company_id": company_id}, {"$inc": stats}, upsert=True)
+        for company_id, stats in per_company.items()
+    ]
+
+
+async def archive_closed_claims(db, older_than_days: int = DEFAULT_ARCHIVE_AFTER_DAYS, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    # Claims are copied before they are deleted, so an interrupted run only
+    # leaves duplicates in the archive, which the next run skips.
+    await db.claims_archive.create_index("id", unique=True)
+    cutoff = datetime.now(timezone.utc) - timedelta(days=older_than_days)
+    query = {"status": {"$in": CLOSED_STATUSES}, **date_range("review_date", {"$lt": cutoff})}
+
+    archived = 0
+    while True:
+        batch = await db.claims.find(query, {"_id": 0}).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+
+        try:
+            await db.claims_archive.insert_many(batch, ordered=False)
+        except BulkWriteError as exc:
+            if any(error["code"] != DUPLICATE_KEY_ERROR for error in exc.details["writeErrors"]):
+                raise
+
+        ids = [claim["id"] for claim in batch]
+        result = await db.claims.delete_many({"id": {"$in": ids}, **query})
+        if result.deleted_count < len(batch):
+            # Claims reopened since the batch was read stay hot; drop their
+            # archive copies and leave them out of the totals
+            kept = await db.claims.distinct("id", {"id": {"$in": ids}})
+            await db.claims_archive.delete_many({"id": {"$in": kept}})
+            batch = [claim for claim in batch if claim["id"] not in kept]
+        if batch:
+            await db.claims_archive_stats.bulk_write(stats_increments(batch), ordered=False)
+
+        archived += result.deleted_count
+        logger.info(f"Archived {archived} claims so far")
+    return archived
+
+
+async def rebuild_archive_stats(db) -> int:
+    # Recomputes claims_archive_stats from the archive, e.g. after a run was
+    # interrupted between deleting a batch and recording its totals.
+    totals = await db.claims_archive.aggregate([
+        {"$group": {
+            "_id": "$company_id",
+            "total_claims": {"$sum": 1},
+            "approved_claims": {"$sum": {"$cond": [{"$eq": ["$status", "approved"]}, 1, 0]}},
+            "rejected_claims": {"$sum": {"$cond": [{"$eq": ["$status", "rejected"]}, 1, 0]}},
+            "total_claim_amount_cents": {"$sum": "$amount_cents"},
+            "approved_claim_amount_cents": {"$sum": {"$cond": [{"$eq": ["$status", "approved"]}, "$amount_cents", 0]}},
+            # Claims archived before the storage migration still hold float amounts
+            "total_claim_amount": {"$sum": "$amount"},
+            "approved_claim_amount": {"$sum": {"$cond": [{"$eq": ["$status", "approved"]}, "$amount", 0]}},
+        }},
+    ], allowDiskUse=True).to_list(None)
+
+    await db.claims_archive_stats.delete_many({})
+    if totals:
+        await db.claims_archive_stats.insert_many([
+            {
+                "company_id": row["_id"],
+                "total_claims": row["total_claims"],
+                "approved_claims": row["approved_claims"],
+                "rejected_claims": row["rejected_claims"],
+                "total_claim_amount_cents": row["total_claim_amount_cents"] + to_cents(row["total_claim_amount"]),
+                "approved_claim_amount_cents": row["approved_claim_amount_cents"] + to_cents(row["approved_claim_amount"]),
+            }
+            for row in totals
+        ])
+    return len(totals)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Archive closed claims")
+    parser.add_argument("--days", type=int, default=DEFAULT_ARCHIVE_AFTER_DAYS, help="Archive claims closed more than this many days ago")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--rebuild-stats", action="store_true", help="Recompute archived claim totals and exit")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    try:
+        if args.rebuild_stats:
+            companies = await rebuild_archive_stats(db)
+            logger.info(f"Rebuilt archived claim totals for {companies} companies")
+        else:
+            archived = await archive_closed_claims(db, args.days, args.batch_size)
+            logger.info(f"Archived {archived} claims closed before {args.days} days ago")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    asyncio.run(main())
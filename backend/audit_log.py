@@ -0,0 +1,113 @@
+import asyncio
+import logging
+
+from pymongo.errors import BulkWriteError
+
+DUPLICATE_KEY_ERROR = 11000
+
+logger = logging.getLogger(__name__)
+
+
+class AuditLogWriter:
+    """Buffers audit events in memory and writes them with insert_many.
+
+    Handlers call record(), which never touches the database. A background
+    task flushes the buffer every flush_interval_ms, or sooner once
+    max_batch events are waiting. The buffer holds at most max_buffer
+    events; anything beyond that is dropped and counted.
+
+    Events a flush fails to write go back to the front of the buffer, as
+    far as it has room, and are retried by the next flush. insert_many has
+    given them an _id, so events a failed write did store come back as
+    duplicate keys and are not written twice.
+    """
+
+    def __init__(self, collection, flush_interval_ms: int = 500, max_batch: int = 500, max_buffer: int = 10000):
+        self.collection = collection
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_batch = max_batch
+        self.max_buffer = max_buffer
+        self._buffer = []
+        self._wakeup = None
+        self._task = None
+        self._stopping = False
+        self.flushed_events = 0
+        self.failed_events = 0
+        self.dropped_events = 0
+        self.flushes = 0
+
+    def record(self, event: dict) -> bool:
+        if len(self._buffer) >= self.max_buffer:
+            self.dropped_events += 1
+            if self.dropped_events == 1 or self.dropped_events % 1000 == 0:
+                logger.warning(f"Audit log buffer full, {self.dropped_events} events dropped so far")
+            return False
+        self._buffer.append(event)
+        if len(self._buffer) >= self.max_batch and self._wakeup is not None:
+            self._wakeup.set()
+        return True
+
+    async def flush(self):
+        while self._buffer:
+            batch, self._buffer = self._buffer[:self.max_batch], self._buffer[self.max_batch:]
+            self.flushes += 1
+            try:
+                await self.collection.insert_many(batch, ordered=False)
+                unwritten = []
+            except BulkWriteError as exc:
+                failed = {
+                    error["index"] for error in exc.details.get("writeErrors", [])
+                    if error.get("code") != DUPLICATE_KEY_ERROR
+                }
+                unwritten = [event for index, event in enumerate(batch) if index in failed]
+            except Exception:
+                logger.exception(f"Failed to write {len(batch)} audit events")
+                unwritten = batch
+            self.flushed_events += len(batch) - len(unwritten)
+            if unwritten:
+                self.failed_events += len(unwritten)
+                self._requeue(unwritten)
+                # Retried by the next flush rather than in a tight loop
+                break
+
+    def _requeue(self, events: list):
+        kept = events[:max(self.max_buffer - len(self._buffer), 0)]
+        self._buffer = kept + self._buffer
+        if len(kept) < len(events):
+            self.dropped_events += len(events) - len(kept)
+            logger.warning(f"Audit log buffer full, {len(events) - len(kept)} unwritten events dropped")
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            # Created here so the event belongs to the running loop
+            self._wakeup = asyncio.Event()
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Let an in-flight insert_many finish instead of cancelling it
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    def metrics(self) -> dict:
+        return {
+            "buffered_events": len(self._buffer),
+            "max_buffer": self.max_buffer,
+            "flushed_events": self.flushed_events,
+            "failed_events": self.failed_events,
+            "dropped_events": self.dropped_events,
+            "flushes": self.flushes,
+        }
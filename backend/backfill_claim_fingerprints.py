@@ -0,0 +1,70 @@
+"""Build claim_fingerprints for claims submitted before duplicate detection.
+
+Safe to re-run and to run while the service is up: every claim's
+fingerprint is upserted so that it keeps pointing at the earliest claim
+with that fingerprint, whatever order claims are read in. Claims are read
+in id batches from the hot collection and the archive.
+
+Usage:
+    python backfill_claim_fingerprints.py --batch-size 1000
+"""
+import argparse
+import asyncio
+import logging
+import os
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from claim_fingerprints import backfill_update
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+DEFAULT_BATCH_SIZE = 1000
+CLAIM_COLLECTIONS = ["claims", "claims_archive"]
+FINGERPRINT_PROJECTION = {
+    "_id": 0, "id": 1, "employee_id": 1, "company_id": 1, "claim_type": 1,
+    "amount": 1, "amount_cents": 1, "service_date": 1, "submission_date": 1, "documents": 1,
+}
+
+logger = logging.getLogger(__name__)
+
+
+async def backfill_claim_fingerprints(db, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    backfilled = 0
+    for name in CLAIM_COLLECTIONS:
+        last_id = ""
+        while True:
+            batch = await db[name].find(
+                {"id": {"$gt": last_id}}, FINGERPRINT_PROJECTION
+            ).sort("id", 1).limit(batch_size).to_list(batch_size)
+            if not batch:
+                break
+            last_id = batch[-1]["id"]
+            await db.claim_fingerprints.bulk_write([backfill_update(claim) for claim in batch], ordered=False)
+            backfilled += len(batch)
+            logger.info(f"Fingerprinted {backfilled} claims so far")
+    return backfilled
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Backfill fingerprints of existing claims")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    try:
+        backfilled = await backfill_claim_fingerprints(client[os.environ['DB_NAME']], args.batch_size)
+        logger.info(f"Fingerprinted {backfilled} claims")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    asyncio.run(main())
@@ -0,0 +1,78 @@
+"""Denormalize user names onto employee records and build search_terms.
+
+Safe to re-run: only employees without search_terms are touched, in
+batches keyed by id so the service can stay up while it runs.
+
+Usage:
+    python backfill_employee_search.py --batch-size 1000
+"""
+import argparse
+import asyncio
+import logging
+import os
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+
+from employee_search import employee_search_terms
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+DEFAULT_BATCH_SIZE = 1000
+
+logger = logging.getLogger(__name__)
+
+
+async def backfill_employee_search(db, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    updated = 0
+    last_id = ""
+    while True:
+        batch = await db.employees.find(
+            {"search_terms": {"$exists": False}, "id": {"$gt": last_id}},
+            {"_id": 0, "id": 1, "user_id": 1, "employee_id": 1, "department": 1}
+        ).sort("id", 1).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+        last_id = batch[-1]["id"]
+
+        users = await db.users.find(
+            {"id": {"$in": list({employee["user_id"] for employee in batch})}},
+            {"_id": 0, "id": 1, "name": 1}
+        ).to_list(None)
+        names = {user["id"]: user["name"] for user in users}
+
+        operations = []
+        for employee in batch:
+            employee["name"] = names.get(employee["user_id"])
+            operations.append(UpdateOne(
+                {"id": employee["id"]},
+                {"$set": {"name": employee["name"], "search_terms": employee_search_terms(employee)}}
+            ))
+        await db.employees.bulk_write(operations, ordered=False)
+        updated += len(operations)
+        logger.info(f"Backfilled {updated} employees so far")
+    return updated
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Backfill employee names and search terms")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    try:
+        updated = await backfill_employee_search(client[os.environ['DB_NAME']], args.batch_size)
+        logger.info(f"Backfilled {updated} employees")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    asyncio.run(main())
@@ -0,0 +1,87 @@
+"""Measure how long a worker takes to boot.
+
+Each run is a fresh interpreter that imports server, builds the app with
+create_app() and, with --startup, runs its lifespan startup and shutdown
+against MONGO_URL (connecting, creating indexes, starting background
+tasks). Medians and maxima over the runs are logged, along with the heavy
+modules the import pulled in.
+
+Usage:
+    python benchmark_startup.py --runs 10
+    python benchmark_startup.py --runs 5 --startup
+"""
+import argparse
+import json
+import logging
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+DEFAULT_RUNS = 10
+HEAVY_MODULES = ["pandas", "numpy", "pyarrow", "openpyxl"]
+
+CHILD = """
+import asyncio, json, sys, time
+started = time.perf_counter()
+import server
+imported = time.perf_counter()
+app = server.create_app()
+created = time.perf_counter()
+timings = {"import_ms": (imported - started) * 1000, "create_app_ms": (created - imported) * 1000}
+if sys.argv[1] == "startup":
+    async def boot():
+        async with app.router.lifespan_context(app):
+            return time.perf_counter()
+    booted = asyncio.run(boot())
+    timings["startup_ms"] = (booted - created) * 1000
+timings["heavy_modules"] = [name for name in json.loads(sys.argv[2]) if name in sys.modules]
+print(json.dumps(timings))
+"""
+
+logger = logging.getLogger(__name__)
+
+
+def run_once(startup: bool) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD, "startup" if startup else "import", json.dumps(HEAVY_MODULES)],
+        cwd=ROOT_DIR, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def benchmark(runs: int = DEFAULT_RUNS, startup: bool = False) -> dict:
+    samples = [run_once(startup) for _ in range(runs)]
+    summary = {}
+    for phase in ("import_ms", "create_app_ms", "startup_ms"):
+        values = [sample[phase] for sample in samples if phase in sample]
+        if values:
+            summary[phase] = {"median": round(statistics.median(values), 1), "max": round(max(values), 1)}
+    summary["heavy_modules"] = samples[-1]["heavy_modules"]
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark worker import and startup time")
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS)
+    parser.add_argument("--startup", action="store_true", help="Also run the lifespan against MONGO_URL")
+    args = parser.parse_args()
+
+    summary = benchmark(args.runs, args.startup)
+    for phase in ("import_ms", "create_app_ms", "startup_ms"):
+        if phase in summary:
+            logger.info(f"{phase}: median {summary[phase]['median']} ms, max {summary[phase]['max']} ms")
+    logger.info(f"Heavy modules loaded at import: {', '.join(summary['heavy_modules']) or 'none'}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    main()
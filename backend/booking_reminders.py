@@ -0,0 +1,312 @@
+"""Reminders sent a fixed time (24h, 1h) before each scheduled booking.
+
+One worker at a time is the leader, holding a lease document in
+``scheduler_leases`` that it renews every third of the lease. Only the
+leader keeps a schedule: it loads the bookings whose reminders fall due in
+the next window with one ranged query on the
+``(status, booking_date, booking_time)`` index, pushes them onto a heap
+and sleeps until the earliest one. When less than half a window is left
+loaded, the next window is read.
+
+Creating or cancelling a booking publishes the booking id on the cache
+invalidation bus; the scheduler is registered on the bus like a cache, so
+the leader re-reads just that booking and updates its heap. Cancelled
+entries are dropped lazily when they reach the top of the heap.
+
+A reminder is claimed by adding it to the booking's ``reminders_sent``
+with an update guarded on the booking still being scheduled and the
+reminder not yet sent, so a reminder is delivered at most once even
+across a leader change. A new leader starts ``grace`` seconds in the past
+to pick up reminders that fell due while no one held the lease.
+
+Booking dates and times are wall-clock values in ``tz``.
+"""
+import asyncio
+import heapq
+import logging
+import os
+import socket
+import uuid
+from datetime import date, datetime, time, timedelta, timezone, tzinfo
+from typing import Callable, Dict, Optional
+
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from cache_bus import CLEAR_ALL
+from typed_storage import utc_now
+
+REMINDER_OFFSETS = {"24h": timedelta(hours=24), "1h": timedelta(hours=1)}
+REMINDER_PROJECTION = {
+    "_id": 0, "id": 1, "employee_id": 1, "partner_id": 1, "service_type": 1,
+    "booking_date": 1, "booking_time": 1, "status": 1,
+}
+MAX_CONCURRENT_SENDS = 50
+
+logger = logging.getLogger(__name__)
+
+
+def appointment_time(booking: dict, tz: tzinfo = timezone.utc) -> Optional[datetime]:
+    # Free-form times from partners without slot templates may not parse
+    try:
+        local = datetime.combine(date.fromisoformat(booking["booking_date"]), time.fromisoformat(booking["booking_time"]))
+    except (KeyError, TypeError, ValueError):
+        return None
+    return local.replace(tzinfo=tz).astimezone(timezone.utc)
+
+
+def appointment_range_query(start: datetime, end: datetime, tz: tzinfo = timezone.utc) -> list:
+    # (booking_date, booking_time) between start and end, both inclusive to
+    # the minute, as one index range per local day
+    first, last = start.astimezone(tz), end.astimezone(tz)
+    clauses = []
+    day = first.date()
+    while day <= last.date():
+        times = {}
+        if day == first.date():
+            times["$gte"] = first.strftime("%H:%M")
+        if day == last.date():
+            times["$lte"] = last.strftime("%H:%M")
+        clauses.append({"booking_date": day.isoformat(), **({"booking_time": times} if times else {})})
+        day += timedelta(days=1)
+    return clauses
+
+
+class LoggingNotifier:
+    """Default notifier; replace with one that sends email or push messages."""
+
+    async def notify(self, booking: dict, reminder: str):
+        logger.info(
+            f"Reminder {reminder}: booking {booking['id']} for employee {booking['employee_id']} "
+            f"on {booking['booking_date']} at {booking['booking_time']}"
+        )
+
+
+class ReminderScheduler:
+    def __init__(
+        self,
+        db,
+        notifier,
+        offsets: Dict[str, timedelta] = REMINDER_OFFSETS,
+        window_seconds: float = 300,
+        lease_seconds: float = 30,
+        grace_seconds: float = 120,
+        tz: tzinfo = timezone.utc,
+        name: str = "booking_reminders",
+        clock: Callable[[], datetime] = utc_now
+    ):
+        self.db = db
+        self.notifier = notifier
+        self.offsets = offsets
+        self.window = timedelta(seconds=window_seconds)
+        self.lease = timedelta(seconds=lease_seconds)
+        self.grace = timedelta(seconds=grace_seconds)
+        self.tz = tz
+        self.name = name
+        self.clock = clock
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
+        self.lease_expires = None
+        self._renew_at = None
+        self._loaded_until = None
+        # Heap of (due, booking_id, reminder); _queued holds the live entries
+        self._heap = []
+        self._queued = {}
+        self._wakeup = None
+        self._task = None
+        self._stopping = False
+        self._refreshes = set()
+        self.windows_loaded = 0
+        self.sent = 0
+        self.skipped = 0
+        self.failed = 0
+
+    async def _hold_lease(self, now: datetime) -> bool:
+        # Takes the lease if it is free or expired, or extends our own
+        try:
+            await self.db.scheduler_leases.update_one(
+                {"_id": self.name, "$or": [{"owner": self.owner}, {"expires_at": {"$lte": now}}]},
+                {"$set": {"owner": self.owner, "expires_at": now + self.lease}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            return False
+        return True
+
+    async def _renew(self, now: datetime):
+        self._renew_at = now + self.lease / 3
+        try:
+            held = await self._hold_lease(now)
+        except PyMongoError:
+            logger.exception("Could not renew the booking reminder lease")
+            held = self.is_leader and now < self.lease_expires
+        else:
+            if held:
+                self.lease_expires = now + self.lease
+        if held and not self.is_leader:
+            logger.info(f"Became the booking reminder leader as {self.owner}")
+        elif not held and self.is_leader:
+            logger.info(f"Lost the booking reminder lease as {self.owner}")
+            self._reset()
+        self.is_leader = held
+
+    def _reset(self):
+        self._heap = []
+        self._queued = {}
+        self._loaded_until = None
+
+    def _due_reminders(self, booking: dict, start: datetime, end: datetime) -> set:
+        appointment = appointment_time(booking, self.tz)
+        if appointment is None:
+            return set()
+        return {
+            (appointment - offset, reminder)
+            for reminder, offset in self.offsets.items()
+            if start <= appointment - offset < end
+        }
+
+    def _queue(self, booking_id: str, reminders: set):
+        # Replaces the booking's live reminders; dropped ones stay on the heap
+        # until they surface and are skipped
+        queued = self._queued.pop(booking_id, set())
+        if not reminders:
+            return
+        self._queued[booking_id] = reminders
+        for due, reminder in reminders - queued:
+            heapq.heappush(self._heap, (due, booking_id, reminder))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _load_window(self, start: datetime, end: datetime):
+        clauses = [
+            clause
+            for offset in self.offsets.values()
+            for clause in appointment_range_query(start + offset, end + offset, self.tz)
+        ]
+        bookings = await self.db.bookings.find(
+            {"status": "scheduled", "$or": clauses}, REMINDER_PROJECTION
+        ).to_list(None)
+        for booking in bookings:
+            reminders = self._due_reminders(booking, start, end)
+            if reminders:
+                self._queue(booking["id"], self._queued.get(booking["id"], set()) | reminders)
+        self._loaded_until = end
+        self.windows_loaded += 1
+
+    async def _send(self, booking_id: str, reminder: str):
+        try:
+            booking = await self.db.bookings.find_one_and_update(
+                {"id": booking_id, "status": "scheduled", "reminders_sent": {"$ne": reminder}},
+                {"$addToSet": {"reminders_sent": reminder}},
+                projection=REMINDER_PROJECTION
+            )
+        except PyMongoError:
+            self.failed += 1
+            logger.exception(f"Could not claim reminder {reminder} for booking {booking_id}")
+            return
+        if booking is None:
+            # Cancelled, or sent by a previous leader
+            self.skipped += 1
+            return
+        try:
+            await self.notifier.notify(booking, reminder)
+            self.sent += 1
+        except Exception:
+            self.failed += 1
+            logger.exception(f"Failed to deliver reminder {reminder} for booking {booking_id}")
+
+    async def tick(self) -> datetime:
+        """Renews the lease, loads the next window if needed and sends due
+        reminders. Returns when the next tick is needed."""
+        now = self.clock()
+        if self._renew_at is None or now >= self._renew_at:
+            await self._renew(now)
+        if not self.is_leader:
+            return self._renew_at
+
+        if self._loaded_until is None:
+            self._loaded_until = now - self.grace
+        if self._loaded_until - now < self.window / 2:
+            await self._load_window(self._loaded_until, now + self.window)
+
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            entry_due, booking_id, reminder = heapq.heappop(self._heap)
+            live = self._queued.get(booking_id)
+            if not live or (entry_due, reminder) not in live:
+                continue
+            live.discard((entry_due, reminder))
+            if not live:
+                del self._queued[booking_id]
+            due.append((booking_id, reminder))
+        for i in range(0, len(due), MAX_CONCURRENT_SENDS):
+            await asyncio.gather(*(self._send(*item) for item in due[i:i + MAX_CONCURRENT_SENDS]))
+
+        wake = min(self._renew_at, self._loaded_until - self.window / 2)
+        return min(wake, self._heap[0][0]) if self._heap else wake
+
+    async def refresh(self, booking_id: str):
+        # Reschedules one booking after it was created or cancelled
+        if not self.is_leader or self._loaded_until is None:
+            return
+        booking = await self.db.bookings.find_one({"id": booking_id}, REMINDER_PROJECTION)
+        reminders = set()
+        if booking and booking["status"] == "scheduled":
+            reminders = self._due_reminders(booking, self.clock() - self.grace, self._loaded_until)
+        self._queue(booking_id, reminders)
+
+    def invalidate(self, key: str):
+        # Called by the InvalidationBus with a booking id
+        if key == CLEAR_ALL:
+            self._reset()
+            if self._wakeup is not None:
+                self._wakeup.set()
+            return
+        task = asyncio.get_running_loop().create_task(self.refresh(key))
+        self._refreshes.add(task)
+        task.add_done_callback(self._refreshes.discard)
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                wake = await self.tick()
+            except Exception:
+                logger.exception("Booking reminder tick failed")
+                wake = self.clock() + self.lease / 3
+            timeout = max((wake - self.clock()).total_seconds(), 0)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def start(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        if self.is_leader:
+            # Hand the lease over right away instead of letting it expire
+            await self.db.scheduler_leases.update_one(
+                {"_id": self.name, "owner": self.owner}, {"$set": {"expires_at": self.clock()}}
+            )
+            self.is_leader = False
+            self._reset()
+
+    def metrics(self) -> dict:
+        return {
+            "owner": self.owner,
+            "is_leader": self.is_leader,
+            "loaded_until": self._loaded_until.isoformat() if self._loaded_until else None,
+            "queued": sum(len(reminders) for reminders in self._queued.values()),
+            "windows_loaded": self.windows_loaded,
+            "sent": self.sent,
+            "skipped": self.skipped,
+            "failed": self.failed,
+        }
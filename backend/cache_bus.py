@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+CLEAR_ALL = ""
+
+
+class LocalCache:
+    """Per-process LRU cache with a TTL.
+
+    Cached values are shared between requests and must be treated as
+    read-only. The TTL only bounds staleness when an invalidation is lost;
+    normal writes are propagated through the InvalidationBus.
+
+    Read-through callers take generation(key) before loading and pass it
+    to set(), so a value loaded before an invalidation is never stored
+    after it.
+    """
+
+    def __init__(self, name: str, ttl_seconds: float = 300, max_entries: int = 10000):
+        self.name = name
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self.discarded = 0
+
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def generation(self, key: str) -> tuple:
+        return self._epoch, self._generations.get(key, 0)
+
+    def set(self, key: str, value, generation: tuple = None):
+        if generation is not None and generation != self.generation(key):
+            # Invalidated while the value was being loaded
+            self.discarded += 1
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: str):
+        if key == CLEAR_ALL:
+            self._entries.clear()
+            self._forget_generations()
+        else:
+            self._entries.pop(key, None)
+            self._generations[key] = self._generations.get(key, 0) + 1
+            if len(self._generations) > self.max_entries:
+                self._forget_generations()
+
+    def _forget_generations(self):
+        # A new epoch still fails every load that started before it
+        self._generations.clear()
+        self._epoch += 1
+
+    def metrics(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses, "discarded": self.discarded}
+
+
+class InvalidationBus:
+    """Broadcasts cache invalidations to every worker process on the host.
+
+    Each worker binds a Unix datagram socket named after its pid (and a
+    random suffix, as one process may run several apps) inside a
+    shared directory. publish() drops the key locally and sends a
+    "<cache>\\n<key>" datagram to every other socket in the directory, so a
+    write in one worker is visible to the others as soon as they read
+    their socket.
+    """
+
+    def __init__(self, directory: str, caches: list):
+        self.directory = Path(directory)
+        self.caches = {cache.name: cache for cache in caches}
+        self._socket = None
+        self._path = None
+        self.sent = 0
+        self.received = 0
+        self.dropped = 0
+
+    def start(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._path = self.directory / f"{os.getpid()}-{uuid.uuid4().hex[:8]}.sock"
+        self._path.unlink(missing_ok=True)
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.bind(str(self._path))
+        self._socket.setblocking(False)
+        asyncio.get_running_loop().add_reader(self._socket.fileno(), self._receive)
+
+    def close(self):
+        if self._socket is None:
+            return
+        asyncio.get_running_loop().remove_reader(self._socket.fileno())
+        self._socket.close()
+        self._socket = None
+        self._path.unlink(missing_ok=True)
+
+    def _apply(self, cache_name: str, key: str):
+        cache = self.caches.get(cache_name)
+        if cache is not None:
+            cache.invalidate(key)
+
+    def _receive(self):
+        while True:
+            try:
+                message = self._socket.recv(4096)
+            except BlockingIOError:
+                return
+            cache_name, _, key = message.decode().partition("\n")
+            self._apply(cache_name, key)
+            self.received += 1
+
+    def publish(self, cache_name: str, key: str = CLEAR_ALL):
+        self._apply(cache_name, key)
+        if self._socket is None:
+            return
+        message = f"{cache_name}\n{key}".encode()
+        for peer in self.directory.glob("*.sock"):
+            if peer == self._path:
+                continue
+            try:
+                self._socket.sendto(message, str(peer))
+                self.sent += 1
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Socket left behind by a worker that exited without cleanup
+                peer.unlink(missing_ok=True)
+            except BlockingIOError:
+                # Peer's receive buffer is full; its TTL bounds the staleness
+                self.dropped += 1
+                logger.warning(f"Dropped cache invalidation for {cache_name} to {peer.name}")
+
+    def metrics(self) -> dict:
+        return {
+            "sent": self.sent,
+            "received": self.received,
+            "dropped": self.dropped,
+            "caches": {name: cache.metrics() for name, cache in self.caches.items()},
+        }
@@ -0,0 +1,72 @@
+"""Fingerprints for spotting resubmitted claims.
+
+A claim's fingerprint is a hash of its employee, claim type, amount in
+cents, service date (the submission day when none was given) and the
+hashes of its documents. ``claim_fingerprints`` is keyed by fingerprint
+and points at the earliest claim seen with it; the check and the record
+are one upsert on ``_id``, so two concurrent submissions of the same claim
+cannot both pass as originals. A claim that then fails to be stored
+releases the fingerprint it took.
+"""
+import hashlib
+from datetime import datetime
+from typing import Optional
+
+from pymongo import UpdateOne
+
+from typed_storage import amount_cents, parse_timestamp
+
+
+def document_hash(document: str) -> str:
+    # Documents are data URLs or plain references; only the payload counts
+    if document.startswith("data:"):
+        document = document.split(",", 1)[-1]
+    return hashlib.sha256("".join(document.split()).encode()).hexdigest()
+
+
+def claim_fingerprint(claim: dict) -> str:
+    service_date = claim.get("service_date") or parse_timestamp(claim["submission_date"]).date().isoformat()
+    parts = [
+        claim["employee_id"],
+        claim["claim_type"].strip().lower(),
+        str(amount_cents(claim)),
+        service_date,
+        *sorted({document_hash(document) for document in claim.get("documents") or []}),
+    ]
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+def keep_earliest(claim: dict, submitted: datetime, keep: dict) -> list:
+    # Pipeline update keeping the stored claim while keep holds and
+    # pointing the fingerprint at this claim otherwise
+    fields = {"claim_id": claim["id"], "employee_id": claim["employee_id"], "company_id": claim["company_id"], "submission_date": submitted}
+    return [{"$set": {
+        field: {"$cond": [keep, f"${field}", {"$literal": value}]} for field, value in fields.items()
+    }}]
+
+
+async def record_fingerprint(collection, claim: dict, lookback_start: datetime) -> Optional[dict]:
+    """Records a new claim's fingerprint and returns the earlier claim it
+    duplicates, if one was submitted since lookback_start."""
+    recent = {"$gte": [{"$ifNull": ["$submission_date", None]}, lookback_start]}
+    previous = await collection.find_one_and_update(
+        {"_id": claim_fingerprint(claim)},
+        keep_earliest(claim, parse_timestamp(claim["submission_date"]), recent),
+        upsert=True
+    )
+    if previous is not None and parse_timestamp(previous["submission_date"]) >= lookback_start:
+        return previous
+    return None
+
+
+async def release_fingerprint(collection, claim: dict):
+    # Only while the fingerprint still points at this claim; a stale
+    # pointer it replaced is outside every lookback and not worth restoring
+    await collection.delete_one({"_id": claim_fingerprint(claim), "claim_id": claim["id"]})
+
+
+def backfill_update(claim: dict) -> UpdateOne:
+    # Existing claims arrive in any order; the earliest one wins
+    submitted = parse_timestamp(claim["submission_date"])
+    earlier = {"$and": [{"$gt": ["$submission_date", None]}, {"$lte": ["$submission_date", submitted]}]}
+    return UpdateOne({"_id": claim_fingerprint(claim)}, keep_earliest(claim, submitted, earlier), upsert=True)
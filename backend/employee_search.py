@@ -0,0 +1,45 @@
+"""Normalization and match ordering for the employee directory typeahead.
+
+Names, employee ids and departments are normalized into an employee's
+search_terms, which backs prefix search through the
+(company_id, search_terms) index.
+
+The typeahead is prefix-ordered, not ranked: it reads a bounded window of
+prefix matches in index order and orders only that window by match_order.
+In a large company a closer match beyond the window is not returned until
+the query is typed out further.
+"""
+import re
+import unicodedata
+from typing import List
+
+
+def normalize_search_text(value: str) -> str:
+    # Lowercase, strip accents and keep only [a-z0-9] words joined by spaces
+    decomposed = unicodedata.normalize("NFKD", value or "")
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(re.findall(r"[a-z0-9]+", stripped.lower()))
+
+
+def employee_search_terms(employee: dict) -> List[str]:
+    name = normalize_search_text(employee.get("name"))
+    terms = {name, normalize_search_text(employee.get("employee_id")), normalize_search_text(employee.get("department"))}
+    terms.update(name.split())
+    terms.discard("")
+    return sorted(terms)
+
+
+def match_order(employee: dict, query: str) -> tuple:
+    name = normalize_search_text(employee.get("name"))
+    employee_id = normalize_search_text(employee.get("employee_id"))
+    if query in (name, employee_id):
+        rank = 0
+    elif name.startswith(query):
+        rank = 1
+    elif any(word.startswith(query) for word in name.split()):
+        rank = 2
+    elif employee_id.startswith(query):
+        rank = 3
+    else:
+        rank = 4
+    return (rank, name)
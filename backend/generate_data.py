@@ -0,0 +1,385 @@
+"""Generate a synthetic dataset at production scale for benchmarks.
+
+Writes companies, users, employees, claims, bookings, financials and the
+ledger straight to MongoDB in the stored form server.py expects (BSON
+dates, integer cents, search terms, ledger sequences), using unordered
+insert_many batches from a pool of worker processes.
+
+Distributions:
+    - company sizes are log-normal, so a few large tenants dominate
+    - employee ages are normal around 38, clipped to 21-65
+    - claims arrive uniformly over --years, with a type-dependent
+      log-normal amount; older claims are more likely to be closed
+    - bookings spread from --years ago to 30 days ahead
+    - financials are monthly premiums plus a payout per approved claim
+
+Every company is generated from its own seeded random stream, so the
+output depends only on --seed, --as-of and the size options, not on the
+number of workers. Run it against an empty database and start the server
+afterwards; indexes are built at startup, which is faster than
+maintaining them during the load.
+
+Usage:
+    python generate_data.py --companies 2000 --employees 1000000 --seed 7
+    python generate_data.py --companies 50 --employees 20000 --as-of 2026-01-01 --workers 2
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+import numpy as np
+from dotenv import load_dotenv
+from passlib.context import CryptContext
+from pymongo import MongoClient
+
+from employee_search import employee_search_terms
+from ledger import DEFAULT_CHECKPOINT_INTERVAL
+from pricing import PLAN_BASE_MONTHLY_PREMIUM
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+DEFAULT_BATCH_SIZE = 5000
+GENERATED_PASSWORD = "password123"
+PARTNERS_STREAM = 0
+COMPANY_STREAM = 1
+
+FIRST_NAMES = ["Aarav", "Priya", "Rohan", "Ananya", "Vikram", "Meera", "Arjun", "Kavya", "Rahul", "Isha",
+               "Sanjay", "Divya", "Karan", "Neha", "Amit", "Pooja", "Ravi", "Sneha", "Nikhil", "Lakshmi"]
+LAST_NAMES = ["Sharma", "Iyer", "Patel", "Reddy", "Nair", "Gupta", "Menon", "Rao", "Singh", "Das",
+              "Kulkarni", "Joshi", "Chopra", "Bose", "Pillai", "Mehta", "Verma", "Shetty", "Kapoor", "Mishra"]
+INDUSTRIES = ["Technology", "Manufacturing", "Retail", "Finance", "Healthcare", "Logistics", "Education"]
+DEPARTMENTS = (["Engineering", "Operations", "Sales", "Support", "Finance", "HR", "Marketing"],
+               [0.3, 0.2, 0.15, 0.15, 0.08, 0.05, 0.07])
+DESIGNATIONS = (["Associate", "Analyst", "Senior Associate", "Lead", "Manager", "Director"],
+                [0.3, 0.25, 0.2, 0.12, 0.1, 0.03])
+PLAN_TYPES = (["basic", "premium", "enterprise"], [0.5, 0.35, 0.15])
+# claim type -> (share, median amount, log-normal sigma)
+CLAIM_TYPES = {
+    "medical": (0.55, 8000.0, 1.0),
+    "dental": (0.2, 3000.0, 0.7),
+    "vision": (0.1, 2500.0, 0.5),
+    "wellness": (0.15, 1500.0, 0.6),
+}
+SERVICE_TYPES = ["gym", "mental_health", "elder_care", "video_consultation"]
+# (longitude, latitude) of cities partners cluster around
+PARTNER_CITIES = [(77.59, 12.97), (72.88, 19.08), (77.21, 28.61), (80.27, 13.08), (78.49, 17.39), (73.86, 18.52)]
+BOOKING_TIMES = [f"{hour:02d}:{minute:02d}" for hour in range(9, 18) for minute in (0, 30)]
+
+logger = logging.getLogger(__name__)
+
+
+def random_ids(rng: np.random.Generator, count: int) -> list:
+    raw = rng.bytes(16 * count)
+    return [str(uuid.UUID(bytes=raw[i:i + 16], version=4)) for i in range(0, 16 * count, 16)]
+
+
+def to_datetimes(milliseconds: np.ndarray) -> list:
+    # Naive UTC datetimes, which BSON stores as dates
+    return milliseconds.astype("datetime64[ms]").tolist()
+
+
+def choose(rng: np.random.Generator, options: tuple, count: int) -> np.ndarray:
+    values, weights = options
+    return np.array(values)[rng.choice(len(values), size=count, p=weights)]
+
+
+def company_sizes(seed: int, companies: int, employees: int) -> np.ndarray:
+    weights = np.random.default_rng([seed]).lognormal(mean=0, sigma=1.5, size=companies)
+    return np.maximum((weights / weights.sum() * employees).round().astype(int), 1)
+
+
+def generate_partners(seed: int, count: int, as_of: datetime) -> list:
+    rng = np.random.default_rng([seed, PARTNERS_STREAM])
+    ids = random_ids(rng, count)
+    service_types = rng.choice(SERVICE_TYPES, size=count)
+    cities = rng.integers(len(PARTNER_CITIES), size=count)
+    offsets = rng.normal(scale=0.08, size=(count, 2))
+    partners = []
+    for i in range(count):
+        remote = service_types[i] == "video_consultation"
+        lng, lat = PARTNER_CITIES[cities[i]]
+        partners.append({
+            "id": ids[i],
+            "name": f"{str(service_types[i]).replace('_', ' ').title()} Partner {i}",
+            "service_type": str(service_types[i]),
+            "description": "Synthetic partner",
+            "contact_email": f"partner{i}@example.com",
+            "contact_phone": f"90000{i:05d}",
+            "availability": "Mon-Sat",
+            "pricing": "Covered",
+            "slot_templates": [],
+            "location": None if remote else {"type": "Point", "coordinates": [lng + offsets[i, 0], lat + offsets[i, 1]]},
+            "service_radius_km": None if remote else float(rng.choice([5, 10, 25])),
+            "version": 1,
+            "created_at": as_of - timedelta(days=int(rng.integers(30, 1000))),
+        })
+    return partners
+
+
+def generate_company(settings: dict, index: int, size: int) -> dict:
+    rng = np.random.default_rng([settings["seed"], COMPANY_STREAM, index])
+    as_of = settings["as_of"]
+    as_of_ms = int(as_of.timestamp() * 1000)
+    span_ms = int(settings["years"] * 365.25 * 86400 * 1000)
+    day_ms = 86400 * 1000
+    company_id = random_ids(rng, 1)[0]
+    plan_type = str(choose(rng, PLAN_TYPES, 1)[0])
+    created_ms = as_of_ms - span_ms - int(rng.integers(0, 365)) * day_ms
+
+    company = {
+        "id": company_id,
+        "name": f"{LAST_NAMES[index % len(LAST_NAMES)]} {INDUSTRIES[index % len(INDUSTRIES)]} {index}",
+        "industry": INDUSTRIES[index % len(INDUSTRIES)],
+        "employee_count": size,
+        "contact_email": f"hr@company{index}.example.com",
+        "contact_phone": f"80000{index:05d}",
+        "address": f"{index} Synthetic Road",
+        "plan_type": plan_type,
+        "version": 1,
+        "roster_version": 0,
+        "created_at": to_datetimes(np.array([created_ms]))[0],
+    }
+
+    # Users: one admin, one HR manager, then one per employee
+    user_ids = random_ids(rng, size + 2)
+    first = rng.integers(len(FIRST_NAMES), size=size + 2)
+    last = rng.integers(len(LAST_NAMES), size=size + 2)
+    names = [f"{FIRST_NAMES[f]} {LAST_NAMES[l]}" for f, l in zip(first, last)]
+    roles = ["company_admin", "hr_manager"] + ["employee"] * size
+    user_created = to_datetimes(created_ms + rng.integers(0, as_of_ms - created_ms, size=size + 2))
+    users = [{
+        "id": user_ids[i],
+        "email": f"user{i}@company{index}.example.com",
+        "password": settings["password_hash"],
+        "name": names[i],
+        "role": roles[i],
+        "company_id": company_id,
+        "created_at": user_created[i],
+    } for i in range(size + 2)]
+    hr_user_id = user_ids[1]
+
+    # Employees
+    employee_ids = random_ids(rng, size)
+    ages = np.clip(rng.normal(38, 10, size=size), 21, 65)
+    birth_dates = (np.datetime64(as_of.date()) - (ages * 365.25).astype("timedelta64[D]")).astype(str)
+    joined = np.array(user_created[2:], dtype="datetime64[D]").astype(str)
+    departments = choose(rng, DEPARTMENTS, size)
+    designations = choose(rng, DESIGNATIONS, size)
+    active = rng.random(size) < 0.97
+    employees = []
+    for i in range(size):
+        employee = {
+            "id": employee_ids[i],
+            "user_id": user_ids[i + 2],
+            "company_id": company_id,
+            "name": names[i + 2],
+            "employee_id": f"EMP-{index:05d}-{i:06d}",
+            "department": str(departments[i]),
+            "designation": str(designations[i]),
+            "date_of_joining": str(joined[i]),
+            "date_of_birth": str(birth_dates[i]),
+            "phone": f"7{rng.integers(10**8, 10**9)}",
+            "emergency_contact": f"6{rng.integers(10**8, 10**9)}",
+            "status": "active" if active[i] else "inactive",
+            "version": 1,
+            "created_at": user_created[i + 2],
+        }
+        employee["search_terms"] = employee_search_terms(employee)
+        employees.append(employee)
+
+    # Claims
+    claim_counts = rng.poisson(settings["claims_per_employee"], size=size)
+    claim_count = int(claim_counts.sum())
+    claimants = np.repeat(np.arange(size), claim_counts)
+    type_names = list(CLAIM_TYPES)
+    claim_types = rng.choice(len(type_names), size=claim_count, p=[CLAIM_TYPES[t][0] for t in type_names])
+    medians = np.array([CLAIM_TYPES[t][1] for t in type_names])[claim_types]
+    sigmas = np.array([CLAIM_TYPES[t][2] for t in type_names])[claim_types]
+    amounts_cents = (rng.lognormal(np.log(medians), sigmas) * 100).round().astype(np.int64)
+    submitted_ms = as_of_ms - rng.integers(0, span_ms, size=claim_count)
+    age_days = (as_of_ms - submitted_ms) / day_ms
+    closed = rng.random(claim_count) < 1 - np.exp(-age_days / 7)
+    approved = rng.random(claim_count) < 0.8
+    under_review = rng.random(claim_count) < 0.4
+    statuses = np.where(closed, np.where(approved, "approved", "rejected"), np.where(under_review, "under_review", "submitted"))
+    review_ms = submitted_ms + np.minimum(rng.exponential(5 * day_ms, size=claim_count), as_of_ms - submitted_ms).astype(np.int64)
+    claim_ids = random_ids(rng, claim_count)
+    # Approved claims have been paid: their payout_id is their payout entry's id
+    payouts = np.flatnonzero(statuses == "approved")
+    payout_ids = dict(zip(payouts.tolist(), random_ids(rng, len(payouts))))
+    submitted_at = to_datetimes(submitted_ms)
+    reviewed_at = to_datetimes(review_ms)
+    claims = [{
+        "id": claim_ids[i],
+        "employee_id": employee_ids[claimants[i]],
+        "company_id": company_id,
+        "claim_type": type_names[claim_types[i]],
+        "amount_cents": int(amounts_cents[i]),
+        "description": f"{type_names[claim_types[i]].title()} expenses",
+        "status": str(statuses[i]),
+        "documents": [],
+        "submission_date": submitted_at[i],
+        "review_date": reviewed_at[i] if closed[i] else None,
+        "reviewer_notes": None,
+        "reviewed_by": hr_user_id if closed[i] else None,
+        "payout_id": payout_ids.get(i),
+        "version": 1,
+    } for i in range(claim_count)]
+
+    # Bookings
+    partners = settings["partners"]
+    booking_counts = rng.poisson(settings["bookings_per_employee"], size=size)
+    booking_count = int(booking_counts.sum())
+    bookers = np.repeat(np.arange(size), booking_counts)
+    booked_partners = rng.integers(len(partners), size=booking_count)
+    booking_days = (np.datetime64(as_of.date()) - rng.integers(-30, span_ms // day_ms, size=booking_count).astype("timedelta64[D]"))
+    past = booking_days < np.datetime64(as_of.date())
+    cancelled = rng.random(booking_count) < 0.15
+    booking_statuses = np.where(past, np.where(cancelled, "cancelled", "completed"), "scheduled")
+    booking_times = rng.integers(len(BOOKING_TIMES), size=booking_count)
+    booking_ids = random_ids(rng, booking_count)
+    booking_created = to_datetimes(
+        np.minimum(booking_days.astype("datetime64[ms]").astype(np.int64), as_of_ms) - rng.integers(0, 14 * day_ms, size=booking_count)
+    )
+    bookings = [{
+        "id": booking_ids[i],
+        "employee_id": employee_ids[bookers[i]],
+        "partner_id": partners[booked_partners[i]][0],
+        "service_type": partners[booked_partners[i]][1],
+        "booking_date": str(booking_days[i]),
+        "booking_time": BOOKING_TIMES[booking_times[i]],
+        "status": str(booking_statuses[i]),
+        "seat": None,
+        "notes": None,
+        "version": 1,
+        "created_at": booking_created[i],
+    } for i in range(booking_count)]
+
+    # Financials: a premium on the first of every month plus a payout per
+    # approved claim, numbered in date order like Ledger.post
+    months = np.arange(
+        np.datetime64(company["created_at"], "M") + 1, np.datetime64(as_of.date(), "M") + 1
+    ).astype("datetime64[ms]").astype(np.int64)
+    monthly_premium_cents = int(active.sum()) * int(PLAN_BASE_MONTHLY_PREMIUM[plan_type] * 100)
+    entry_ms = np.concatenate([months, review_ms[payouts]])
+    entry_cents = np.concatenate([np.full(len(months), monthly_premium_cents, dtype=np.int64), amounts_cents[payouts]])
+    is_premium = np.arange(len(entry_ms)) < len(months)
+    order = np.argsort(entry_ms, kind="stable")
+    premium_ids = random_ids(rng, len(months))
+    entry_dates = to_datetimes(entry_ms[order])
+    premiums_total = np.cumsum(np.where(is_premium[order], entry_cents[order], 0))
+    payouts_total = np.cumsum(np.where(is_premium[order], 0, entry_cents[order]))
+    financials, checkpoints = [], []
+    for position, source in enumerate(order):
+        sequence = position + 1
+        premium = bool(is_premium[source])
+        financials.append({
+            "id": premium_ids[source] if premium else payout_ids[payouts[source - len(months)]],
+            "company_id": company_id,
+            "transaction_type": "premium_payment" if premium else "claim_payout",
+            "amount_cents": int(entry_cents[source]),
+            "description": "Monthly premium" if premium else "Claim payout",
+            "transaction_date": entry_dates[position],
+            "reference_id": None if premium else claim_ids[payouts[source - len(months)]],
+            "sequence": sequence,
+        })
+        if sequence % DEFAULT_CHECKPOINT_INTERVAL == 0:
+            checkpoints.append({
+                "company_id": company_id,
+                "sequence": sequence,
+                "total_premiums_cents": int(premiums_total[position]),
+                "total_payouts_cents": int(payouts_total[position]),
+                "transaction_date": entry_dates[position],
+            })
+    ledger_accounts = [{"company_id": company_id, "sequence": len(financials)}]
+
+    return {
+        "companies": [company],
+        "users": users,
+        "employees": employees,
+        "claims": claims,
+        "bookings": bookings,
+        "financials": financials,
+        "ledger_checkpoints": checkpoints,
+        "ledger_accounts": ledger_accounts,
+    }
+
+
+def write_documents(db, documents: dict, batch_size: int) -> dict:
+    for name, rows in documents.items():
+        for i in range(0, len(rows), batch_size):
+            db[name].insert_many(rows[i:i + batch_size], ordered=False)
+    return {name: len(rows) for name, rows in documents.items()}
+
+
+def write_company(settings: dict, index: int, size: int) -> dict:
+    # Runs in a worker process with a client of its own
+    client = MongoClient(settings["mongo_url"])
+    try:
+        documents = generate_company(settings, index, size)
+        return write_documents(client[settings["db_name"]], documents, settings["batch_size"])
+    finally:
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic dataset")
+    parser.add_argument("--companies", type=int, default=100)
+    parser.add_argument("--employees", type=int, default=50000, help="Total employees across all companies")
+    parser.add_argument("--claims-per-employee", type=float, default=4.0)
+    parser.add_argument("--bookings-per-employee", type=float, default=3.0)
+    parser.add_argument("--partners", type=int, default=500)
+    parser.add_argument("--years", type=float, default=2.0, help="History covered by claims and bookings")
+    parser.add_argument("--as-of", type=date.fromisoformat, default=date.today(), help="Generated data ends on this date (YYYY-MM-DD)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    as_of = datetime.combine(args.as_of, datetime.min.time(), tzinfo=timezone.utc)
+    partners = generate_partners(args.seed, args.partners, as_of)
+    with MongoClient(os.environ['MONGO_URL']) as client:
+        client[os.environ['DB_NAME']].wellness_partners.insert_many(partners, ordered=False)
+
+    settings = {
+        "mongo_url": os.environ['MONGO_URL'],
+        "db_name": os.environ['DB_NAME'],
+        "seed": args.seed,
+        "as_of": as_of,
+        "years": args.years,
+        "claims_per_employee": args.claims_per_employee,
+        "bookings_per_employee": args.bookings_per_employee,
+        "partners": [(partner["id"], partner["service_type"]) for partner in partners],
+        # One shared hash; bcrypt per generated user would dominate the run
+        "password_hash": CryptContext(schemes=["bcrypt"]).hash(GENERATED_PASSWORD),
+        "batch_size": args.batch_size,
+    }
+    sizes = company_sizes(args.seed, args.companies, args.employees)
+    totals = {"wellness_partners": len(partners)}
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        # Largest companies first so one big tenant does not finish last alone
+        futures = [pool.submit(write_company, settings, int(index), int(sizes[index])) for index in np.argsort(-sizes)]
+        for done, future in enumerate(as_completed(futures), start=1):
+            for name, count in future.result().items():
+                totals[name] = totals.get(name, 0) + count
+            if done % 10 == 0 or done == len(futures):
+                written = sum(totals.values())
+                logger.info(f"{done}/{len(futures)} companies, {written} documents, {written / (time.perf_counter() - started):.0f} docs/s")
+
+    logger.info(f"Generated {sum(totals.values())} documents with seed {args.seed}: {totals}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    main()
@@ -0,0 +1,122 @@
+import asyncio
+import contextvars
+import time
+from collections import Counter
+
+import pymongo
+from pymongo.errors import BulkWriteError, DuplicateKeyError, ExecutionTimeout, WriteError
+
+from load_control import request_deadline
+
+DUPLICATE_KEY_ERROR = 11000
+EXCEEDED_TIME_LIMIT = 50
+
+
+def batch_size_bucket(size: int) -> int:
+    # Power-of-two histogram buckets: 1, 2, 4, 8, ...
+    return 1 << (size - 1).bit_length()
+
+
+def write_error_for(error: dict) -> Exception:
+    if error.get("code") == DUPLICATE_KEY_ERROR:
+        return DuplicateKeyError(error.get("errmsg"), error.get("code"), error)
+    return WriteError(error.get("errmsg"), error.get("code"), error)
+
+
+class InsertBatcher:
+    """Coalesces concurrent single-document inserts into insert_many calls.
+
+    The first insert for a collection opens a window of window_ms; every
+    insert for that collection arriving inside the window joins the same
+    unordered insert_many. A batch is sent early once it reaches max_batch.
+    Each caller gets its own outcome: the inserted _id, or the per-document
+    write error (DuplicateKeyError for unique index violations) so callers
+    can handle it exactly as they would for insert_one.
+
+    The insert_many runs under the loosest request_deadline among the
+    callers still waiting, and without one if any of them has none, so a
+    request about to expire cannot fail the others' inserts. Each caller
+    stops waiting at its own deadline with ExecutionTimeout; its document
+    may still be stored by the batch.
+    """
+
+    def __init__(self, window_ms: float = 2, max_batch: int = 500):
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._pending = {}
+        self._timers = {}
+        self._inflight = set()
+        self.batches = 0
+        self.documents = 0
+        self.batch_sizes = Counter()
+
+    async def insert(self, collection, document: dict):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        key = collection.full_name
+        if key not in self._pending:
+            self._pending[key] = (collection, [])
+            self._timers[key] = loop.call_later(self.window, self._dispatch, key)
+        deadline = request_deadline.get()
+        items = self._pending[key][1]
+        items.append((document, future, deadline))
+        if len(items) >= self.max_batch:
+            self._timers[key].cancel()
+            self._dispatch(key)
+        if deadline is None:
+            return await future
+        try:
+            return await asyncio.wait_for(future, max(deadline - time.monotonic(), 0))
+        except asyncio.TimeoutError:
+            raise ExecutionTimeout("Insert did not complete before the request deadline", EXCEEDED_TIME_LIMIT)
+
+    def _dispatch(self, key: str):
+        self._timers.pop(key, None)
+        collection, items = self._pending.pop(key)
+        # A fresh context, so the batch does not inherit the pymongo.timeout()
+        # of whichever caller happened to dispatch it
+        task = asyncio.get_running_loop().create_task(self._write(collection, items), context=contextvars.Context())
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    async def _write(self, collection, items: list):
+        self.batches += 1
+        self.documents += len(items)
+        self.batch_sizes[batch_size_bucket(len(items))] += 1
+
+        deadlines = [deadline for _, future, deadline in items if not future.done()]
+        timeout = None
+        if deadlines and None not in deadlines:
+            timeout = max(max(deadlines) - time.monotonic(), 0.001)
+        errors = {}
+        try:
+            with pymongo.timeout(timeout):
+                await collection.insert_many([document for document, _, _ in items], ordered=False)
+        except BulkWriteError as exc:
+            errors = {error["index"]: write_error_for(error) for error in exc.details.get("writeErrors", [])}
+        except Exception as exc:
+            errors = {index: exc for index in range(len(items))}
+
+        for index, (document, future, _) in enumerate(items):
+            # The caller may have gone away (e.g. a cancelled request)
+            if future.done():
+                continue
+            if index in errors:
+                future.set_exception(errors[index])
+            else:
+                future.set_result(document["_id"])
+
+    async def drain(self):
+        for key in list(self._pending):
+            self._timers[key].cancel()
+            self._dispatch(key)
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+
+    def metrics(self) -> dict:
+        return {
+            "batches": self.batches,
+            "documents": self.documents,
+            "average_batch_size": self.documents / self.batches if self.batches else 0,
+            "batch_size_histogram": {str(bucket): count for bucket, count in sorted(self.batch_sizes.items())},
+        }
@@ -0,0 +1,241 @@
+"""Running-balance ledger over the append-only ``financials`` collection.
+
+Every posted entry gets a per-company ``sequence`` from
+``ledger_accounts``. Balances are never stored apart from the entries they
+sum: every ``checkpoint_interval`` entries the totals up to a sequence are
+written to ``ledger_checkpoints``, and a balance, current or as of a past
+date, is the nearest earlier checkpoint plus a scan of the entries after
+it. A post interrupted after taking its sequence leaves a gap in the
+numbering, not a wrong total.
+
+Usage:
+    python ledger.py --rebuild
+    python ledger.py --rebuild --company-id <company id>
+"""
+import argparse
+import asyncio
+import logging
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import DESCENDING, ReturnDocument, UpdateOne
+
+from typed_storage import amount_cents, date_range, from_cents, money_document, parse_timestamp, running_total_cents, utc_now
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+DEFAULT_CHECKPOINT_INTERVAL = int(os.environ.get('LEDGER_CHECKPOINT_INTERVAL', '500'))
+REBUILD_BATCH_SIZE = 1000
+
+# Transaction type -> running total it adds to, kept in integer cents
+TOTAL_FIELDS = {
+    "premium_payment": "total_premiums_cents",
+    "claim_payout": "total_payouts_cents",
+}
+
+logger = logging.getLogger(__name__)
+
+
+def empty_totals() -> dict:
+    return {"sequence": 0, "total_premiums_cents": 0, "total_payouts_cents": 0}
+
+
+def stored_totals(document: dict) -> dict:
+    # Account or checkpoint totals, including pre-migration float totals
+    return {
+        "sequence": document["sequence"],
+        "total_premiums_cents": running_total_cents(document, "total_premiums"),
+        "total_payouts_cents": running_total_cents(document, "total_payouts"),
+    }
+
+
+def add_entry(totals: dict, entry: dict) -> dict:
+    field = TOTAL_FIELDS.get(entry["transaction_type"])
+    if field:
+        totals[field] += amount_cents(entry)
+    return totals
+
+
+def claim_payout(claim: dict, entry_id: str) -> dict:
+    # The claim_payout entry owed for an approved claim, keyed by reference_id
+    return {
+        "id": entry_id,
+        "company_id": claim["company_id"],
+        "transaction_type": "claim_payout",
+        "amount": from_cents(amount_cents(claim)),
+        "description": f"Payout for claim {claim['id']}",
+        "reference_id": claim["id"],
+    }
+
+
+def balance_view(company_id: str, totals: dict, as_of: Optional[datetime] = None) -> dict:
+    premiums, payouts = totals["total_premiums_cents"], totals["total_payouts_cents"]
+    return {
+        "company_id": company_id,
+        "as_of": as_of.isoformat() if as_of else None,
+        "sequence": totals["sequence"],
+        "total_premiums": from_cents(premiums),
+        "total_payouts": from_cents(payouts),
+        "net_balance": from_cents(premiums - payouts),
+    }
+
+
+class Ledger:
+    """Posts financial entries and answers balance queries for a company.
+
+    Ledger order is sequence order. An entry's transaction_date is taken
+    after its sequence is assigned, so dates follow sequences up to the
+    interleaving of concurrent posts.
+    """
+
+    def __init__(self, db, checkpoint_interval: int = DEFAULT_CHECKPOINT_INTERVAL):
+        self.db = db
+        self.checkpoint_interval = checkpoint_interval
+
+    async def post(self, entry: dict) -> dict:
+        # entry is a Financial dump; it is stored with amount_cents
+        entry = money_document(entry)
+        account = await self.db.ledger_accounts.find_one_and_update(
+            {"company_id": entry["company_id"]},
+            {"$inc": {"sequence": 1}},
+            projection={"_id": 0},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+
+        entry = {**entry, "sequence": account["sequence"], "transaction_date": utc_now()}
+        await self.db.financials.insert_one(dict(entry))
+        # Checkpoint one interval behind, so entries that took their
+        # sequence just before this one have been inserted
+        if account["sequence"] % self.checkpoint_interval == 0 and account["sequence"] > self.checkpoint_interval:
+            await self.checkpoint(entry["company_id"], account["sequence"] - self.checkpoint_interval)
+        return entry
+
+    async def checkpoint(self, company_id: str, sequence: int):
+        previous = await self.db.ledger_checkpoints.find_one(
+            {"company_id": company_id, "sequence": {"$lte": sequence}},
+            {"_id": 0},
+            sort=[("sequence", DESCENDING)]
+        )
+        totals, last_date = await self.totals_after(company_id, previous, {"sequence": {"$lte": sequence}})
+        if previous:
+            last_date = max(filter(None, [last_date, parse_timestamp(previous["transaction_date"])]))
+        totals["sequence"] = sequence
+        await self.db.ledger_checkpoints.update_one(
+            {"company_id": company_id, "sequence": sequence},
+            {"$set": {**totals, "transaction_date": last_date}},
+            upsert=True
+        )
+
+    async def totals_after(self, company_id: str, checkpoint: Optional[dict], query: dict) -> tuple:
+        # The checkpoint's totals plus the entries after it matching query,
+        # and the latest transaction_date among those entries
+        totals = stored_totals(checkpoint) if checkpoint else empty_totals()
+        match = {"company_id": company_id, **query}
+        if checkpoint:
+            match["sequence"] = {**match.get("sequence", {}), "$gt": checkpoint["sequence"]}
+        rows = await self.db.financials.aggregate([
+            {"$match": match},
+            {"$group": {
+                "_id": "$transaction_type",
+                "amount_cents": {"$sum": "$amount_cents"},
+                "amount": {"$sum": "$amount"},
+                "last": {"$max": "$sequence"},
+                "last_date": {"$max": "$transaction_date"},
+            }},
+        ]).to_list(None)
+        last_date = None
+        for row in rows:
+            # Sums of pre-migration float amounts are converted once per type
+            cents = row["amount_cents"] + amount_cents({"amount": row["amount"]})
+            add_entry(totals, {"transaction_type": row["_id"], "amount_cents": cents})
+            totals["sequence"] = max(totals["sequence"], row["last"] or 0)
+            if row["last_date"] is not None:
+                row_date = parse_timestamp(row["last_date"])
+                last_date = max(last_date, row_date) if last_date else row_date
+        return totals, last_date
+
+    async def current_balance(self, company_id: str) -> dict:
+        checkpoint = await self.db.ledger_checkpoints.find_one(
+            {"company_id": company_id}, {"_id": 0}, sort=[("sequence", DESCENDING)]
+        )
+        totals, _ = await self.totals_after(company_id, checkpoint, {})
+        return balance_view(company_id, totals)
+
+    async def balance_as_of(self, company_id: str, as_of: datetime) -> dict:
+        # Entries dated up to and including as_of count. A checkpoint's
+        # transaction_date is the latest date among the entries it covers.
+        checkpoint = await self.db.ledger_checkpoints.find_one(
+            {"company_id": company_id, **date_range("transaction_date", {"$lte": as_of})},
+            {"_id": 0},
+            sort=[("sequence", DESCENDING)]
+        )
+        totals, _ = await self.totals_after(company_id, checkpoint, date_range("transaction_date", {"$lte": as_of}))
+        return balance_view(company_id, totals, as_of)
+
+
+async def rebuild_ledger(db, checkpoint_interval: int = DEFAULT_CHECKPOINT_INTERVAL, company_id: Optional[str] = None) -> int:
+    # Renumbers entries in (transaction_date, id) order and recomputes
+    # checkpoints and account sequences. Needed once for financials written
+    # before the ledger existed. Run it while no financials are being
+    # posted.
+    company_ids = [company_id] if company_id else await db.financials.distinct("company_id")
+    for current in company_ids:
+        totals = empty_totals()
+        checkpoints = []
+        renumbered = []
+        cursor = db.financials.find(
+            {"company_id": current},
+            {"_id": 0, "id": 1, "transaction_type": 1, "amount": 1, "amount_cents": 1, "transaction_date": 1}
+        ).sort([("transaction_date", 1), ("id", 1)])
+        async for entry in cursor:
+            add_entry(totals, entry)
+            totals["sequence"] += 1
+            renumbered.append(UpdateOne({"id": entry["id"]}, {"$set": {"sequence": totals["sequence"]}}))
+            if totals["sequence"] % checkpoint_interval == 0:
+                checkpoints.append({"company_id": current, **totals, "transaction_date": entry["transaction_date"]})
+            if len(renumbered) >= REBUILD_BATCH_SIZE:
+                await db.financials.bulk_write(renumbered, ordered=False)
+                renumbered = []
+        if renumbered:
+            await db.financials.bulk_write(renumbered, ordered=False)
+
+        await db.ledger_checkpoints.delete_many({"company_id": current})
+        if checkpoints:
+            await db.ledger_checkpoints.insert_many(checkpoints)
+        await db.ledger_accounts.replace_one(
+            {"company_id": current}, {"company_id": current, "sequence": totals["sequence"]}, upsert=True
+        )
+        logger.info(f"Rebuilt ledger for company {current}: {totals['sequence']} entries")
+    return len(company_ids)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Maintain the financials running-balance ledger")
+    parser.add_argument("--rebuild", action="store_true", help="Renumber entries and recompute checkpoints and totals")
+    parser.add_argument("--company-id", help="Only rebuild this company's ledger")
+    parser.add_argument("--checkpoint-interval", type=int, default=DEFAULT_CHECKPOINT_INTERVAL)
+    args = parser.parse_args()
+    if not args.rebuild:
+        parser.error("nothing to do, pass --rebuild")
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    try:
+        companies = await rebuild_ledger(db, args.checkpoint_interval, args.company_id)
+        logger.info(f"Rebuilt ledgers for {companies} companies")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    asyncio.run(main())
@@ -0,0 +1,186 @@
+"""Request deadlines, per-class concurrency limits and adaptive load shedding.
+
+Every API request is assigned a route class (e.g. auth, reads, writes,
+analytics). A class admits a bounded number of requests at a time;
+further requests wait in a FIFO queue. The request's deadline starts when
+it arrives, so time spent queued counts against it, and the remaining
+budget is applied to all of its MongoDB operations through
+``pymongo.timeout()``, which sends it to the server as ``maxTimeMS``. The
+deadline itself is published in ``request_deadline`` for work done on the
+request's behalf outside its task, such as a coalesced insert.
+
+Shedding follows CoDel: a class becomes overloaded once queued requests
+have waited longer than ``queue_target_ms`` for a whole
+``queue_interval_ms``. While overloaded, requests that cannot be admitted
+immediately are rejected with 503 and Retry-After instead of queueing, so
+a slow database produces fast failures rather than an ever-growing
+backlog. The class recovers as soon as a request is admitted quickly
+again.
+"""
+import asyncio
+import contextvars
+import json
+import math
+import time
+from collections import deque
+from typing import Callable, List, Optional
+
+import pymongo
+
+# time.monotonic() deadline of the request being handled, if any
+request_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+
+
+class RouteClass:
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int,
+        deadline_ms: float,
+        queue_target_ms: float = 50,
+        queue_interval_ms: float = 500,
+        max_queue: int = None
+    ):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.deadline = deadline_ms / 1000
+        self.queue_target = queue_target_ms / 1000
+        self.queue_interval = queue_interval_ms / 1000
+        self.max_queue = max_queue if max_queue is not None else 4 * max_concurrency
+        self.in_flight = 0
+        self.overloaded = False
+        self._above_target_since = None
+        self._waiters = deque()
+        self.admitted = 0
+        self.shed = 0
+        self.timeouts = 0
+
+    @property
+    def retry_after(self) -> int:
+        return max(math.ceil(self.queue_interval), 1)
+
+    def _record_wait(self, waited: float):
+        now = time.monotonic()
+        if waited < self.queue_target:
+            self._above_target_since = None
+            self.overloaded = False
+        elif self._above_target_since is None:
+            self._above_target_since = now
+        elif now - self._above_target_since >= self.queue_interval:
+            self.overloaded = True
+
+    async def acquire(self, deadline: float) -> bool:
+        arrived = time.monotonic()
+        if self.in_flight < self.max_concurrency and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            self._record_wait(0)
+            return True
+        if self.overloaded or len(self._waiters) >= self.max_queue:
+            self.shed += 1
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            # release() hands its slot to the waiter, so in_flight is unchanged
+            await asyncio.wait_for(waiter, timeout=max(deadline - arrived, 0))
+        except asyncio.TimeoutError:
+            self._discard(waiter)
+            self.shed += 1
+            return False
+        except asyncio.CancelledError:
+            # A slot handed over just before the request was cancelled is passed on
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                self._discard(waiter)
+            raise
+        self.admitted += 1
+        self._record_wait(time.monotonic() - arrived)
+        return True
+
+    def _discard(self, waiter):
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def metrics(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "deadline_ms": self.deadline * 1000,
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "overloaded": self.overloaded,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "timeouts": self.timeouts,
+        }
+
+
+class LoadController:
+    def __init__(self, route_classes: List[RouteClass], classify: Callable[[str, str], str]):
+        self.route_classes = {route_class.name: route_class for route_class in route_classes}
+        self.classify = classify
+
+    def route_class(self, method: str, path: str) -> RouteClass:
+        return self.route_classes[self.classify(method, path)]
+
+    def record_timeout(self, scope: dict):
+        name = scope.get("state", {}).get("route_class")
+        if name in self.route_classes:
+            self.route_classes[name].timeouts += 1
+
+    def metrics(self) -> dict:
+        return {name: route_class.metrics() for name, route_class in self.route_classes.items()}
+
+
+class LoadSheddingMiddleware:
+    """ASGI middleware applying a LoadController to every /api request."""
+
+    def __init__(self, app, controller: LoadController, prefix: str = "/api"):
+        self.app = app
+        self.controller = controller
+        self.prefix = prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.prefix):
+            await self.app(scope, receive, send)
+            return
+
+        route_class = self.controller.route_class(scope["method"], scope["path"])
+        deadline = time.monotonic() + route_class.deadline
+        if not await route_class.acquire(deadline):
+            await self._reject(send, route_class)
+            return
+
+        scope.setdefault("state", {})["route_class"] = route_class.name
+        token = request_deadline.set(deadline)
+        try:
+            with pymongo.timeout(max(deadline - time.monotonic(), 0.001)):
+                await self.app(scope, receive, send)
+        finally:
+            request_deadline.reset(token)
+            route_class.release()
+
+    async def _reject(self, send, route_class: RouteClass):
+        body = json.dumps({"detail": "Server is overloaded, retry later"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(route_class.retry_after).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
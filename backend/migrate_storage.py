@@ -0,0 +1,148 @@
+"""Rewrite stored timestamps as BSON dates and amounts as integer cents.
+
+Runs while the service is up. Each collection is walked in ``_id`` order
+in batches, and the position reached is saved in ``storage_migrations``
+after every batch, so an interrupted run resumes where it stopped. Every
+field is converted by its own update guarded on the value that was read;
+if the service rewrote the field in the meantime it already stored the
+typed form and the update simply matches nothing.
+
+Money is converted with ``$inc`` into ``<field>_cents`` rather than
+``$set``, so running totals that the service keeps incrementing
+(ledger accounts, archived claim stats) are folded in without losing
+concurrent increments.
+
+Usage:
+    python migrate_storage.py
+    python migrate_storage.py --collections claims financials --batch-size 500 --pause-ms 50
+    python migrate_storage.py --restart
+"""
+import argparse
+import asyncio
+import logging
+import os
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+
+from typed_storage import parse_timestamp, to_cents
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_PAUSE_MS = 0
+
+# collection -> (ISO string timestamp fields, float money fields)
+TYPED_FIELDS = {
+    "users": (["created_at"], []),
+    "companies": (["created_at"], []),
+    "employees": (["created_at"], []),
+    "wellness_partners": (["created_at"], []),
+    "bookings": (["created_at"], []),
+    "claims": (["submission_date", "review_date"], ["amount"]),
+    "claims_archive": (["submission_date", "review_date"], ["amount"]),
+    "claims_archive_stats": ([], ["total_claim_amount", "approved_claim_amount"]),
+    "financials": (["transaction_date"], ["amount"]),
+    "ledger_accounts": ([], ["total_premiums", "total_payouts"]),
+    "ledger_checkpoints": (["transaction_date"], ["total_premiums", "total_payouts"]),
+    "roster_changes": (["timestamp"], []),
+    "audit_log": (["timestamp"], []),
+    "report_jobs": (["created_at", "completed_at"], []),
+}
+
+logger = logging.getLogger(__name__)
+
+
+def legacy_query(date_fields: list, money_fields: list) -> dict:
+    return {"$or": [{field: {"$type": "string"}} for field in date_fields]
+                   + [{field: {"$type": "number"}} for field in money_fields]}
+
+
+def field_updates(document: dict, date_fields: list, money_fields: list) -> list:
+    updates = []
+    for field in date_fields:
+        value = document.get(field)
+        if not isinstance(value, str):
+            continue
+        try:
+            typed = parse_timestamp(value)
+        except ValueError:
+            logger.warning(f"Leaving unparseable {field} {value!r} on document {document['_id']}")
+            continue
+        updates.append(UpdateOne({"_id": document["_id"], field: value}, {"$set": {field: typed}}))
+    for field in money_fields:
+        value = document.get(field)
+        if isinstance(value, (int, float)):
+            updates.append(UpdateOne(
+                {"_id": document["_id"], field: value},
+                {"$inc": {f"{field}_cents": to_cents(value)}, "$unset": {field: ""}}
+            ))
+    return updates
+
+
+async def migrate_collection(db, name: str, batch_size: int = DEFAULT_BATCH_SIZE, pause_ms: float = DEFAULT_PAUSE_MS) -> int:
+    date_fields, money_fields = TYPED_FIELDS[name]
+    progress = await db.storage_migrations.find_one({"_id": name}) or {}
+    if progress.get("done"):
+        return 0
+
+    projection = {field: 1 for field in date_fields + money_fields}
+    query = legacy_query(date_fields, money_fields)
+    last_id = progress.get("last_id")
+    converted = progress.get("converted", 0)
+    while True:
+        batch_query = {"$and": [query, {"_id": {"$gt": last_id}}]} if last_id is not None else query
+        batch = await db[name].find(batch_query, projection).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+
+        updates = [update for document in batch for update in field_updates(document, date_fields, money_fields)]
+        if updates:
+            result = await db[name].bulk_write(updates, ordered=False)
+            converted += result.modified_count
+        last_id = batch[-1]["_id"]
+        await db.storage_migrations.update_one(
+            {"_id": name}, {"$set": {"last_id": last_id, "converted": converted}}, upsert=True
+        )
+        logger.info(f"{name}: {converted} fields converted so far")
+        if pause_ms:
+            await asyncio.sleep(pause_ms / 1000)
+
+    await db.storage_migrations.update_one({"_id": name}, {"$set": {"done": True}}, upsert=True)
+    return converted
+
+
+async def remaining_legacy(db, name: str) -> int:
+    return await db[name].count_documents(legacy_query(*TYPED_FIELDS[name]))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Migrate stored timestamps and amounts to typed storage")
+    parser.add_argument("--collections", nargs="+", choices=sorted(TYPED_FIELDS), default=list(TYPED_FIELDS))
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--pause-ms", type=float, default=DEFAULT_PAUSE_MS, help="Sleep between batches to limit load")
+    parser.add_argument("--restart", action="store_true", help="Forget saved progress and scan from the start")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    try:
+        if args.restart:
+            await db.storage_migrations.delete_many({"_id": {"$in": args.collections}})
+        for name in args.collections:
+            converted = await migrate_collection(db, name, args.batch_size, args.pause_ms)
+            remaining = await remaining_legacy(db, name)
+            logger.info(f"{name}: converted {converted} fields, {remaining} documents still untyped")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    asyncio.run(main())
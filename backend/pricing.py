@@ -0,0 +1,161 @@
+from collections import OrderedDict
+from datetime import date
+from typing import Optional
+
+import numpy as np
+
+# Monthly premium per covered employee before age loading
+PLAN_BASE_MONTHLY_PREMIUM = {
+    "basic": 1200.0,
+    "premium": 2400.0,
+    "enterprise": 3600.0,
+}
+
+# Band i covers ages [AGE_BAND_EDGES[i], AGE_BAND_EDGES[i + 1])
+AGE_BAND_EDGES = np.array([0, 26, 36, 46, 56, 66])
+AGE_BAND_FACTORS = np.array([0.8, 1.0, 1.25, 1.6, 2.1, 2.8])
+# Employees with a missing or malformed date_of_birth are priced in this band
+UNKNOWN_AGE_BAND = 1
+
+ROSTER_PROJECTION = {"_id": 0, "id": 1, "date_of_birth": 1}
+
+
+def parse_birth_dates(values: list) -> np.ndarray:
+    try:
+        return np.array(values, dtype="datetime64[D]")
+    except (ValueError, TypeError):
+        parsed = []
+        for value in values:
+            try:
+                parsed.append(np.datetime64(value, "D"))
+            except (ValueError, TypeError):
+                parsed.append(np.datetime64("NaT", "D"))
+        return np.array(parsed, dtype="datetime64[D]")
+
+
+def years_before(as_of: date, years: int) -> date:
+    try:
+        return as_of.replace(year=as_of.year - years)
+    except ValueError:
+        # as_of is Feb 29 and the target year is not a leap year
+        return as_of.replace(year=as_of.year - years, day=28)
+
+
+def age_bands(birth_dates: np.ndarray, as_of: date) -> np.ndarray:
+    # Someone is at least N years old iff they were born on or before the
+    # date N years before as_of, so banding is one searchsorted against the
+    # band cutoff dates instead of computing every age.
+    cutoffs = np.array([years_before(as_of, int(edge)) for edge in AGE_BAND_EDGES[::-1]], dtype="datetime64[D]")
+    bands = len(AGE_BAND_EDGES) - np.searchsorted(cutoffs, birth_dates, side="left") - 1
+    unknown = np.isnat(birth_dates) | (bands < 0)
+    return np.where(unknown, UNKNOWN_AGE_BAND, bands)
+
+
+class RosterSnapshot:
+    # Band assignment of every active employee at a given roster_version
+    def __init__(self, roster_version: int, as_of: date, member_bands: dict):
+        self.roster_version = roster_version
+        self.as_of = as_of
+        self.member_bands = member_bands
+        self.band_counts = np.bincount(
+            np.fromiter(member_bands.values(), dtype=np.int64, count=len(member_bands)),
+            minlength=len(AGE_BAND_FACTORS)
+        )
+
+    def apply(self, changes: list):
+        # Only an employee's last change in the window counts: their old
+        # band is removed once and their final state, if active, added.
+        # Replaying a change is therefore idempotent.
+        latest = {change["employee_id"]: change for change in changes}
+        for employee_id in latest:
+            previous = self.member_bands.pop(employee_id, None)
+            if previous is not None:
+                self.band_counts[previous] -= 1
+        upserts = [c for c in latest.values() if c["action"] != "delete" and c.get("status") == "active"]
+        new_bands = age_bands(parse_birth_dates([c.get("date_of_birth") for c in upserts]), self.as_of)
+        for change, band in zip(upserts, new_bands.tolist()):
+            self.member_bands[change["employee_id"]] = band
+            self.band_counts[band] += 1
+        self.roster_version = changes[-1]["roster_version"]
+
+
+class PricingEngine:
+    """Prices a company's active roster by age band and plan tier.
+
+    The band assignment of the roster is cached per company together with
+    the company's roster_version. When the roster changes, only the
+    roster_changes entries newer than the cached version are replayed; a
+    full reload is needed only on a cache miss, a new pricing day, or a gap
+    in the change log.
+    """
+
+    def __init__(self, db, max_companies: int = 1024):
+        self.db = db
+        self.max_companies = max_companies
+        self._snapshots = OrderedDict()
+
+    async def _load_snapshot(self, company_id: str, roster_version: int, as_of: date) -> RosterSnapshot:
+        employees = await self.db.employees.find(
+            {"company_id": company_id, "status": "active"}, ROSTER_PROJECTION
+        ).to_list(None)
+        bands = age_bands(parse_birth_dates([e.get("date_of_birth") for e in employees]), as_of)
+        return RosterSnapshot(roster_version, as_of, dict(zip((e["id"] for e in employees), bands.tolist())))
+
+    async def _refresh_snapshot(self, snapshot: RosterSnapshot, company_id: str, roster_version: int) -> bool:
+        changes = await self.db.roster_changes.find(
+            {"company_id": company_id, "roster_version": {"$gt": snapshot.roster_version, "$lte": roster_version}},
+            {"_id": 0}
+        ).sort("roster_version", 1).to_list(None)
+        # A writer bumps roster_version before logging its change, so a
+        # short read means the log is still catching up.
+        if len(changes) != roster_version - snapshot.roster_version:
+            return False
+        snapshot.apply(changes)
+        return True
+
+    async def snapshot(self, company: dict, as_of: date) -> RosterSnapshot:
+        company_id = company["id"]
+        roster_version = company.get("roster_version", 0)
+        snapshot = self._snapshots.get(company_id)
+
+        fresh = snapshot is not None and snapshot.as_of == as_of and (
+            snapshot.roster_version == roster_version
+            or (snapshot.roster_version < roster_version
+                and await self._refresh_snapshot(snapshot, company_id, roster_version))
+        )
+        if not fresh:
+            snapshot = await self._load_snapshot(company_id, roster_version, as_of)
+
+        self._snapshots[company_id] = snapshot
+        self._snapshots.move_to_end(company_id)
+        while len(self._snapshots) > self.max_companies:
+            self._snapshots.popitem(last=False)
+        return snapshot
+
+    async def quote(self, company: dict, plan_type: Optional[str] = None, as_of: Optional[date] = None) -> dict:
+        plan_type = plan_type or company["plan_type"]
+        as_of = as_of or date.today()
+        snapshot = await self.snapshot(company, as_of)
+
+        band_premiums = snapshot.band_counts * AGE_BAND_FACTORS * PLAN_BASE_MONTHLY_PREMIUM[plan_type]
+        upper_edges = [int(edge) - 1 for edge in AGE_BAND_EDGES[1:]] + [None]
+        monthly_premium = round(float(band_premiums.sum()), 2)
+        return {
+            "company_id": company["id"],
+            "plan_type": plan_type,
+            "roster_version": snapshot.roster_version,
+            "as_of": as_of.isoformat(),
+            "employee_count": int(snapshot.band_counts.sum()),
+            "monthly_premium": monthly_premium,
+            "annual_premium": round(monthly_premium * 12, 2),
+            "bands": [
+                {
+                    "min_age": int(AGE_BAND_EDGES[i]),
+                    "max_age": upper_edges[i],
+                    "factor": float(AGE_BAND_FACTORS[i]),
+                    "employees": int(snapshot.band_counts[i]),
+                    "monthly_premium": round(float(band_premiums[i]), 2),
+                }
+                for i in range(len(AGE_BAND_FACTORS))
+            ],
+        }
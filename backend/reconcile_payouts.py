@@ -0,0 +1,206 @@
+"""Match approved claims against their claim_payout ledger entries.
+
+One pass over approved claims, hot and archived, in id batches: each batch
+fetches its payouts with a single ``reference_id $in`` query on the
+``claim_payout_reference`` index. A second pass over the payouts, in
+``_id`` batches, looks up the claims they reference the same way.
+Memory stays at one batch however many claims there are. Mismatches are:
+
+- ``missing``: an approved claim without a payout
+- ``amount``: payouts adding up to a different amount than the claim
+- ``duplicate``: more than one payout for a claim
+- ``orphan``: a payout whose claim is not approved, or does not exist
+
+With ``--repair``, missing payouts of claims reviewed more than
+``--settle-minutes`` ago are posted through the ledger. The other kinds
+need a person to decide and are only reported.
+
+Usage:
+    python reconcile_payouts.py --output mismatches.csv
+    python reconcile_payouts.py --company-id <company id> --repair
+"""
+import argparse
+import asyncio
+import csv
+import logging
+import os
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Optional
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import DuplicateKeyError
+
+from ledger import Ledger, claim_payout
+from typed_storage import amount_cents, parse_timestamp, utc_now
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_SETTLE_MINUTES = 10
+CLAIM_COLLECTIONS = ["claims", "claims_archive"]
+CLAIM_PROJECTION = {"_id": 0, "id": 1, "company_id": 1, "amount": 1, "amount_cents": 1, "review_date": 1, "payout_id": 1}
+PAYOUT_PROJECTION = {"id": 1, "company_id": 1, "reference_id": 1, "amount": 1, "amount_cents": 1}
+MISMATCH_FIELDS = ["kind", "company_id", "claim_id", "payout_ids", "claim_amount_cents", "payout_amount_cents"]
+
+logger = logging.getLogger(__name__)
+
+
+def mismatch(kind: str, company_id: str, claim_id: Optional[str], payouts: list, claim_cents: Optional[int] = None) -> dict:
+    return {
+        "kind": kind,
+        "company_id": company_id,
+        "claim_id": claim_id,
+        "payout_ids": [payout.get("id") for payout in payouts],
+        "claim_amount_cents": claim_cents,
+        "payout_amount_cents": sum(amount_cents(payout) for payout in payouts),
+    }
+
+
+def claim_mismatches(claim: dict, payouts: list) -> list:
+    claim_cents = amount_cents(claim)
+    if not payouts:
+        return [mismatch("missing", claim["company_id"], claim["id"], payouts, claim_cents)]
+    found = []
+    if len(payouts) > 1:
+        found.append(mismatch("duplicate", claim["company_id"], claim["id"], payouts, claim_cents))
+    if sum(amount_cents(payout) for payout in payouts) != claim_cents:
+        found.append(mismatch("amount", claim["company_id"], claim["id"], payouts, claim_cents))
+    return found
+
+
+async def approved_claim_batches(db, batch_size: int, company_id: Optional[str]):
+    base = {"status": "approved", **({"company_id": company_id} if company_id else {})}
+    for name in CLAIM_COLLECTIONS:
+        last_id = ""
+        while True:
+            batch = await db[name].find(
+                {**base, "id": {"$gt": last_id}}, CLAIM_PROJECTION
+            ).sort("id", 1).limit(batch_size).to_list(batch_size)
+            if not batch:
+                break
+            last_id = batch[-1]["id"]
+            yield name, batch
+
+
+async def payout_batches(db, batch_size: int, company_id: Optional[str]):
+    query = {"transaction_type": "claim_payout", **({"company_id": company_id} if company_id else {})}
+    last_id = None
+    while True:
+        page = {**query, "_id": {"$gt": last_id}} if last_id is not None else query
+        batch = await db.financials.find(page, PAYOUT_PROJECTION).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+        last_id = batch[-1]["_id"]
+        yield batch
+
+
+async def repair_missing_payout(collection, ledger: Ledger, claim: dict) -> bool:
+    # Claims approved before payouts were posted on approval get their
+    # payout_id here, so neither a later approval nor a concurrent repair
+    # pays them again
+    payout_id = claim.get("payout_id")
+    if payout_id is None:
+        payout_id = str(uuid.uuid4())
+        result = await collection.update_one({"id": claim["id"], "payout_id": None}, {"$set": {"payout_id": payout_id}})
+        if result.modified_count == 0:
+            return False
+    try:
+        await ledger.post(claim_payout(claim, payout_id))
+    except DuplicateKeyError:
+        # Posted since this batch was read; the unique financials.id index
+        # keeps it to one payout
+        return False
+    return True
+
+
+async def reconcile_payouts(
+    db,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    company_id: Optional[str] = None,
+    on_mismatch: Callable[[dict], None] = lambda found: None,
+    repair_before: Optional[datetime] = None,
+    ledger: Optional[Ledger] = None
+) -> dict:
+    """Reports every mismatch to on_mismatch and returns counts per kind.
+
+    Missing payouts of claims reviewed before repair_before are posted.
+    """
+    ledger = ledger or Ledger(db)
+    counts = Counter()
+
+    async for name, claims in approved_claim_batches(db, batch_size, company_id):
+        counts["claims"] += len(claims)
+        payouts = defaultdict(list)
+        async for payout in db.financials.find(
+            {"transaction_type": "claim_payout", "reference_id": {"$in": [claim["id"] for claim in claims]}},
+            PAYOUT_PROJECTION
+        ):
+            payouts[payout["reference_id"]].append(payout)
+        for claim in claims:
+            for found in claim_mismatches(claim, payouts[claim["id"]]):
+                counts[found["kind"]] += 1
+                on_mismatch(found)
+                reviewed = claim.get("review_date")
+                if found["kind"] == "missing" and repair_before and reviewed and parse_timestamp(reviewed) < repair_before:
+                    if await repair_missing_payout(db[name], ledger, claim):
+                        counts["repaired"] += 1
+
+    async for payouts in payout_batches(db, batch_size, company_id):
+        counts["payouts"] += len(payouts)
+        references = [payout["reference_id"] for payout in payouts if payout.get("reference_id")]
+        approved = set()
+        for name in CLAIM_COLLECTIONS:
+            approved.update(await db[name].distinct("id", {"id": {"$in": references}, "status": "approved"}))
+        for payout in payouts:
+            if payout.get("reference_id") not in approved:
+                counts["orphan"] += 1
+                on_mismatch(mismatch("orphan", payout["company_id"], payout.get("reference_id"), [payout]))
+
+    return dict(counts)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Reconcile approved claims with claim payouts")
+    parser.add_argument("--company-id", help="Only reconcile this company")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--output", type=Path, help="Write mismatches to this CSV file")
+    parser.add_argument("--repair", action="store_true", help="Post missing payouts")
+    parser.add_argument("--settle-minutes", type=float, default=DEFAULT_SETTLE_MINUTES,
+                        help="Leave claims reviewed more recently than this to the API")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    output = open(args.output, "w", newline="") if args.output else None
+    try:
+        writer = csv.DictWriter(output, MISMATCH_FIELDS) if output else None
+        if writer:
+            writer.writeheader()
+
+        def report(found: dict):
+            if writer:
+                writer.writerow({**found, "payout_ids": " ".join(filter(None, found["payout_ids"]))})
+            else:
+                logger.warning(f"{found['kind']} payout for claim {found['claim_id']}: {found}")
+
+        repair_before = utc_now() - timedelta(minutes=args.settle_minutes) if args.repair else None
+        counts = await reconcile_payouts(
+            client[os.environ['DB_NAME']], args.batch_size, args.company_id, report, repair_before
+        )
+        logger.info(f"Reconciled payouts: {counts}")
+    finally:
+        if output:
+            output.close()
+        client.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    asyncio.run(main())
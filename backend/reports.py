@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from datetime import date, datetime, time, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from pymongo import MongoClient
+
+from typed_storage import date_range
+
+# pandas is imported where frames are built, inside the report workers, so
+# importing this module from the API does not pay for it
+if TYPE_CHECKING:
+    import pandas as pd
+CLAIM_COLLECTIONS = ["claims", "claims_archive"]
+REPORT_TYPES = ["claims_by_department", "wellness_utilization", "premium_vs_payout"]
+REPORT_FORMATS = {
+    "xlsx": ("openpyxl", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "parquet": ("pyarrow", "application/vnd.apache.parquet"),
+    "csv": (None, "text/csv"),
+}
+CURSOR_BATCH_SIZE = 5000
+EMPLOYEE_ID_CHUNK = 10000
+
+
+def format_available(fmt: str) -> bool:
+    module = REPORT_FORMATS[fmt][0]
+    if module is None:
+        return True
+    try:
+        __import__(module)
+    except ImportError:
+        return False
+    return True
+
+
+def cache_key(report_type: str, fmt: str, company_id: str, params: dict, watermark: dict) -> str:
+    payload = json.dumps([report_type, fmt, company_id, params, watermark], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+async def data_watermark(db, report_type: str, company_id: str) -> dict:
+    # Changes whenever a source document is inserted, deleted or updated:
+    # counts move on insert/delete and the version sum moves on every update.
+    async def collection_mark(collection, match: dict) -> list:
+        rows = await collection.aggregate([
+            {"$match": match},
+            {"$group": {"_id": None, "count": {"$sum": 1}, "versions": {"$sum": {"$ifNull": ["$version", 1]}}}},
+        ]).to_list(1)
+        return [rows[0]["count"], rows[0]["versions"]] if rows else [0, 0]
+
+    company = await db.companies.find_one({"id": company_id}, {"_id": 0, "roster_version": 1})
+    mark = {"roster_version": (company or {}).get("roster_version", 0)}
+    # Archived claims are part of every claim report, so moving a claim
+    # into the archive changes the mark as well
+    if report_type == "claims_by_department":
+        for name in CLAIM_COLLECTIONS:
+            mark[name] = await collection_mark(db[name], {"company_id": company_id})
+        # Departments change without a roster change; every employee write
+        # advances its version
+        mark["employees"] = await collection_mark(db.employees, {"company_id": company_id})
+    elif report_type == "wellness_utilization":
+        employee_ids = await db.employees.distinct("id", {"company_id": company_id})
+        mark["bookings"] = await collection_mark(db.bookings, {"employee_id": {"$in": employee_ids}})
+    elif report_type == "premium_vs_payout":
+        for name in CLAIM_COLLECTIONS:
+            mark[name] = await collection_mark(db[name], {"company_id": company_id, "status": "approved"})
+        mark["financials"] = await collection_mark(db.financials, {"company_id": company_id})
+    return mark
+
+
+# Everything below runs inside the report process pool and uses a
+# synchronous client of its own.
+def stream_frame(collection, query: dict, columns: list) -> pd.DataFrame:
+    import pandas as pd
+    projection = {"_id": 0, **{column: 1 for column in columns}}
+    cursor = collection.find(query, projection, batch_size=CURSOR_BATCH_SIZE)
+    return pd.DataFrame.from_records(cursor, columns=columns)
+
+
+def date_range_query(field: str, params: dict) -> dict:
+    bounds = {}
+    if params.get("start_date"):
+        bounds["$gte"] = datetime.combine(date.fromisoformat(params["start_date"]), time.min, tzinfo=timezone.utc)
+    if params.get("end_date"):
+        # Include the whole end day
+        bounds["$lte"] = datetime.combine(date.fromisoformat(params["end_date"]), time.max, tzinfo=timezone.utc)
+    return date_range(field, bounds) if bounds else {}
+
+
+def amount_frame(collection, query: dict, columns: list) -> pd.DataFrame:
+    import pandas as pd
+    # Amounts are stored as integer cents; unmigrated documents still hold
+    # a float "amount"
+    frame = stream_frame(collection, query, columns + ["amount", "amount_cents"])
+    cents = pd.to_numeric(frame["amount_cents"]).fillna(pd.to_numeric(frame["amount"]) * 100)
+    frame["amount"] = cents.round() / 100
+    return frame.drop(columns="amount_cents")
+
+
+def claim_frame(db, query: dict, columns: list) -> pd.DataFrame:
+    import pandas as pd
+    # Hot and archived claims, as /api/claims?include_archived=true lists them
+    return pd.concat([amount_frame(db[name], query, columns) for name in CLAIM_COLLECTIONS], ignore_index=True)
+
+
+def month_column(values: pd.Series) -> pd.Series:
+    import pandas as pd
+    # BSON dates and pre-migration ISO strings
+    return pd.to_datetime(values, utc=True, format="ISO8601").dt.strftime("%Y-%m")
+
+
+def claims_by_department(db, company_id: str, params: dict) -> pd.DataFrame:
+    claims = claim_frame(
+        db,
+        {"company_id": company_id, **date_range_query("submission_date", params)},
+        ["employee_id", "status"]
+    )
+    employees = stream_frame(db.employees, {"company_id": company_id}, ["id", "department"])
+    merged = claims.merge(employees, left_on="employee_id", right_on="id", how="left")
+    merged["department"] = merged["department"].fillna("Unknown")
+    return (
+        merged.groupby(["department", "status"])
+        .agg(claims=("amount", "size"), total_amount=("amount", "sum"))
+        .reset_index()
+    )
+
+
+def wellness_utilization(db, company_id: str, params: dict) -> pd.DataFrame:
+    import pandas as pd
+    employee_ids = db.employees.distinct("id", {"company_id": company_id})
+    date_query = {}
+    if params.get("start_date") or params.get("end_date"):
+        # booking_date is a plain YYYY-MM-DD string
+        date_query = {"booking_date": {
+            key: value for key, value in (("$gte", params.get("start_date")), ("$lte", params.get("end_date"))) if value
+        }}
+    frames = [
+        stream_frame(
+            db.bookings,
+            {"employee_id": {"$in": employee_ids[i:i + EMPLOYEE_ID_CHUNK]}, **date_query},
+            ["partner_id", "service_type", "status"]
+        )
+        for i in range(0, len(employee_ids), EMPLOYEE_ID_CHUNK)
+    ]
+    bookings = pd.concat(frames) if frames else pd.DataFrame(columns=["partner_id", "service_type", "status"])
+    partners = stream_frame(
+        db.wellness_partners, {"id": {"$in": bookings["partner_id"].unique().tolist()}}, ["id", "name"]
+    )
+    merged = bookings.merge(partners, left_on="partner_id", right_on="id", how="left")
+    merged["name"] = merged["name"].fillna("Unknown")
+    return (
+        merged.groupby(["name", "service_type", "status"])
+        .size()
+        .reset_index(name="bookings")
+        .rename(columns={"name": "partner"})
+    )
+
+
+def premium_vs_payout(db, company_id: str, params: dict) -> pd.DataFrame:
+    import pandas as pd
+    financials = amount_frame(
+        db.financials,
+        {"company_id": company_id, **date_range_query("transaction_date", params)},
+        ["transaction_type", "transaction_date"]
+    )
+    claims = claim_frame(
+        db,
+        {"company_id": company_id, "status": "approved", **date_range_query("review_date", params)},
+        ["review_date"]
+    )
+    financials["month"] = month_column(financials["transaction_date"])
+    claims["month"] = month_column(claims["review_date"])
+    by_type = financials.pivot_table(index="month", columns="transaction_type", values="amount", aggfunc="sum", fill_value=0)
+    report = pd.DataFrame({
+        "premiums": by_type.get("premium_payment", 0),
+        "payouts": by_type.get("claim_payout", 0),
+    }, index=by_type.index)
+    report = report.join(claims.groupby("month")["amount"].sum().rename("approved_claims"), how="outer").fillna(0)
+    report["net_balance"] = report["premiums"] - report["payouts"]
+    return report.reset_index().rename(columns={"index": "month"})
+
+
+REPORT_BUILDERS = {
+    "claims_by_department": claims_by_department,
+    "wellness_utilization": wellness_utilization,
+    "premium_vs_payout": premium_vs_payout,
+}
+
+
+def build_report(mongo_url: str, db_name: str, report_type: str, fmt: str, company_id: str, params: dict, path: str) -> str:
+    client = MongoClient(mongo_url)
+    try:
+        return render_report(client[db_name], report_type, fmt, company_id, params, path)
+    finally:
+        client.close()
+
+
+def render_report(db, report_type: str, fmt: str, company_id: str, params: dict, path: str) -> str:
+    frame = REPORT_BUILDERS[report_type](db, company_id, params)
+
+    # Write under a temporary name so readers never see a partial file
+    tmp_path = f"{path}.{os.getpid()}.tmp.{fmt}"
+    if fmt == "xlsx":
+        frame.to_excel(tmp_path, index=False, sheet_name=report_type[:31], engine="openpyxl")
+    elif fmt == "parquet":
+        frame.to_parquet(tmp_path, index=False)
+    else:
+        frame.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def evict_cached_reports(directory: Path, max_files: int):
+    files = sorted(
+        (p for p in directory.iterdir() if p.is_file() and ".tmp." not in p.name),
+        key=lambda p: p.stat().st_mtime
+    )
+    for stale in files[:max(len(files) - max_files, 0)]:
+        stale.unlink(missing_ok=True)
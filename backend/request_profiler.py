@@ -0,0 +1,235 @@
+"""Sampling profiler for individual live requests.
+
+A profiled request is recorded by a background thread that wakes every
+``interval_ms``. If the request's coroutine is running on the event loop
+at that moment, the sample is its Python stack (pydantic validation, JSON
+encoding, bcrypt and so on). Otherwise the request is suspended, and the
+sample is its await chain, walked from the coroutine through ``cr_await``
+and ending in an ``[await]`` frame, so time spent waiting on Motor or
+on a thread pool shows up as well.
+
+The sampler needs the GIL, so it wakes less often while the loop is busy
+with CPU work. Every sample is therefore weighted by the time since the
+previous one, and on-CPU and waiting time are sums of those weights.
+
+Profiles are written in the folded stack format ("frame;frame;frame
+microseconds" per line), which flamegraph.pl, inferno and speedscope read,
+next to a JSON summary. The directory keeps the newest ``max_files`` profiles.
+"""
+import asyncio
+import json
+import logging
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PROFILE_SUFFIX = ".folded"
+SUMMARY_SUFFIX = ".json"
+AWAIT_FRAME = "[await]"
+
+
+def frame_label(code) -> str:
+    return f"{code.co_qualname} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+
+
+def await_stack(awaitable) -> List[str]:
+    # Outermost first; ends where the chain reaches a future or a C awaitable
+    stack = []
+    while awaitable is not None:
+        frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+        if frame is None:
+            break
+        stack.append(frame_label(frame.f_code))
+        awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None)
+    stack.append(AWAIT_FRAME)
+    return stack
+
+
+class Recording:
+    def __init__(self, method: str, path: str, thread_id: int):
+        self.id = f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')}-{uuid.uuid4().hex[:8]}"
+        self.method = method
+        self.path = path
+        self.thread_id = thread_id
+        self.frame = None
+        self.coro = None
+        # Stack -> sampled microseconds
+        self.stacks = Counter()
+        self.samples = 0
+        self.running_us = 0
+        self.waiting_us = 0
+        self.started = time.perf_counter()
+        self.wall_ms = None
+        self.status = None
+
+    def sample(self, thread_frame, weight_us: int):
+        # Called from the sampler thread; the event loop may move on while
+        # the stack is walked, so a torn sample is simply dropped
+        try:
+            stack = []
+            frame = thread_frame
+            while frame is not None and frame is not self.frame:
+                stack.append(frame_label(frame.f_code))
+                frame = frame.f_back
+            if frame is not None:
+                self.stacks[";".join(reversed(stack))] += weight_us
+                self.running_us += weight_us
+            elif self.coro is not None:
+                self.stacks[";".join(await_stack(self.coro))] += weight_us
+                self.waiting_us += weight_us
+            else:
+                return
+            self.samples += 1
+        except (AttributeError, ValueError):
+            pass
+
+
+class SamplingProfiler:
+    def __init__(self, directory: Path, interval_ms: float = 5, max_files: int = 200):
+        self.directory = Path(directory)
+        self.interval = interval_ms / 1000
+        self.max_files = max_files
+        self._active = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def begin(self, method: str, path: str) -> Recording:
+        recording = Recording(method, path, threading.get_ident())
+        with self._lock:
+            self._active[recording.id] = recording
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._sample_loop, name="request-profiler", daemon=True)
+                self._thread.start()
+        return recording
+
+    def end(self, recording: Recording, status: Optional[int]):
+        with self._lock:
+            self._active.pop(recording.id, None)
+        recording.wall_ms = (time.perf_counter() - recording.started) * 1000
+        recording.status = status
+
+    def _sample_loop(self):
+        previous = time.perf_counter()
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+                recordings = list(self._active.values())
+            frames = sys._current_frames()
+            now = time.perf_counter()
+            for recording in recordings:
+                elapsed = min(now - previous, now - recording.started)
+                recording.sample(frames.get(recording.thread_id), int(elapsed * 1e6))
+            previous = now
+
+    def summary(self, recording: Recording) -> dict:
+        return {
+            "id": recording.id,
+            "method": recording.method,
+            "path": recording.path,
+            "status": recording.status,
+            "wall_ms": round(recording.wall_ms, 3),
+            "cpu_ms": round(recording.running_us / 1000, 3),
+            "waiting_ms": round(recording.waiting_us / 1000, 3),
+            "samples": recording.samples,
+            "interval_ms": self.interval * 1000,
+            "file": f"{recording.id}{PROFILE_SUFFIX}",
+        }
+
+    def save(self, recording: Recording) -> dict:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        summary = self.summary(recording)
+        folded = "".join(f"{stack} {count}\n" for stack, count in recording.stacks.most_common())
+        (self.directory / summary["file"]).write_text(folded)
+        (self.directory / f"{recording.id}{SUMMARY_SUFFIX}").write_text(json.dumps(summary))
+        self._evict()
+        return summary
+
+    def _evict(self):
+        summaries = sorted(self.directory.glob(f"*{SUMMARY_SUFFIX}"))
+        for stale in summaries[:max(len(summaries) - self.max_files, 0)]:
+            stale.with_suffix(PROFILE_SUFFIX).unlink(missing_ok=True)
+            stale.unlink(missing_ok=True)
+
+    def list_profiles(self, limit: int = 100) -> List[dict]:
+        # Newest first; ids start with their UTC timestamp
+        profiles = []
+        for path in sorted(self.directory.glob(f"*{SUMMARY_SUFFIX}"), reverse=True)[:limit]:
+            try:
+                profiles.append(json.loads(path.read_text()))
+            except (OSError, ValueError):
+                continue
+        return profiles
+
+    def profile_path(self, profile_id: str) -> Optional[Path]:
+        if not re.fullmatch(r"[0-9T]+-[0-9a-f]+", profile_id):
+            return None
+        path = self.directory / f"{profile_id}{PROFILE_SUFFIX}"
+        return path if path.exists() else None
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling requests that ask for it or are sampled.
+
+    A request is profiled when it carries ``header`` and ``authorize``
+    accepts its headers, or at random with probability ``sample_rate``.
+    """
+
+    def __init__(
+        self,
+        app,
+        profiler: SamplingProfiler,
+        authorize: Callable[[dict], bool],
+        sample_rate: float = 0.0,
+        header: str = "x-profile",
+        prefix: str = "/api"
+    ):
+        self.app = app
+        self.profiler = profiler
+        self.authorize = authorize
+        self.sample_rate = sample_rate
+        self.header = header.encode()
+        self.prefix = prefix
+
+    def _wanted(self, scope) -> bool:
+        headers = dict(scope["headers"])
+        if self.header in headers:
+            return self.authorize(headers)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.prefix) or not self._wanted(scope):
+            await self.app(scope, receive, send)
+            return
+
+        recording = self.profiler.begin(scope["method"], scope["path"])
+        recording.frame = sys._getframe()
+        status = None
+
+        async def send_with_profile_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile-id", recording.id.encode())]}
+            await send(message)
+
+        recording.coro = self.app(scope, receive, send_with_profile_id)
+        try:
+            await recording.coro
+        finally:
+            self.profiler.end(recording, status)
+            try:
+                await asyncio.to_thread(self.profiler.save, recording)
+            except OSError:
+                logger.exception(f"Could not save profile {recording.id}")
@@ -1,38 +1,215 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, UploadFile, File
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, UploadFile, File, Header, Query, Request, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
+from fastapi.responses import FileResponse, JSONResponse
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
-import os
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError, OperationFailure, PyMongoError, WriteError
+import asyncio
+import contextvars
+from contextlib import asynccontextmanager
 import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional
+from pydantic import BaseModel, Field, ConfigDict, EmailStr, model_validator
+from typing import Annotated, List, Optional, Tuple
 import uuid
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, date, timezone, timedelta
 import jwt
 from passlib.context import CryptContext
 import base64
+from audit_log import AuditLogWriter
+from booking_reminders import LoggingNotifier, ReminderScheduler
+from insert_batcher import InsertBatcher
+from pricing import PricingEngine, PLAN_BASE_MONTHLY_PREMIUM
+import reports
+from cache_bus import InvalidationBus, LocalCache
+from claim_fingerprints import record_fingerprint, release_fingerprint
+from employee_search import employee_search_terms, match_order, normalize_search_text
+from ledger import Ledger, claim_payout
+from load_control import LoadController, LoadSheddingMiddleware, RouteClass
+from request_profiler import ProfilingMiddleware, SamplingProfiler
+from settings import Settings
+from typed_storage import Timestamp, amount_cents, date_range, from_cents, money_document, parse_timestamp, read_money, running_total_cents, utc_now
+from zoneinfo import ZoneInfo
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Per route class in-flight limits and deadlines; a request's remaining
+# deadline bounds every MongoDB operation it makes (maxTimeMS)
+ANALYTICS_ROUTE_PREFIXES = ("/api/dashboard", "/api/reports", "/api/pricing", "/api/financials/balance", "/api/audit-log")
+
+def route_class_for(method: str, path: str) -> str:
+    if path.startswith("/api/auth/"):
+        return "auth"
+    if path.startswith(ANALYTICS_ROUTE_PREFIXES):
+        return "analytics"
+    if method in ("POST", "PUT", "PATCH", "DELETE"):
+        return "writes"
+    return "reads"
+
+class AppServices:
+    """Everything one app instance owns.
+
+    Constructing it is cheap and touches no network; the Motor client is
+    created when the app starts, unless a database is passed in.
+    """
+
+    def __init__(self, settings: Settings, database=None):
+        self.settings = settings
+        self.client = None
+        self.db = None
+        self._database = database
+
+        # Audit trail writer, flushed in the background and on shutdown
+        self.audit_log = AuditLogWriter(
+            None,
+            flush_interval_ms=settings.audit_flush_interval_ms,
+            max_batch=settings.audit_max_batch,
+            max_buffer=settings.audit_max_buffer
+        )
+
+        # Coalesces concurrent high-volume inserts (claims, bookings) into insert_many
+        self.insert_batcher = InsertBatcher(window_ms=settings.insert_batch_window_ms, max_batch=settings.insert_batch_max)
+
+        # Roster-based premium pricing, cached per company roster_version
+        self.pricing_engine = PricingEngine(None)
+
+        # Running-balance ledger over financials with periodic checkpoints
+        self.ledger = Ledger(None, checkpoint_interval=settings.ledger_checkpoint_interval)
+
+        # Report jobs run in a process pool, created on first use, and are
+        # cached on disk by (report type, params, data watermark)
+        self.report_pool = None
+        self.report_tasks = set()
+
+        # Booking reminders; one worker at a time holds the lease and sends them
+        self.booking_reminders = ReminderScheduler(
+            None,
+            LoggingNotifier(),
+            window_seconds=settings.booking_reminder_window_seconds,
+            lease_seconds=settings.booking_reminder_lease_seconds,
+            tz=ZoneInfo(settings.booking_timezone)
+        )
+
+        # Per-worker read caches kept coherent across uvicorn workers on this host
+        # by broadcasting invalidations over Unix datagram sockets
+        self.user_cache = LocalCache("users", settings.cache_ttl_seconds)
+        self.employee_cache = LocalCache("employees_by_user", settings.cache_ttl_seconds)
+        self.partner_cache = LocalCache("wellness_partners", settings.cache_ttl_seconds)
+        self.company_cache = LocalCache("companies", settings.cache_ttl_seconds)
+        self.cache_bus = InvalidationBus(
+            str(settings.resolved_cache_bus_dir),
+            [self.user_cache, self.employee_cache, self.partner_cache, self.company_cache, self.booking_reminders]
+        )
+
+        self.load_controller = LoadController([
+            RouteClass(
+                name,
+                max_concurrency=limits.max_concurrency,
+                deadline_ms=limits.deadline_ms,
+                queue_target_ms=settings.load_queue_target_ms,
+                queue_interval_ms=settings.load_queue_interval_ms
+            )
+            for name, limits in settings.route_class_limits.items()
+        ], route_class_for)
+
+        # Sampled request profiles, taken for super admins sending X-Profile or for
+        # a profile_sample_rate fraction of requests, kept as folded stacks
+        self.request_profiler = SamplingProfiler(
+            settings.profiles_dir,
+            interval_ms=settings.profile_interval_ms,
+            max_files=settings.profile_max_files
+        )
+
+        # Password hashing
+        rounds = {"bcrypt__rounds": settings.bcrypt_rounds} if settings.bcrypt_rounds else {}
+        self.pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", **rounds)
+
+    def use_database(self, database):
+        self.db = database
+        self.audit_log.collection = database.audit_log
+        self.pricing_engine.db = database
+        self.ledger.db = database
+        self.booking_reminders.db = database
+
+    async def start(self):
+        if self._database is None:
+            self.client = AsyncIOMotorClient(self.settings.mongo_url)
+            self._database = self.client[self.settings.db_name]
+        self.use_database(self._database)
+        await create_indexes(self.db)
+        self.audit_log.start()
+        self.cache_bus.start()
+        if self.settings.booking_reminders_enabled:
+            self.booking_reminders.start()
+
+    async def stop(self):
+        await self.insert_batcher.drain()
+        await self.audit_log.stop()
+        await self.booking_reminders.stop()
+        self.cache_bus.close()
+        if self.report_pool is not None:
+            self.report_pool.shutdown(wait=False, cancel_futures=True)
+        if self.client is not None:
+            self.client.close()
+
+# The app serving the current request or lifespan. Outside of one (scripts,
+# tests) the most recently created app is used.
+current_services: contextvars.ContextVar[AppServices] = contextvars.ContextVar("current_services")
+latest_services = None
+
+def services() -> AppServices:
+    found = current_services.get(None) or latest_services
+    if found is None:
+        raise RuntimeError("No app has been created; call create_app() first")
+    return found
+
+class ServiceProxy:
+    """Module-level name for one attribute of the current app's services,
+    so handlers keep using db, ledger, user_cache and so on directly."""
+
+    __slots__ = ("_name",)
+
+    def __init__(self, name: str):
+        object.__setattr__(self, "_name", name)
+
+    def _target(self):
+        return getattr(services(), object.__getattribute__(self, "_name"))
+
+    def __getattr__(self, attr):
+        return getattr(self._target(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._target(), attr, value)
+
+    def __getitem__(self, key):
+        return self._target()[key]
+
+settings = ServiceProxy("settings")
+db = ServiceProxy("db")
+audit_log = ServiceProxy("audit_log")
+insert_batcher = ServiceProxy("insert_batcher")
+pricing_engine = ServiceProxy("pricing_engine")
+ledger = ServiceProxy("ledger")
+booking_reminders = ServiceProxy("booking_reminders")
+user_cache = ServiceProxy("user_cache")
+employee_cache = ServiceProxy("employee_cache")
+partner_cache = ServiceProxy("partner_cache")
+company_cache = ServiceProxy("company_cache")
+cache_bus = ServiceProxy("cache_bus")
+load_controller = ServiceProxy("load_controller")
+request_profiler = ServiceProxy("request_profiler")
+pwd_context = ServiceProxy("pwd_context")
+PARTNER_CATALOG_KEY = "*"
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 
-# JWT configuration
-SECRET_KEY = os.environ['JWT_SECRET']  # Required - no fallback for security
+# JWT configuration; the secret is settings.jwt_secret
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 24 hours
-
-# Create the main app without a prefix
-app = FastAPI()
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -46,21 +223,169 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
-    expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    expire = datetime.now(timezone.utc) + timedelta(minutes=settings.access_token_expire_minutes)
     to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    return jwt.encode(to_encode, settings.jwt_secret, algorithm=ALGORITHM)
+
+# Versioning and conditional request helpers. Documents written before
+# versioning have no "version" field and are treated as version 1.
+def make_etag(document: dict) -> str:
+    return f'"{document.get("version", 1)}"'
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return etag in [tag.strip().removeprefix("W/") for tag in header.split(",")]
+
+def parse_if_match(header: Optional[str]) -> Optional[int]:
+    if not header or header.strip() == "*":
+        return None
+    try:
+        return int(header.strip().removeprefix("W/").strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid If-Match header")
+
+def version_filter(version: int) -> dict:
+    if version == 1:
+        return {"version": {"$in": [1, None]}}
+    return {"version": version}
+
+def versioned_update(fields: dict) -> list:
+    # Pipeline update so the counter also advances on unversioned documents;
+    # values are wrapped in $literal so user input is never read as an expression.
+    return [{"$set": {
+        **{key: {"$literal": value} for key, value in fields.items()},
+        "version": {"$add": [{"$ifNull": ["$version", 1]}, 1]},
+    }}]
+
+def apply_versioned_update(previous: dict, fields: dict) -> dict:
+    # versioned_update only sets literals, so the stored result can be
+    # derived from the pre-image returned by find_one_and_update
+    return {**previous, **fields, "version": previous.get("version", 1) + 1}
+
+async def raise_update_miss(collection, entity_id: str, expected_version: Optional[int], label: str):
+    # A conditional write matched nothing: 412 if the document still exists
+    if expected_version is not None and await collection.count_documents({"id": entity_id}, limit=1):
+        raise HTTPException(status_code=412, detail=f"{label} was modified by another request")
+    raise HTTPException(status_code=404, detail=f"{label} not found")
+
+def conditional_get(document: dict, request: Request, response: Response):
+    etag = make_etag(document)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return document
+
+def record_audit(entity_type: str, entity_id: str, action: str, current_user: dict, company_id: Optional[str], changes: Optional[dict] = None):
+    audit_log.record(AuditEvent(
+        entity_type=entity_type,
+        entity_id=entity_id,
+        action=action,
+        actor_id=current_user["id"],
+        company_id=company_id,
+        changes=changes or {}
+    ).model_dump())
+
+async def record_roster_change(company_id: str, employee_id: str, action: str, employee: Optional[dict] = None):
+    # Every roster mutation bumps the company's roster_version and logs the
+    # change so cached quotes can be updated from the delta.
+    company = await db.companies.find_one_and_update(
+        {"id": company_id},
+        {"$inc": {"roster_version": 1}},
+        projection={"_id": 0, "id": 1, "roster_version": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if company is None:
+        return
+    await db.roster_changes.insert_one({
+        "company_id": company_id,
+        "roster_version": company["roster_version"],
+        "employee_id": employee_id,
+        "action": action,
+        "date_of_birth": employee.get("date_of_birth") if employee else None,
+        "status": employee.get("status") if employee else None,
+        "timestamp": utc_now()
+    })
+
+def employee_document(employee: "Employee") -> dict:
+    # Stored form of an employee, including the directory search terms
+    document = employee.model_dump()
+    document["search_terms"] = employee_search_terms(document)
+    return document
+
+async def find_employee_for_user(user_id: str) -> Optional[dict]:
+    employee = employee_cache.get(user_id)
+    if employee is None:
+        generation = employee_cache.generation(user_id)
+        employee = await db.employees.find_one({"user_id": user_id}, {"_id": 0})
+        if employee is not None:
+            employee_cache.set(user_id, employee, generation)
+    return employee
+
+async def get_or_create_employee(user: dict) -> dict:
+    # One upsert round trip; the unique user_id index guarantees concurrent
+    # first requests from the same user end up with the same profile.
+    employee = employee_cache.get(user["id"])
+    if employee is not None:
+        return employee
+    generation = employee_cache.generation(user["id"])
+    
+    defaults = Employee(
+        user_id=user["id"],
+        company_id=user.get("company_id") or "default-company",
+        name=user["name"],
+        employee_id=f"EMP-{str(uuid.uuid4())[:8].upper()}",
+        department="General",
+        designation="Employee",
+        date_of_joining=datetime.now(timezone.utc).strftime("%Y-%m-%d"),
+        date_of_birth="1990-01-01",
+        phone="0000000000",
+        emergency_contact="0000000000",
+        status="active"
+    )
+    try:
+        employee = await db.employees.find_one_and_update(
+            {"user_id": user["id"]},
+            {"$setOnInsert": employee_document(defaults)},
+            projection={"_id": 0},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # Lost the insert race to a concurrent request; its profile wins
+        employee = await db.employees.find_one({"user_id": user["id"]}, {"_id": 0})
+    
+    if employee["id"] == defaults.id:
+        await record_roster_change(employee["company_id"], employee["id"], "upsert", employee)
+    employee_cache.set(user["id"], employee, generation)
+    return employee
+
+async def find_partner(partner_id: str) -> Optional[dict]:
+    partner = partner_cache.get(partner_id)
+    if partner is None:
+        generation = partner_cache.generation(partner_id)
+        partner = await db.wellness_partners.find_one({"id": partner_id}, {"_id": 0})
+        if partner is not None:
+            partner_cache.set(partner_id, partner, generation)
+    return partner
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     try:
         token = credentials.credentials
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, settings.jwt_secret, algorithms=[ALGORITHM])
         user_id = payload.get("sub")
         if user_id is None:
             raise HTTPException(status_code=401, detail="Invalid authentication credentials")
         
-        user = await db.users.find_one({"id": user_id}, {"_id": 0})
+        user = user_cache.get(user_id)
         if user is None:
-            raise HTTPException(status_code=401, detail="User not found")
+            generation = user_cache.generation(user_id)
+            user = await db.users.find_one({"id": user_id}, {"_id": 0})
+            if user is None:
+                raise HTTPException(status_code=401, detail="User not found")
+            user_cache.set(user_id, user, generation)
         return user
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token has expired")
@@ -76,7 +401,7 @@ class User(BaseModel):
     name: str
     role: str  # super_admin, company_admin, hr_manager, employee
     company_id: Optional[str] = None
-    created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    created_at: Timestamp = Field(default_factory=utc_now)
 
 class UserCreate(BaseModel):
     email: EmailStr
@@ -95,7 +420,7 @@ class UserResponse(BaseModel):
     name: str
     role: str
     company_id: Optional[str] = None
-    created_at: str
+    created_at: Timestamp
 
 class Company(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -107,7 +432,8 @@ class Company(BaseModel):
     contact_phone: str
     address: str
     plan_type: str  # basic, premium, enterprise
-    created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    version: int = 1
+    created_at: Timestamp = Field(default_factory=utc_now)
 
 class CompanyCreate(BaseModel):
     name: str
@@ -123,6 +449,7 @@ class Employee(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_id: str
     company_id: str
+    name: Optional[str] = None  # denormalized from the user record
     employee_id: str
     department: str
     designation: str
@@ -131,7 +458,8 @@ class Employee(BaseModel):
     phone: str
     emergency_contact: str
     status: str  # active, inactive
-    created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    version: int = 1
+    created_at: Timestamp = Field(default_factory=utc_now)
 
 class EmployeeCreate(BaseModel):
     user_id: str
@@ -143,6 +471,22 @@ class EmployeeCreate(BaseModel):
     phone: str
     emergency_contact: str
 
+class EmployeePatch(BaseModel):
+    # Omitted fields are left unchanged; user_id is only reassigned through PUT
+    employee_id: Optional[str] = None
+    department: Optional[str] = None
+    designation: Optional[str] = None
+    date_of_joining: Optional[str] = None
+    date_of_birth: Optional[str] = None
+    phone: Optional[str] = None
+    emergency_contact: Optional[str] = None
+    status: Optional[str] = None  # active, inactive
+
+# Reviewers pull submitted claims in (priority, submission_date) order;
+# claims stored before priorities existed have none and come first
+CLAIM_DEFAULT_PRIORITY = 2
+CLAIM_QUEUE_ORDER = [("priority", ASCENDING), ("submission_date", ASCENDING)]
+
 class Claim(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -153,21 +497,59 @@ class Claim(BaseModel):
     description: str
     status: str  # submitted, under_review, approved, rejected
     documents: List[str] = []
-    submission_date: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
-    review_date: Optional[str] = None
+    service_date: Optional[str] = None  # YYYY-MM-DD
+    duplicate_of: Optional[str] = None  # earlier claim with the same fingerprint
+    priority: int = Field(default=CLAIM_DEFAULT_PRIORITY, ge=0)  # lower is reviewed first
+    leased_by: Optional[str] = None  # reviewer holding the claim from /claims/next
+    lease_expires_at: Optional[Timestamp] = None
+    payout_id: Optional[str] = None  # claim_payout entry posted on approval
+    submission_date: Timestamp = Field(default_factory=utc_now)
+    review_date: Optional[Timestamp] = None
     reviewer_notes: Optional[str] = None
     reviewed_by: Optional[str] = None
+    version: int = 1
+
+    @model_validator(mode="before")
+    @classmethod
+    def read_amount_cents(cls, data):
+        # Stored claims carry amount_cents instead of amount
+        return read_money(data)
 
 class ClaimCreate(BaseModel):
     claim_type: str
     amount: float
     description: str
     documents: List[str] = []
+    service_date: Optional[str] = None
 
 class ClaimUpdate(BaseModel):
     status: str
     reviewer_notes: Optional[str] = None
 
+class ClaimPatch(BaseModel):
+    status: Optional[str] = None
+    reviewer_notes: Optional[str] = None
+    priority: Optional[int] = Field(default=None, ge=0)
+
+class SlotTemplate(BaseModel):
+    weekday: int = Field(ge=0, le=6)  # 0 = Monday
+    start_time: str = Field(pattern=r"^([01]\d|2[0-3]):[0-5]\d$")  # HH:MM
+    end_time: str = Field(pattern=r"^([01]\d|2[0-3]):[0-5]\d$")  # HH:MM, exclusive
+    slot_minutes: int = Field(default=30, gt=0)
+    capacity: int = Field(default=1, gt=0)
+
+    @model_validator(mode="after")
+    def end_after_start(self):
+        # Zero-padded HH:MM strings order the same as the times they hold
+        if self.end_time <= self.start_time:
+            raise ValueError("end_time must be after start_time")
+        return self
+
+class GeoPoint(BaseModel):
+    # GeoJSON point, coordinates are [longitude, latitude]
+    type: str = Field(default="Point", pattern=r"^Point$")
+    coordinates: Tuple[Annotated[float, Field(ge=-180, le=180)], Annotated[float, Field(ge=-90, le=90)]]
+
 class WellnessPartner(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -178,7 +560,11 @@ class WellnessPartner(BaseModel):
     contact_phone: str
     availability: str
     pricing: str
-    created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    slot_templates: List[SlotTemplate] = []
+    location: Optional[GeoPoint] = None  # not set for remote-only services
+    service_radius_km: Optional[float] = Field(default=None, gt=0)
+    version: int = 1
+    created_at: Timestamp = Field(default_factory=utc_now)
 
 class WellnessPartnerCreate(BaseModel):
     name: str
@@ -188,6 +574,12 @@ class WellnessPartnerCreate(BaseModel):
     contact_phone: str
     availability: str
     pricing: str
+    slot_templates: List[SlotTemplate] = []
+    location: Optional[GeoPoint] = None
+    service_radius_km: Optional[float] = Field(default=None, gt=0)
+
+class NearbyPartner(WellnessPartner):
+    distance_km: float
 
 class Booking(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -198,8 +590,10 @@ class Booking(BaseModel):
     booking_date: str
     booking_time: str
     status: str  # scheduled, completed, cancelled
+    seat: Optional[int] = None  # only set for partners with slot templates
     notes: Optional[str] = None
-    created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    version: int = 1
+    created_at: Timestamp = Field(default_factory=utc_now)
 
 class BookingCreate(BaseModel):
     partner_id: str
@@ -215,8 +609,15 @@ class Financial(BaseModel):
     transaction_type: str  # premium_payment, claim_payout
     amount: float
     description: str
-    transaction_date: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    transaction_date: Timestamp = Field(default_factory=utc_now)
     reference_id: Optional[str] = None
+    sequence: Optional[int] = None  # position in the company ledger
+
+    @model_validator(mode="before")
+    @classmethod
+    def read_amount_cents(cls, data):
+        # Stored entries carry amount_cents instead of amount
+        return read_money(data)
 
 class FinancialCreate(BaseModel):
     transaction_type: str
@@ -224,6 +625,232 @@ class FinancialCreate(BaseModel):
     description: str
     reference_id: Optional[str] = None
 
+class LedgerBalance(BaseModel):
+    company_id: str
+    as_of: Optional[str] = None
+    sequence: int
+    total_premiums: float
+    total_payouts: float
+    net_balance: float
+
+class PremiumBand(BaseModel):
+    min_age: int
+    max_age: Optional[int] = None
+    factor: float
+    employees: int
+    monthly_premium: float
+
+class PremiumQuote(BaseModel):
+    company_id: str
+    plan_type: str
+    roster_version: int
+    as_of: str
+    employee_count: int
+    monthly_premium: float
+    annual_premium: float
+    bands: List[PremiumBand]
+
+class ReportRequest(BaseModel):
+    report_type: str  # claims_by_department, wellness_utilization, premium_vs_payout
+    format: str = "xlsx"  # xlsx, parquet, csv
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+
+class ReportJob(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    company_id: str
+    requested_by: str
+    report_type: str
+    format: str
+    params: dict = {}
+    cache_key: str
+    status: str  # queued, running, completed, failed
+    error: Optional[str] = None
+    created_at: Timestamp = Field(default_factory=utc_now)
+    # Advanced by the worker while the job runs; see report_heartbeat
+    updated_at: Timestamp = Field(default_factory=utc_now)
+    completed_at: Optional[Timestamp] = None
+
+class AuditEvent(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    entity_type: str  # claim, employee
+    entity_id: str
+    action: str  # update, delete
+    actor_id: str
+    company_id: Optional[str] = None
+    changes: dict = {}
+    timestamp: Timestamp = Field(default_factory=utc_now)
+
+class SlotAvailability(BaseModel):
+    booking_date: str
+    booking_time: str
+    capacity: int
+    available: int
+
+# Expanded related-entity summaries (?expand=)
+class UserSummary(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str
+    name: str
+    email: str
+    role: str
+
+class EmployeeSummary(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str
+    employee_id: str
+    name: Optional[str] = None
+    department: str
+    designation: str
+
+class PartnerSummary(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str
+    name: str
+    service_type: str
+    contact_phone: str
+
+class ClaimView(Claim):
+    employee: Optional[EmployeeSummary] = None
+    reviewer: Optional[UserSummary] = None
+
+class BookingView(Booking):
+    partner: Optional[PartnerSummary] = None
+
+# Related-entity loading helpers
+USER_SUMMARY_PROJECTION = {"_id": 0, "id": 1, "name": 1, "email": 1, "role": 1}
+EMPLOYEE_SUMMARY_PROJECTION = {"_id": 0, "id": 1, "user_id": 1, "employee_id": 1, "department": 1, "designation": 1}
+PARTNER_SUMMARY_PROJECTION = {"_id": 0, "id": 1, "name": 1, "service_type": 1, "contact_phone": 1}
+
+def parse_expand(expand: Optional[str], allowed: set) -> set:
+    if not expand:
+        return set()
+    fields = {field.strip() for field in expand.split(",") if field.strip()}
+    unknown = fields - allowed
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unsupported expand value(s): {', '.join(sorted(unknown))}")
+    return fields
+
+async def load_by_ids(collection, ids, projection: dict) -> dict:
+    # One $in query per entity type instead of one lookup per row
+    unique_ids = list({i for i in ids if i})
+    if not unique_ids:
+        return {}
+    docs = await collection.find({"id": {"$in": unique_ids}}, projection).to_list(None)
+    return {doc["id"]: doc for doc in docs}
+
+async def expand_claims(claims: List[dict], fields: set) -> List[dict]:
+    employees = {}
+    if "employee" in fields:
+        employees = await load_by_ids(db.employees, (c["employee_id"] for c in claims), EMPLOYEE_SUMMARY_PROJECTION)
+
+    # Employee names and reviewers both live on users, so resolve them together
+    user_ids = [e["user_id"] for e in employees.values()]
+    if "reviewer" in fields:
+        user_ids.extend(c.get("reviewed_by") for c in claims)
+    users = await load_by_ids(db.users, user_ids, USER_SUMMARY_PROJECTION)
+
+    for claim in claims:
+        if "employee" in fields:
+            employee = employees.get(claim["employee_id"])
+            if employee:
+                user = users.get(employee["user_id"])
+                claim["employee"] = {**employee, "name": user["name"] if user else None}
+        if "reviewer" in fields:
+            claim["reviewer"] = users.get(claim.get("reviewed_by"))
+    return claims
+
+async def expand_bookings(bookings: List[dict], fields: set) -> List[dict]:
+    if "partner" in fields:
+        partners = await load_by_ids(db.wellness_partners, (b["partner_id"] for b in bookings), PARTNER_SUMMARY_PROJECTION)
+        for booking in bookings:
+            booking["partner"] = partners.get(booking["partner_id"])
+    return bookings
+
+# Nearest-partner search
+MAX_NEARBY_DISTANCE_KM = 200
+MAX_NEARBY_OFFSET = 1000
+
+def nearby_partners_pipeline(lng: float, lat: float, service_type: Optional[str], max_distance_km: float, offset: int, limit: int) -> list:
+    # $geoNear walks the 2dsphere index outwards from the point, so only
+    # partners within max_distance_km are read; partners whose own service
+    # radius does not reach the point are dropped after it. Partners without
+    # a radius serve the whole search area.
+    return [
+        {"$geoNear": {
+            "near": {"type": "Point", "coordinates": [lng, lat]},
+            "key": "location",
+            "distanceField": "distance_m",
+            "maxDistance": max_distance_km * 1000,
+            "query": {"service_type": service_type} if service_type else {},
+            "spherical": True,
+        }},
+        {"$match": {"$expr": {"$lte": [
+            "$distance_m", {"$multiply": [{"$ifNull": ["$service_radius_km", MAX_NEARBY_DISTANCE_KM]}, 1000]}
+        ]}}},
+        {"$skip": offset},
+        {"$limit": limit},
+        {"$project": {"_id": 0}},
+    ]
+
+# Booking slot helpers
+MAX_AVAILABILITY_DAYS = 62
+
+def parse_minutes(value: str) -> int:
+    hours, minutes = value.split(":")
+    return int(hours) * 60 + int(minutes)
+
+def format_minutes(value: int) -> str:
+    return f"{value // 60:02d}:{value % 60:02d}"
+
+def expand_slot_templates(templates: List[dict], start: date, end: date) -> dict:
+    # Maps (booking_date, booking_time) -> capacity for every slot in [start, end]
+    by_weekday = {}
+    for template in templates:
+        by_weekday.setdefault(template["weekday"], []).append(template)
+
+    slots = {}
+    day = start
+    while day <= end:
+        for template in by_weekday.get(day.weekday(), []):
+            minute = parse_minutes(template["start_time"])
+            end_minute = parse_minutes(template["end_time"])
+            while minute + template["slot_minutes"] <= end_minute:
+                key = (day.isoformat(), format_minutes(minute))
+                slots[key] = slots.get(key, 0) + template["capacity"]
+                minute += template["slot_minutes"]
+        day += timedelta(days=1)
+    return slots
+
+def parse_date_param(value: str, name: str) -> date:
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name}, expected YYYY-MM-DD")
+
+async def reserve_seat(booking: Booking, capacity: int) -> Booking:
+    # Seats are claimed by inserting against the unique
+    # (partner_id, booking_date, booking_time, seat) index, so two concurrent
+    # requests can never hold the same seat.
+    taken = await db.bookings.distinct("seat", {
+        "partner_id": booking.partner_id,
+        "booking_date": booking.booking_date,
+        "booking_time": booking.booking_time,
+        "seat": {"$gte": 0},
+    })
+    for seat in range(capacity):
+        if seat in taken:
+            continue
+        booking.seat = seat
+        try:
+            await insert_batcher.insert(db.bookings, booking.model_dump())
+            return booking
+        except DuplicateKeyError:
+            continue
+    raise HTTPException(status_code=409, detail="Slot is fully booked")
+
 # Authentication endpoints
 @api_router.post("/auth/register")
 async def register(user_data: UserCreate):
@@ -248,19 +875,7 @@ async def register(user_data: UserCreate):
     
     # Auto-create employee profile for employee role users
     if user_data.role == "employee" and user_data.company_id:
-        employee = Employee(
-            user_id=user.id,
-            company_id=user_data.company_id,
-            employee_id=f"EMP-{str(uuid.uuid4())[:8].upper()}",
-            department="General",
-            designation="Employee",
-            date_of_joining=datetime.now(timezone.utc).strftime("%Y-%m-%d"),
-            date_of_birth="1990-01-01",
-            phone="0000000000",
-            emergency_contact="0000000000",
-            status="active"
-        )
-        await db.employees.insert_one(employee.model_dump())
+        await get_or_create_employee(user.model_dump())
     
     # Create access token
     access_token = create_access_token({"sub": user.id, "role": user.role})
@@ -308,14 +923,18 @@ async def get_companies(current_user: dict = Depends(get_current_user)):
     return companies
 
 @api_router.get("/companies/{company_id}", response_model=Company)
-async def get_company(company_id: str, current_user: dict = Depends(get_current_user)):
+async def get_company(company_id: str, request: Request, response: Response, current_user: dict = Depends(get_current_user)):
     if current_user["role"] not in ["super_admin", "company_admin"] and current_user["company_id"] != company_id:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    company = await db.companies.find_one({"id": company_id}, {"_id": 0})
-    if not company:
-        raise HTTPException(status_code=404, detail="Company not found")
-    return company
+    company = company_cache.get(company_id)
+    if company is None:
+        generation = company_cache.generation(company_id)
+        company = await db.companies.find_one({"id": company_id}, {"_id": 0})
+        if not company:
+            raise HTTPException(status_code=404, detail="Company not found")
+        company_cache.set(company_id, company, generation)
+    return conditional_get(company, request, response)
 
 # Employee endpoints
 @api_router.post("/employees", response_model=Employee)
@@ -323,12 +942,19 @@ async def create_employee(employee_data: EmployeeCreate, current_user: dict = De
     if current_user["role"] not in ["company_admin", "hr_manager"]:
         raise HTTPException(status_code=403, detail="Not authorized")
     
+    user = await db.users.find_one({"id": employee_data.user_id}, {"_id": 0, "name": 1})
     employee = Employee(
         **employee_data.model_dump(),
         company_id=current_user["company_id"],
+        name=user["name"] if user else None,
         status="active"
     )
-    await db.employees.insert_one(employee.model_dump())
+    try:
+        await db.employees.insert_one(employee_document(employee))
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="An employee profile already exists for this user")
+    await record_roster_change(employee.company_id, employee.id, "upsert", employee.model_dump())
+    cache_bus.publish(employee_cache.name, employee.user_id)
     return employee
 
 @api_router.get("/employees", response_model=List[Employee])
@@ -337,8 +963,31 @@ async def get_employees(current_user: dict = Depends(get_current_user)):
     employees = await db.employees.find(query, {"_id": 0}).to_list(1000)
     return employees
 
+SEARCH_WINDOW_FACTOR = 5
+
+@api_router.get("/employees/search", response_model=List[EmployeeSummary])
+async def search_employees(q: str = Query(..., min_length=1), limit: int = Query(10, ge=1, le=50), current_user: dict = Depends(get_current_user)):
+    if current_user["role"] not in ["company_admin", "hr_manager"]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    query = normalize_search_text(q)
+    if not query:
+        return []
+    
+    # Normalized text is only [a-z0-9 ], so the anchored regex needs no
+    # escaping and runs as an index range scan on (company_id, search_terms).
+    # Results are prefix-ordered: only the first window of matches in index
+    # order is read, and that window is ordered by how closely each matches.
+    window = limit * SEARCH_WINDOW_FACTOR
+    candidates = await db.employees.find(
+        {"company_id": current_user["company_id"], "search_terms": {"$regex": f"^{query}"}},
+        {"_id": 0, "id": 1, "employee_id": 1, "name": 1, "department": 1, "designation": 1}
+    ).limit(window).to_list(window)
+    candidates.sort(key=lambda employee: match_order(employee, query))
+    return candidates[:limit]
+
 @api_router.get("/employees/{employee_id}", response_model=Employee)
-async def get_employee(employee_id: str, current_user: dict = Depends(get_current_user)):
+async def get_employee(employee_id: str, request: Request, response: Response, current_user: dict = Depends(get_current_user)):
     employee = await db.employees.find_one({"id": employee_id}, {"_id": 0})
     if not employee:
         raise HTTPException(status_code=404, detail="Employee not found")
@@ -346,22 +995,88 @@ async def get_employee(employee_id: str, current_user: dict = Depends(get_curren
     if current_user["role"] == "employee" and employee["user_id"] != current_user["id"]:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    return employee
+    return conditional_get(employee, request, response)
 
 @api_router.put("/employees/{employee_id}", response_model=Employee)
-async def update_employee(employee_id: str, employee_data: EmployeeCreate, current_user: dict = Depends(get_current_user)):
+async def update_employee(employee_id: str, employee_data: EmployeeCreate, response: Response, if_match: Optional[str] = Header(None), current_user: dict = Depends(get_current_user)):
     if current_user["role"] not in ["company_admin", "hr_manager"]:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    result = await db.employees.update_one(
-        {"id": employee_id},
-        {"$set": employee_data.model_dump()}
-    )
+    query = {"id": employee_id}
+    expected_version = parse_if_match(if_match)
+    if expected_version is not None:
+        query.update(version_filter(expected_version))
     
-    if result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="Employee not found")
+    user = await db.users.find_one({"id": employee_data.user_id}, {"_id": 0, "name": 1})
+    update_fields = {**employee_data.model_dump(), "name": user["name"] if user else None}
+    update_fields["search_terms"] = employee_search_terms(update_fields)
     
-    employee = await db.employees.find_one({"id": employee_id}, {"_id": 0})
+    # The previous user_id is needed to invalidate its cached profile
+    try:
+        previous = await db.employees.find_one_and_update(query, versioned_update(update_fields), projection={"_id": 0})
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="An employee profile already exists for this user")
+    
+    if previous is None:
+        await raise_update_miss(db.employees, employee_id, expected_version, "Employee")
+    
+    employee = apply_versioned_update(previous, update_fields)
+    record_audit("employee", employee_id, "update", current_user, employee["company_id"], employee_data.model_dump())
+    await record_roster_change(employee["company_id"], employee_id, "upsert", employee)
+    cache_bus.publish(employee_cache.name, previous["user_id"])
+    if employee["user_id"] != previous["user_id"]:
+        cache_bus.publish(employee_cache.name, employee["user_id"])
+    response.headers["ETag"] = make_etag(employee)
+    return employee
+
+SEARCH_TERMS_ATTEMPTS = 3
+
+@api_router.patch("/employees/{employee_id}", response_model=Employee)
+async def patch_employee(employee_id: str, employee_patch: EmployeePatch, response: Response, if_match: Optional[str] = Header(None), current_user: dict = Depends(get_current_user)):
+    if current_user["role"] not in ["company_admin", "hr_manager"]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    # Every employee field is required, so an explicit null means "unchanged"
+    update_fields = employee_patch.model_dump(exclude_none=True)
+    if not update_fields:
+        raise HTTPException(status_code=400, detail="No fields to update")
+    
+    query = {"id": employee_id}
+    expected_version = parse_if_match(if_match)
+    if expected_version is not None:
+        query.update(version_filter(expected_version))
+    
+    stored_fields = update_fields
+    if {"employee_id", "department"} & update_fields.keys():
+        # search_terms also depend on fields outside the patch: they are
+        # computed from a read and written with the patch, pinned to the
+        # version read. Without If-Match a concurrent write means another try.
+        for _ in range(SEARCH_TERMS_ATTEMPTS):
+            current = await db.employees.find_one(query, {"_id": 0, "name": 1, "employee_id": 1, "department": 1, "version": 1})
+            if current is None:
+                previous = None
+                break
+            stored_fields = {**update_fields, "search_terms": employee_search_terms({**current, **update_fields})}
+            previous = await db.employees.find_one_and_update(
+                {"id": employee_id, **version_filter(current.get("version", 1))},
+                versioned_update(stored_fields),
+                projection={"_id": 0}
+            )
+            if previous is not None or expected_version is not None:
+                break
+        else:
+            raise HTTPException(status_code=409, detail="Employee is being modified by other requests, please retry")
+    else:
+        previous = await db.employees.find_one_and_update(query, versioned_update(update_fields), projection={"_id": 0})
+    if previous is None:
+        await raise_update_miss(db.employees, employee_id, expected_version, "Employee")
+    employee = apply_versioned_update(previous, stored_fields)
+    
+    record_audit("employee", employee_id, "update", current_user, employee["company_id"], update_fields)
+    if {"date_of_birth", "status"} & update_fields.keys():
+        await record_roster_change(employee["company_id"], employee_id, "upsert", employee)
+    cache_bus.publish(employee_cache.name, employee["user_id"])
+    response.headers["ETag"] = make_etag(employee)
     return employee
 
 @api_router.delete("/employees/{employee_id}")
@@ -369,34 +1084,25 @@ async def delete_employee(employee_id: str, current_user: dict = Depends(get_cur
     if current_user["role"] not in ["company_admin", "hr_manager"]:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    result = await db.employees.delete_one({"id": employee_id})
-    if result.deleted_count == 0:
+    deleted = await db.employees.find_one_and_delete(
+        {"id": employee_id},
+        projection={"_id": 0, "company_id": 1, "user_id": 1, "employee_id": 1}
+    )
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Employee not found")
     
+    record_audit("employee", employee_id, "delete", current_user, deleted["company_id"], deleted)
+    await record_roster_change(deleted["company_id"], employee_id, "delete")
+    cache_bus.publish(employee_cache.name, deleted["user_id"])
     return {"message": "Employee deleted successfully"}
 
 # Claims endpoints
 @api_router.post("/claims", response_model=Claim)
 async def create_claim(claim_data: ClaimCreate, current_user: dict = Depends(get_current_user)):
     # Get employee data - auto-create if not exists
-    employee = await db.employees.find_one({"user_id": current_user["id"]}, {"_id": 0})
-    if not employee:
-        # Auto-create employee profile
-        company_id = current_user.get("company_id") or "default-company"
-        employee_data = Employee(
-            user_id=current_user["id"],
-            company_id=company_id,
-            employee_id=f"EMP-{str(uuid.uuid4())[:8].upper()}",
-            department="General",
-            designation="Employee",
-            date_of_joining=datetime.now(timezone.utc).strftime("%Y-%m-%d"),
-            date_of_birth="1990-01-01",
-            phone="0000000000",
-            emergency_contact="0000000000",
-            status="active"
-        )
-        await db.employees.insert_one(employee_data.model_dump())
-        employee = employee_data.model_dump()
+    employee = await get_or_create_employee(current_user)
+    if claim_data.service_date:
+        claim_data.service_date = parse_date_param(claim_data.service_date, "service_date").isoformat()
     
     claim = Claim(
         **claim_data.model_dump(),
@@ -404,13 +1110,29 @@ async def create_claim(claim_data: ClaimCreate, current_user: dict = Depends(get
         company_id=employee["company_id"],
         status="submitted"
     )
-    await db.claims.insert_one(claim.model_dump())
+    
+    # One upsert on the fingerprint both checks for and records it
+    lookback_start = claim.submission_date - timedelta(days=settings.claim_duplicate_lookback_days)
+    original = await record_fingerprint(db.claim_fingerprints, claim.model_dump(), lookback_start)
+    if original:
+        if settings.claim_duplicate_policy == "reject":
+            raise HTTPException(status_code=409, detail=f"Claim duplicates claim {original['claim_id']}")
+        claim.duplicate_of = original["claim_id"]
+    try:
+        await insert_batcher.insert(db.claims, money_document(claim.model_dump()))
+    except WriteError:
+        # Resubmissions must not be flagged against a claim that was never
+        # stored. After a timeout the batch may still store it, so the
+        # fingerprint stays.
+        await release_fingerprint(db.claim_fingerprints, claim.model_dump())
+        raise
     return claim
 
-@api_router.get("/claims", response_model=List[Claim])
-async def get_claims(current_user: dict = Depends(get_current_user)):
+@api_router.get("/claims", response_model=List[ClaimView])
+async def get_claims(expand: Optional[str] = None, include_archived: bool = False, current_user: dict = Depends(get_current_user)):
+    expand_fields = parse_expand(expand, {"employee", "reviewer"})
     if current_user["role"] == "employee":
-        employee = await db.employees.find_one({"user_id": current_user["id"]}, {"_id": 0})
+        employee = await find_employee_for_user(current_user["id"])
         if not employee:
             return []
         query = {"employee_id": employee["id"]}
@@ -418,33 +1140,149 @@ async def get_claims(current_user: dict = Depends(get_current_user)):
         query = {"company_id": current_user["company_id"]}
     
     claims = await db.claims.find(query, {"_id": 0}).to_list(1000)
-    return claims
+    if include_archived:
+        claims.extend(await db.claims_archive.find(query, {"_id": 0}).to_list(1000))
+    return await expand_claims(claims, expand_fields)
 
 @api_router.get("/claims/{claim_id}", response_model=Claim)
-async def get_claim(claim_id: str, current_user: dict = Depends(get_current_user)):
+async def get_claim(claim_id: str, request: Request, response: Response, current_user: dict = Depends(get_current_user)):
     claim = await db.claims.find_one({"id": claim_id}, {"_id": 0})
+    if not claim:
+        claim = await db.claims_archive.find_one({"id": claim_id}, {"_id": 0})
     if not claim:
         raise HTTPException(status_code=404, detail="Claim not found")
+    return conditional_get(claim, request, response)
+
+def claim_lease_free(now: datetime) -> dict:
+    return {"$or": [{"lease_expires_at": None}, {"lease_expires_at": {"$lte": now}}]}
+
+def claim_leased_to_other(reviewer_id: str, now: datetime) -> dict:
+    return {"leased_by": {"$nin": [None, reviewer_id]}, "lease_expires_at": {"$gt": now}}
+
+async def raise_lease_miss(claim_id: str):
+    if await db.claims.count_documents({"id": claim_id}, limit=1):
+        raise HTTPException(status_code=409, detail="Claim is not leased to you")
+    raise HTTPException(status_code=404, detail="Claim not found")
+
+async def apply_claim_review(claim_id: str, update_data: dict, if_match: Optional[str], current_user: dict) -> dict:
+    now = utc_now()
+    if update_data.get("status") is not None:
+        update_data["review_date"] = now
+        update_data["reviewed_by"] = current_user["id"]
+        # A reviewed claim leaves the queue; its lease ends with the review
+        update_data["leased_by"] = None
+        update_data["lease_expires_at"] = None
+    
+    # Claims leased to another reviewer can only be reviewed by them
+    query = {"id": claim_id, "$or": [{"leased_by": {"$in": [None, current_user["id"]]}}, {"lease_expires_at": {"$lte": now}}]}
+    expected_version = parse_if_match(if_match)
+    if expected_version is not None:
+        query.update(version_filter(expected_version))
+    
+    update = versioned_update(update_data)
+    approving = update_data.get("status") == "approved"
+    if approving:
+        # Only the move into approved assigns a payout, and only once.
+        # Claims approved before payouts were posted here already have a
+        # payout entry but no payout_id. This stage runs first, so it sees
+        # the stored status.
+        payout_id = str(uuid.uuid4())
+        already_paid = {"$or": [
+            {"$eq": ["$status", "approved"]},
+            {"$ne": [{"$ifNull": ["$payout_id", None]}, None]},
+        ]}
+        update.insert(0, {"$set": {"payout_id": {"$cond": [already_paid, "$payout_id", {"$literal": payout_id}]}}})
+    
+    previous = await db.claims.find_one_and_update(query, update, projection={"_id": 0})
+    if previous is None:
+        if await db.claims.count_documents({"id": claim_id, **claim_leased_to_other(current_user["id"], now)}, limit=1):
+            raise HTTPException(status_code=409, detail="Claim is leased to another reviewer")
+        await raise_update_miss(db.claims, claim_id, expected_version, "Claim")
+    claim = apply_versioned_update(previous, update_data)
+    
+    record_audit("claim", claim_id, "update", current_user, claim["company_id"], update_data)
+    if approving and previous.get("status") != "approved" and previous.get("payout_id") is None:
+        # A payout lost between these two writes is posted by reconcile_payouts.py --repair
+        claim["payout_id"] = payout_id
+        await ledger.post(Financial(**claim_payout(claim, payout_id)).model_dump())
     return claim
 
-@api_router.put("/claims/{claim_id}", response_model=Claim)
-async def update_claim(claim_id: str, claim_update: ClaimUpdate, current_user: dict = Depends(get_current_user)):
+@api_router.post("/claims/next", response_model=Claim, responses={204: {"description": "No claims waiting for review"}})
+async def lease_next_claim(response: Response, current_user: dict = Depends(get_current_user)):
     if current_user["role"] not in ["company_admin", "hr_manager"]:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    update_data = claim_update.model_dump()
-    update_data["review_date"] = datetime.now(timezone.utc).isoformat()
-    update_data["reviewed_by"] = current_user["id"]
+    # Reviewers racing for the head of the queue each get a different
+    # claim: the lease is taken by the same write that finds the claim
+    now = utc_now()
+    lease = {"leased_by": current_user["id"], "lease_expires_at": now + timedelta(seconds=settings.claim_lease_seconds)}
+    previous = await db.claims.find_one_and_update(
+        {"company_id": current_user["company_id"], "status": "submitted", **claim_lease_free(now)},
+        versioned_update(lease),
+        # _id is kept: mongomock applies a sorted update through it
+        sort=CLAIM_QUEUE_ORDER
+    )
+    if previous is None:
+        return Response(status_code=204)
+    previous.pop("_id")
+    claim = apply_versioned_update(previous, lease)
+    response.headers["ETag"] = make_etag(claim)
+    return claim
+
+@api_router.post("/claims/{claim_id}/lease", response_model=Claim)
+async def renew_claim_lease(claim_id: str, response: Response, current_user: dict = Depends(get_current_user)):
+    if current_user["role"] not in ["company_admin", "hr_manager"]:
+        raise HTTPException(status_code=403, detail="Not authorized")
     
-    result = await db.claims.update_one(
-        {"id": claim_id},
-        {"$set": update_data}
+    # An expired lease nobody else has taken can still be renewed
+    lease = {"lease_expires_at": utc_now() + timedelta(seconds=settings.claim_lease_seconds)}
+    previous = await db.claims.find_one_and_update(
+        {"id": claim_id, "status": "submitted", "leased_by": current_user["id"]},
+        versioned_update(lease),
+        projection={"_id": 0}
     )
+    if previous is None:
+        await raise_lease_miss(claim_id)
+    claim = apply_versioned_update(previous, lease)
+    response.headers["ETag"] = make_etag(claim)
+    return claim
+
+@api_router.delete("/claims/{claim_id}/lease")
+async def release_claim_lease(claim_id: str, current_user: dict = Depends(get_current_user)):
+    if current_user["role"] not in ["company_admin", "hr_manager"]:
+        raise HTTPException(status_code=403, detail="Not authorized")
     
+    result = await db.claims.update_one(
+        {"id": claim_id, "leased_by": current_user["id"]},
+        versioned_update({"leased_by": None, "lease_expires_at": None})
+    )
     if result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="Claim not found")
+        await raise_lease_miss(claim_id)
+    return {"message": "Claim lease released"}
+
+@api_router.put("/claims/{claim_id}", response_model=Claim)
+async def update_claim(claim_id: str, claim_update: ClaimUpdate, response: Response, if_match: Optional[str] = Header(None), current_user: dict = Depends(get_current_user)):
+    if current_user["role"] not in ["company_admin", "hr_manager"]:
+        raise HTTPException(status_code=403, detail="Not authorized")
     
-    claim = await db.claims.find_one({"id": claim_id}, {"_id": 0})
+    claim = await apply_claim_review(claim_id, claim_update.model_dump(), if_match, current_user)
+    response.headers["ETag"] = make_etag(claim)
+    return claim
+
+@api_router.patch("/claims/{claim_id}", response_model=Claim)
+async def patch_claim(claim_id: str, claim_patch: ClaimPatch, response: Response, if_match: Optional[str] = Header(None), current_user: dict = Depends(get_current_user)):
+    if current_user["role"] not in ["company_admin", "hr_manager"]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    # reviewer_notes may be cleared with an explicit null; status may not
+    update_data = claim_patch.model_dump(exclude_unset=True)
+    if "status" in update_data and update_data["status"] is None:
+        raise HTTPException(status_code=400, detail="Claim status cannot be null")
+    if not update_data:
+        raise HTTPException(status_code=400, detail="No fields to update")
+    
+    claim = await apply_claim_review(claim_id, update_data, if_match, current_user)
+    response.headers["ETag"] = make_etag(claim)
     return claim
 
 # Wellness Partners endpoints
@@ -455,59 +1293,157 @@ async def create_wellness_partner(partner_data: WellnessPartnerCreate, current_u
     
     partner = WellnessPartner(**partner_data.model_dump())
     await db.wellness_partners.insert_one(partner.model_dump())
+    cache_bus.publish(partner_cache.name, PARTNER_CATALOG_KEY)
     return partner
 
 @api_router.get("/wellness-partners", response_model=List[WellnessPartner])
-async def get_wellness_partners():
-    partners = await db.wellness_partners.find({}, {"_id": 0}).to_list(1000)
+async def get_wellness_partners(service_type: Optional[str] = None):
+    partners = partner_cache.get(PARTNER_CATALOG_KEY)
+    if partners is None:
+        generation = partner_cache.generation(PARTNER_CATALOG_KEY)
+        partners = await db.wellness_partners.find({}, {"_id": 0}).to_list(1000)
+        partner_cache.set(PARTNER_CATALOG_KEY, partners, generation)
+    if service_type:
+        return [partner for partner in partners if partner["service_type"] == service_type]
+    return partners
+
+@api_router.get("/wellness-partners/nearby", response_model=List[NearbyPartner])
+async def get_nearby_partners(
+    lng: float = Query(..., ge=-180, le=180),
+    lat: float = Query(..., ge=-90, le=90),
+    service_type: Optional[str] = None,
+    max_distance_km: float = Query(50, gt=0, le=MAX_NEARBY_DISTANCE_KM),
+    offset: int = Query(0, ge=0, le=MAX_NEARBY_OFFSET),
+    limit: int = Query(20, ge=1, le=100)
+):
+    partners = await db.wellness_partners.aggregate(
+        nearby_partners_pipeline(lng, lat, service_type, max_distance_km, offset, limit)
+    ).to_list(limit)
+    for partner in partners:
+        partner["distance_km"] = round(partner.pop("distance_m") / 1000, 3)
     return partners
 
 @api_router.get("/wellness-partners/{partner_id}", response_model=WellnessPartner)
-async def get_wellness_partner(partner_id: str):
-    partner = await db.wellness_partners.find_one({"id": partner_id}, {"_id": 0})
+async def get_wellness_partner(partner_id: str, request: Request, response: Response):
+    partner = await find_partner(partner_id)
     if not partner:
         raise HTTPException(status_code=404, detail="Partner not found")
-    return partner
+    return conditional_get(partner, request, response)
+
+@api_router.get("/wellness-partners/{partner_id}/availability", response_model=List[SlotAvailability])
+async def get_partner_availability(partner_id: str, start_date: str, end_date: Optional[str] = None):
+    start = parse_date_param(start_date, "start_date")
+    end = parse_date_param(end_date, "end_date") if end_date else start
+    if end < start:
+        raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+    if (end - start).days >= MAX_AVAILABILITY_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range is limited to {MAX_AVAILABILITY_DAYS} days")
+
+    partner = await find_partner(partner_id)
+    if not partner:
+        raise HTTPException(status_code=404, detail="Partner not found")
+
+    slots = expand_slot_templates(partner.get("slot_templates", []), start, end)
+    if not slots:
+        return []
+
+    # Served by the (partner_id, booking_date, booking_time, seat) index
+    booked = await db.bookings.aggregate([
+        {"$match": {
+            "partner_id": partner_id,
+            "booking_date": {"$gte": start.isoformat(), "$lte": end.isoformat()},
+            "seat": {"$gte": 0},
+        }},
+        {"$group": {"_id": {"date": "$booking_date", "time": "$booking_time"}, "count": {"$sum": 1}}},
+    ]).to_list(None)
+    taken = {(b["_id"]["date"], b["_id"]["time"]): b["count"] for b in booked}
+
+    return [
+        SlotAvailability(
+            booking_date=slot_date,
+            booking_time=slot_time,
+            capacity=capacity,
+            available=max(capacity - taken.get((slot_date, slot_time), 0), 0)
+        )
+        for (slot_date, slot_time), capacity in sorted(slots.items())
+    ]
 
 # Booking endpoints
 @api_router.post("/bookings", response_model=Booking)
 async def create_booking(booking_data: BookingCreate, current_user: dict = Depends(get_current_user)):
     # Get employee data - auto-create if not exists
-    employee = await db.employees.find_one({"user_id": current_user["id"]}, {"_id": 0})
-    if not employee:
-        # Auto-create employee profile
-        company_id = current_user.get("company_id") or "default-company"
-        employee_data = Employee(
-            user_id=current_user["id"],
-            company_id=company_id,
-            employee_id=f"EMP-{str(uuid.uuid4())[:8].upper()}",
-            department="General",
-            designation="Employee",
-            date_of_joining=datetime.now(timezone.utc).strftime("%Y-%m-%d"),
-            date_of_birth="1990-01-01",
-            phone="0000000000",
-            emergency_contact="0000000000",
-            status="active"
-        )
-        await db.employees.insert_one(employee_data.model_dump())
-        employee = employee_data.model_dump()
+    employee = await get_or_create_employee(current_user)
+    
+    partner = await find_partner(booking_data.partner_id)
+    if not partner:
+        raise HTTPException(status_code=404, detail="Partner not found")
     
     booking = Booking(
         **booking_data.model_dump(),
         employee_id=employee["id"],
         status="scheduled"
     )
-    await db.bookings.insert_one(booking.model_dump())
+    
+    # Partners without slot templates keep the legacy free-form booking flow
+    templates = partner.get("slot_templates", [])
+    if not templates:
+        await insert_batcher.insert(db.bookings, booking.model_dump())
+        cache_bus.publish(booking_reminders.name, booking.id)
+        return booking
+    
+    booking_day = parse_date_param(booking_data.booking_date, "booking_date")
+    try:
+        booking_time = format_minutes(parse_minutes(booking_data.booking_time))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid booking_time, expected HH:MM")
+    capacity = expand_slot_templates(templates, booking_day, booking_day).get(
+        (booking_day.isoformat(), booking_time)
+    )
+    if not capacity:
+        raise HTTPException(status_code=400, detail="Requested time is not an available slot")
+    booking.booking_date = booking_day.isoformat()
+    booking.booking_time = booking_time
+    booking = await reserve_seat(booking, capacity)
+    cache_bus.publish(booking_reminders.name, booking.id)
     return booking
 
-@api_router.get("/bookings", response_model=List[Booking])
-async def get_bookings(current_user: dict = Depends(get_current_user)):
-    employee = await db.employees.find_one({"user_id": current_user["id"]}, {"_id": 0})
+@api_router.get("/bookings", response_model=List[BookingView])
+async def get_bookings(expand: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    expand_fields = parse_expand(expand, {"partner"})
+    employee = await find_employee_for_user(current_user["id"])
     if not employee:
         return []
     
     bookings = await db.bookings.find({"employee_id": employee["id"]}, {"_id": 0}).to_list(1000)
-    return bookings
+    return await expand_bookings(bookings, expand_fields)
+
+@api_router.post("/bookings/{booking_id}/cancel", response_model=Booking)
+async def cancel_booking(booking_id: str, response: Response, if_match: Optional[str] = Header(None), current_user: dict = Depends(get_current_user)):
+    employee = await find_employee_for_user(current_user["id"])
+    if not employee:
+        raise HTTPException(status_code=404, detail="Booking not found")
+    
+    # Releasing the seat frees the slot for other employees
+    update_data = {"status": "cancelled", "seat": None}
+    query = {"id": booking_id, "employee_id": employee["id"], "status": "scheduled"}
+    expected_version = parse_if_match(if_match)
+    if expected_version is not None:
+        query.update(version_filter(expected_version))
+    
+    previous = await db.bookings.find_one_and_update(query, versioned_update(update_data), projection={"_id": 0})
+    if previous is None:
+        existing = await db.bookings.find_one({"id": booking_id, "employee_id": employee["id"]}, {"_id": 0, "status": 1})
+        if existing and existing["status"] != "scheduled":
+            raise HTTPException(status_code=409, detail="Only scheduled bookings can be cancelled")
+        if existing:
+            raise HTTPException(status_code=412, detail="Booking was modified by another request")
+        raise HTTPException(status_code=404, detail="Booking not found")
+    booking = apply_versioned_update(previous, update_data)
+    
+    cache_bus.publish(booking_reminders.name, booking_id)
+    record_audit("booking", booking_id, "cancel", current_user, employee["company_id"], {"status": "cancelled"})
+    response.headers["ETag"] = make_etag(booking)
+    return booking
 
 # Financial endpoints
 @api_router.post("/financials", response_model=Financial)
@@ -519,8 +1455,7 @@ async def create_financial(financial_data: FinancialCreate, current_user: dict =
         **financial_data.model_dump(),
         company_id=current_user["company_id"]
     )
-    await db.financials.insert_one(financial.model_dump())
-    return financial
+    return await ledger.post(financial.model_dump())
 
 @api_router.get("/financials", response_model=List[Financial])
 async def get_financials(current_user: dict = Depends(get_current_user)):
@@ -528,6 +1463,168 @@ async def get_financials(current_user: dict = Depends(get_current_user)):
     financials = await db.financials.find(query, {"_id": 0}).to_list(1000)
     return financials
 
+@api_router.get("/financials/balance", response_model=LedgerBalance)
+async def get_financial_balance(as_of: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    if as_of is None:
+        return await ledger.current_balance(current_user["company_id"])
+    # Include every entry dated on the as_of day
+    as_of_day = parse_date_param(as_of, "as_of")
+    return await ledger.balance_as_of(current_user["company_id"], datetime.combine(as_of_day, datetime.max.time(), tzinfo=timezone.utc))
+
+# Pricing endpoints
+@api_router.get("/pricing/quote", response_model=PremiumQuote)
+async def get_premium_quote(company_id: Optional[str] = None, plan_type: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    if current_user["role"] == "super_admin":
+        if not company_id:
+            raise HTTPException(status_code=400, detail="company_id is required")
+    elif current_user["role"] in ["company_admin", "hr_manager"]:
+        if company_id and company_id != current_user["company_id"]:
+            raise HTTPException(status_code=403, detail="Not authorized")
+        company_id = current_user["company_id"]
+    else:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    if plan_type and plan_type not in PLAN_BASE_MONTHLY_PREMIUM:
+        raise HTTPException(status_code=400, detail=f"Unknown plan_type: {plan_type}")
+    
+    company = await db.companies.find_one({"id": company_id}, {"_id": 0, "id": 1, "plan_type": 1, "roster_version": 1})
+    if not company:
+        raise HTTPException(status_code=404, detail="Company not found")
+    if not plan_type and company["plan_type"] not in PLAN_BASE_MONTHLY_PREMIUM:
+        raise HTTPException(status_code=400, detail=f"No rates for plan_type: {company['plan_type']}")
+    
+    return await pricing_engine.quote(company, plan_type)
+
+# Report endpoints
+def get_report_pool() -> ProcessPoolExecutor:
+    app_services = services()
+    if app_services.report_pool is None:
+        # spawn keeps the Motor client and its threads out of the workers
+        app_services.report_pool = ProcessPoolExecutor(
+            max_workers=settings.report_workers, mp_context=multiprocessing.get_context("spawn")
+        )
+    return app_services.report_pool
+
+def report_path(job: dict) -> Path:
+    return settings.reports_dir / f"{job['cache_key']}.{job['format']}"
+
+async def report_heartbeat(job_id: str):
+    # A job whose updated_at stops moving was lost with its process, and
+    # submit_report stops sharing it
+    while True:
+        await asyncio.sleep(settings.report_stale_seconds / 4)
+        await db.report_jobs.update_one({"id": job_id, "status": "running"}, {"$set": {"updated_at": utc_now()}})
+
+async def run_report_job(job: ReportJob):
+    await db.report_jobs.update_one({"id": job.id}, {"$set": {"status": "running", "updated_at": utc_now()}})
+    heartbeat = asyncio.create_task(report_heartbeat(job.id))
+    try:
+        await asyncio.get_running_loop().run_in_executor(
+            get_report_pool(),
+            reports.build_report,
+            settings.mongo_url,
+            settings.db_name,
+            job.report_type,
+            job.format,
+            job.company_id,
+            job.params,
+            str(report_path(job.model_dump()))
+        )
+        reports.evict_cached_reports(settings.reports_dir, settings.report_cache_max_files)
+        update = {"status": "completed", "completed_at": utc_now()}
+    except Exception as exc:
+        logger.exception(f"Report job {job.id} failed")
+        update = {"status": "failed", "error": str(exc), "completed_at": utc_now()}
+    finally:
+        heartbeat.cancel()
+    await db.report_jobs.update_one({"id": job.id}, {"$set": {**update, "updated_at": update["completed_at"]}})
+
+@api_router.post("/reports", response_model=ReportJob)
+async def submit_report(report_request: ReportRequest, current_user: dict = Depends(get_current_user)):
+    if current_user["role"] not in ["company_admin", "hr_manager"]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    if report_request.report_type not in reports.REPORT_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unknown report_type: {report_request.report_type}")
+    if report_request.format not in reports.REPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {report_request.format}")
+    if not reports.format_available(report_request.format):
+        raise HTTPException(status_code=400, detail=f"{report_request.format} reports are not available on this server")
+    start = parse_date_param(report_request.start_date, "start_date") if report_request.start_date else None
+    end = parse_date_param(report_request.end_date, "end_date") if report_request.end_date else None
+    if start and end and start > end:
+        raise HTTPException(status_code=400, detail="start_date must not be after end_date")
+    
+    company_id = current_user["company_id"]
+    params = {"start_date": report_request.start_date, "end_date": report_request.end_date}
+    watermark = await reports.data_watermark(db, report_request.report_type, company_id)
+    key = reports.cache_key(report_request.report_type, report_request.format, company_id, params, watermark)
+    
+    # Identical request already being built: share that job, unless its
+    # heartbeat has stopped
+    pending = await db.report_jobs.find_one({
+        "cache_key": key,
+        "status": {"$in": ["queued", "running"]},
+        "updated_at": {"$gte": utc_now() - timedelta(seconds=settings.report_stale_seconds)},
+    }, {"_id": 0})
+    if pending:
+        return pending
+    # Anyone still polling a lost job learns it will not finish
+    await db.report_jobs.update_many(
+        {"cache_key": key, "status": {"$in": ["queued", "running"]}},
+        {"$set": {"status": "failed", "error": "Report worker stopped, please submit it again", "updated_at": utc_now()}}
+    )
+    
+    job = ReportJob(
+        company_id=company_id,
+        requested_by=current_user["id"],
+        report_type=report_request.report_type,
+        format=report_request.format,
+        params=params,
+        cache_key=key,
+        status="queued"
+    )
+    if report_path(job.model_dump()).exists():
+        job.status = "completed"
+        job.completed_at = job.created_at
+        await db.report_jobs.insert_one(job.model_dump())
+        return job
+    
+    settings.reports_dir.mkdir(parents=True, exist_ok=True)
+    await db.report_jobs.insert_one(job.model_dump())
+    # Fresh context: the job outlives this request and its deadline, but
+    # still runs against this app's services
+    app_services = services()
+    context = contextvars.Context()
+    context.run(current_services.set, app_services)
+    task = asyncio.create_task(run_report_job(job), context=context)
+    app_services.report_tasks.add(task)
+    task.add_done_callback(app_services.report_tasks.discard)
+    return job
+
+async def get_report_job_for_user(job_id: str, current_user: dict) -> dict:
+    job = await db.report_jobs.find_one({"id": job_id}, {"_id": 0})
+    if not job or job["company_id"] != current_user["company_id"]:
+        raise HTTPException(status_code=404, detail="Report job not found")
+    return job
+
+@api_router.get("/reports/{job_id}", response_model=ReportJob)
+async def get_report_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    return await get_report_job_for_user(job_id, current_user)
+
+@api_router.get("/reports/{job_id}/download")
+async def download_report(job_id: str, current_user: dict = Depends(get_current_user)):
+    job = await get_report_job_for_user(job_id, current_user)
+    if job["status"] != "completed":
+        raise HTTPException(status_code=409, detail=f"Report is {job['status']}")
+    path = report_path(job)
+    if not path.exists():
+        raise HTTPException(status_code=410, detail="Report has expired, please submit it again")
+    return FileResponse(
+        path,
+        media_type=reports.REPORT_FORMATS[job["format"]][1],
+        filename=f"{job['report_type']}.{job['format']}"
+    )
+
 # Dashboard statistics
 @api_router.get("/dashboard/stats")
 async def get_dashboard_stats(current_user: dict = Depends(get_current_user)):
@@ -542,13 +1639,20 @@ async def get_dashboard_stats(current_user: dict = Depends(get_current_user)):
     pending_claims = len([c for c in claims if c["status"] == "submitted"])
     approved_claims = len([c for c in claims if c["status"] == "approved"])
     rejected_claims = len([c for c in claims if c["status"] == "rejected"])
-    total_claim_amount = sum([c["amount"] for c in claims])
-    approved_claim_amount = sum([c["amount"] for c in claims if c["status"] == "approved"])
+    total_claim_cents = sum([amount_cents(c) for c in claims])
+    approved_claim_cents = sum([amount_cents(c) for c in claims if c["status"] == "approved"])
+    
+    # Closed claims moved to claims_archive are tracked as running totals
+    archived = await db.claims_archive_stats.find_one({"company_id": company_id}, {"_id": 0})
+    if archived:
+        total_claims += archived["total_claims"]
+        approved_claims += archived["approved_claims"]
+        rejected_claims += archived["rejected_claims"]
+        total_claim_cents += running_total_cents(archived, "total_claim_amount")
+        approved_claim_cents += running_total_cents(archived, "approved_claim_amount")
     
-    # Financial data
-    financials = await db.financials.find({"company_id": company_id}, {"_id": 0}).to_list(1000)
-    total_premiums = sum([f["amount"] for f in financials if f["transaction_type"] == "premium_payment"])
-    total_payouts = sum([f["amount"] for f in financials if f["transaction_type"] == "claim_payout"])
+    # Financial data, kept as running totals by the ledger
+    balance = await ledger.current_balance(company_id)
     
     return {
         "employee_count": employee_count,
@@ -556,23 +1660,113 @@ async def get_dashboard_stats(current_user: dict = Depends(get_current_user)):
         "pending_claims": pending_claims,
         "approved_claims": approved_claims,
         "rejected_claims": rejected_claims,
-        "total_claim_amount": total_claim_amount,
-        "approved_claim_amount": approved_claim_amount,
-        "total_premiums": total_premiums,
-        "total_payouts": total_payouts,
-        "net_balance": total_premiums - total_payouts
+        "total_claim_amount": from_cents(total_claim_cents),
+        "approved_claim_amount": from_cents(approved_claim_cents),
+        "total_premiums": balance["total_premiums"],
+        "total_payouts": balance["total_payouts"],
+        "net_balance": balance["net_balance"]
     }
 
-# Include the router in the main app
-app.include_router(api_router)
+# Audit log endpoints
+AUDIT_LOG_ORDER = [("timestamp", DESCENDING), ("id", DESCENDING)]
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+@api_router.get("/audit-log", response_model=List[AuditEvent])
+async def get_audit_log(
+    entity_type: Optional[str] = None,
+    entity_id: Optional[str] = None,
+    before: Optional[str] = None,
+    before_id: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    current_user: dict = Depends(get_current_user)
+):
+    if current_user["role"] not in ["super_admin", "company_admin", "hr_manager"]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    query = {}
+    if current_user["role"] != "super_admin":
+        query["company_id"] = current_user["company_id"]
+    if entity_type:
+        query["entity_type"] = entity_type
+    if entity_id:
+        query["entity_id"] = entity_id
+    # Keyset pagination: pass the timestamp and id of the last event as
+    # ?before= and ?before_id=; events of one flush often share a timestamp
+    if before:
+        try:
+            cursor_time = parse_timestamp(before)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid before, expected an ISO timestamp")
+        older = date_range("timestamp", {"$lt": cursor_time})
+        if before_id:
+            query["$or"] = [older, {"$and": [date_range("timestamp", {"$eq": cursor_time}), {"id": {"$lt": before_id}}]}]
+        else:
+            query.update(older)
+    
+    events = await db.audit_log.find(query, {"_id": 0}).sort(AUDIT_LOG_ORDER).limit(limit).to_list(limit)
+    return events
+
+@api_router.get("/audit-log/metrics")
+async def get_audit_log_metrics(current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "super_admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return audit_log.metrics()
+
+@api_router.get("/cache/metrics")
+async def get_cache_metrics(current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "super_admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return cache_bus.metrics()
+
+@api_router.get("/load/metrics")
+async def get_load_metrics(current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "super_admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return load_controller.metrics()
+
+@api_router.get("/booking-reminders/metrics")
+async def get_booking_reminder_metrics(current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "super_admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return booking_reminders.metrics()
+
+@api_router.get("/profiles")
+async def list_profiles(limit: int = Query(100, ge=1, le=1000), current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "super_admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return await asyncio.to_thread(request_profiler.list_profiles, limit)
+
+@api_router.get("/profiles/{profile_id}")
+async def download_profile(profile_id: str, current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "super_admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    path = request_profiler.profile_path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=path.name)
+
+@api_router.get("/insert-batches/metrics")
+async def get_insert_batch_metrics(current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "super_admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return insert_batcher.metrics()
+
+async def database_error_handler(request: Request, exc: PyMongoError):
+    if not exc.timeout:
+        raise exc
+    load_controller.record_timeout(request.scope)
+    logger.warning(f"{request.method} {request.url.path} ran out of its database deadline: {exc}")
+    return JSONResponse(status_code=503, content={"detail": "Request deadline exceeded, retry later"}, headers={"Retry-After": "1"})
+
+def profile_requested_by_admin(headers: dict) -> bool:
+    # Runs before routing, so the role is read from the token alone
+    scheme, _, token = headers.get(b"authorization", b"").decode().partition(" ")
+    if scheme.lower() != "bearer":
+        return False
+    try:
+        payload = jwt.decode(token, settings.jwt_secret, algorithms=[ALGORITHM])
+    except jwt.PyJWTError:
+        return False
+    return payload.get("role") == "super_admin"
 
 # Configure logging
 logging.basicConfig(
@@ -581,6 +1775,124 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
+async def create_indexes(db):
+    # Point lookups and ?expand= batches resolve entities by their "id"
+    for collection in (db.users, db.companies, db.employees, db.claims, db.wellness_partners, db.bookings):
+        await collection.create_index("id", unique=True)
+
+    # One employee profile per user; get_or_create_employee relies on it
+    try:
+        await db.employees.create_index("user_id", unique=True)
+    except OperationFailure:
+        logger.exception("Could not build the unique employees.user_id index; remove duplicate employee profiles and restart")
+
+    # Hot claims are scanned by the archival job; the archive serves
+    # include_archived reads and detail lookups of old claims.
+    await db.claims.create_index([("status", ASCENDING), ("review_date", ASCENDING)])
+    # Review queue order for /claims/next
+    await db.claims.create_index([("company_id", ASCENDING), ("status", ASCENDING), *CLAIM_QUEUE_ORDER])
+    await db.claims_archive.create_index("id", unique=True)
+    await db.claims_archive.create_index("company_id")
+    await db.claims_archive.create_index("employee_id")
+    await db.claims_archive_stats.create_index("company_id", unique=True)
+    await db.employees.create_index([("company_id", ASCENDING), ("status", ASCENDING)])
+    await db.employees.create_index([("company_id", ASCENDING), ("search_terms", ASCENDING)])
+    await db.report_jobs.create_index("id", unique=True)
+    await db.report_jobs.create_index([("cache_key", ASCENDING), ("status", ASCENDING)])
+    await db.roster_changes.create_index([("company_id", ASCENDING), ("roster_version", ASCENDING)], unique=True)
+    await db.wellness_partners.create_index([("location", "2dsphere"), ("service_type", ASCENDING)])
+    await db.bookings.create_index([("status", ASCENDING), ("booking_date", ASCENDING), ("booking_time", ASCENDING)])
+    await db.ledger_accounts.create_index("company_id", unique=True)
+    await db.ledger_checkpoints.create_index([("company_id", ASCENDING), ("sequence", DESCENDING)])
+    # A claim payout's id is the claim's payout_id, so a payout posted
+    # twice (by the API and a concurrent repair) is refused, not paid twice
+    await db.financials.create_index("id", unique=True)
+    await db.financials.create_index([("company_id", ASCENDING), ("transaction_date", ASCENDING)])
+    # Payout lookups by claim, for reconciliation
+    await db.financials.create_index(
+        [("reference_id", ASCENDING)],
+        name="claim_payout_reference",
+        partialFilterExpression={"transaction_type": "claim_payout"}
+    )
+    await db.audit_log.create_index([("company_id", ASCENDING), *AUDIT_LOG_ORDER])
+    await db.audit_log.create_index([("entity_type", ASCENDING), ("entity_id", ASCENDING), *AUDIT_LOG_ORDER])
+
+    # Seats are only assigned for partners with slot templates; legacy
+    # bookings without a seat are left out of the uniqueness constraint.
+    await db.bookings.create_index(
+        [("partner_id", ASCENDING), ("booking_date", ASCENDING), ("booking_time", ASCENDING), ("seat", ASCENDING)],
+        name="partner_slot_seat_unique",
+        unique=True,
+        partialFilterExpression={"seat": {"$gte": 0}}
+    )
+
+class ServicesMiddleware:
+    """Outermost ASGI middleware binding an app's services to everything
+    it runs, lifespan included."""
+
+    def __init__(self, app, app_services: AppServices):
+        self.app = app
+        self.app_services = app_services
+
+    async def __call__(self, scope, receive, send):
+        token = current_services.set(self.app_services)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_services.reset(token)
+
+def create_app(app_settings: Optional[Settings] = None, database=None) -> FastAPI:
+    """Builds an app with its own settings, caches and executors.
+
+    Nothing connects until the app starts: the Motor client, indexes and
+    background tasks are set up in the lifespan handler. ``database``
+    replaces the Motor database, for tests.
+    """
+    global latest_services
+    app_services = AppServices(app_settings or Settings.from_env(), database)
+    latest_services = app_services
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        await app_services.start()
+        try:
+            yield
+        finally:
+            await app_services.stop()
+
+    app = FastAPI(lifespan=lifespan)
+    app.state.services = app_services
+    # The /api routes hold no per-app state; sharing them instead of
+    # include_router() skips rebuilding every route's validators per app
+    app.router.routes.extend(api_router.routes)
+    app.add_exception_handler(PyMongoError, database_error_handler)
+
+    # Inside load shedding, so only admitted requests are profiled
+    app.add_middleware(
+        ProfilingMiddleware,
+        profiler=app_services.request_profiler,
+        authorize=profile_requested_by_admin,
+        sample_rate=app_services.settings.profile_sample_rate
+    )
+
+    # Added before CORS so shed responses still carry CORS headers
+    app.add_middleware(LoadSheddingMiddleware, controller=app_services.load_controller)
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_credentials=True,
+        allow_origins=app_services.settings.cors_origins,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["ETag", "X-Profile-Id"],
+    )
+
+    app.add_middleware(ServicesMiddleware, app_services=app_services)
+    return app
+
+def __getattr__(name):
+    # "uvicorn server:app" builds the default app on first access
+    if name == "app":
+        globals()["app"] = create_app()
+        return globals()["app"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,104 @@
+"""Typed configuration for the API, read from the environment once.
+
+Every field maps to the environment variable of the same name in upper
+case (``mongo_url`` -> ``MONGO_URL``); route class limits are read from
+``<CLASS>_MAX_CONCURRENCY`` and ``<CLASS>_DEADLINE_MS``.
+"""
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Literal, Mapping, Optional
+
+from pydantic import BaseModel, ConfigDict
+
+ROOT_DIR = Path(__file__).parent
+
+# Route class -> (max concurrency, deadline in ms)
+DEFAULT_ROUTE_CLASS_LIMITS = {
+    "auth": (8, 5000),
+    "reads": (64, 2000),
+    "writes": (32, 3000),
+    "analytics": (8, 10000),
+}
+
+
+class RouteClassLimits(BaseModel):
+    max_concurrency: int
+    deadline_ms: float
+
+
+class Settings(BaseModel):
+    # Values are plain attributes so tests can override them per app
+    model_config = ConfigDict(validate_assignment=True)
+
+    mongo_url: str
+    db_name: str
+    jwt_secret: str
+    access_token_expire_minutes: int = 60 * 24
+    # None keeps passlib's default bcrypt cost
+    bcrypt_rounds: Optional[int] = None
+    cors_origins: List[str] = ["*"]
+
+    audit_flush_interval_ms: int = 500
+    audit_max_batch: int = 500
+    audit_max_buffer: int = 10000
+    insert_batch_window_ms: float = 2
+    insert_batch_max: int = 500
+    ledger_checkpoint_interval: int = 500
+
+    reports_dir: Path = ROOT_DIR / "report_cache"
+    report_workers: int = 2
+    report_cache_max_files: int = 200
+    # A queued or running job not heard from for this long is rebuilt
+    report_stale_seconds: float = 600
+
+    # A claim whose fingerprint matches one submitted within the lookback is
+    # flagged with duplicate_of, or rejected with 409 under the "reject" policy
+    claim_duplicate_lookback_days: int = 90
+    claim_duplicate_policy: Literal["flag", "reject"] = "flag"
+    # How long a claim handed out by /claims/next stays with its reviewer
+    claim_lease_seconds: float = 600
+
+    booking_reminders_enabled: bool = True
+    booking_reminder_window_seconds: float = 300
+    booking_reminder_lease_seconds: float = 30
+    booking_timezone: str = "UTC"
+
+    cache_ttl_seconds: float = 300
+    cache_bus_dir: Optional[Path] = None
+
+    route_class_limits: Dict[str, RouteClassLimits] = {
+        name: RouteClassLimits(max_concurrency=limit, deadline_ms=deadline)
+        for name, (limit, deadline) in DEFAULT_ROUTE_CLASS_LIMITS.items()
+    }
+    load_queue_target_ms: float = 50
+    load_queue_interval_ms: float = 500
+
+    profiles_dir: Path = ROOT_DIR / "profiles"
+    profile_sample_rate: float = 0
+    profile_interval_ms: float = 5
+    profile_max_files: int = 200
+
+    @property
+    def resolved_cache_bus_dir(self) -> Path:
+        # Workers serving the same database on this host share a bus
+        return self.cache_bus_dir or Path(tempfile.gettempdir()) / f"carequo-cache-bus-{self.db_name}"
+
+    @classmethod
+    def from_env(cls, environ: Mapping[str, str] = os.environ, **overrides) -> "Settings":
+        values = {}
+        for name in cls.model_fields:
+            if name == "route_class_limits":
+                continue
+            if name.upper() in environ:
+                values[name] = environ[name.upper()]
+        if "cors_origins" in values:
+            values["cors_origins"] = values["cors_origins"].split(",")
+        values["route_class_limits"] = {
+            name: RouteClassLimits(
+                max_concurrency=environ.get(f"{name.upper()}_MAX_CONCURRENCY", limit),
+                deadline_ms=environ.get(f"{name.upper()}_DEADLINE_MS", deadline)
+            )
+            for name, (limit, deadline) in DEFAULT_ROUTE_CLASS_LIMITS.items()
+        }
+        return cls(**{**values, **overrides})
@@ -0,0 +1,244 @@
+"""Export one company's data to a compressed archive and import it again.
+
+An archive is a directory holding ``manifest.json`` and, per collection,
+gzip-compressed chunks of concatenated BSON documents
+(``claims-00000.bson.gz``, ...). BSON keeps dates, integer cents and
+``_id`` values exactly as stored. Collections are exported concurrently,
+each streaming through a cursor and writing one cursor batch at a time,
+so memory stays bounded regardless of tenant size. The manifest is
+written last and marks the archive as complete.
+
+Imports insert chunks with unordered ``insert_many`` batches and skip
+duplicate-key errors, so re-running an interrupted import is safe.
+Completed chunks are recorded in ``import-progress.json`` next to the
+manifest and are skipped on ``--resume``.
+
+An export is not a point-in-time snapshot; pause the tenant's writes
+when an exact copy is needed.
+
+Usage:
+    python tenant_archive.py export --company-id <company id> --out /backups/acme
+    python tenant_archive.py import --archive /backups/acme --resume
+"""
+import argparse
+import asyncio
+import gzip
+import itertools
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+
+import bson
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import BulkWriteError
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+ARCHIVE_FORMAT = "bson.gz"
+MANIFEST = "manifest.json"
+IMPORT_PROGRESS = "import-progress.json"
+DEFAULT_CHUNK_DOCUMENTS = 100000
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_CONCURRENCY = 4
+EMPLOYEE_ID_CHUNK = 10000
+DUPLICATE_KEY_ERROR = 11000
+
+# Collections holding tenant data, each selected by company_id unless
+# listed in TENANT_QUERIES. Bookings have no company_id and are selected
+# through the company's employees. report_jobs is left out on purpose: a
+# job points at a cached file on the exporting server's disk, and the
+# importing side rebuilds reports on request.
+TENANT_COLLECTIONS = [
+    "companies", "users", "employees", "claims", "claims_archive", "claims_archive_stats", "claim_fingerprints",
+    "bookings", "financials", "ledger_accounts", "ledger_checkpoints", "roster_changes", "audit_log",
+]
+TENANT_QUERIES = {
+    "companies": lambda company_id: {"id": company_id},
+}
+
+logger = logging.getLogger(__name__)
+
+
+class ChunkWriter:
+    # Writes documents to numbered gzip chunks of at most chunk_documents each
+    def __init__(self, directory: Path, collection: str, chunk_documents: int):
+        self.directory = directory
+        self.collection = collection
+        self.chunk_documents = chunk_documents
+        self.chunks = []
+        self.documents = 0
+        self._file = None
+        self._in_chunk = 0
+
+    def _open_next(self):
+        name = f"{self.collection}-{len(self.chunks):05d}.{ARCHIVE_FORMAT}"
+        self._file = gzip.open(self.directory / name, "wb", compresslevel=6)
+        self.chunks.append(name)
+        self._in_chunk = 0
+
+    def write(self, documents: list):
+        for document in documents:
+            if self._file is None or self._in_chunk >= self.chunk_documents:
+                self.close()
+                self._open_next()
+            self._file.write(bson.encode(document))
+            self._in_chunk += 1
+            self.documents += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+async def tenant_queries(db, company_id: str) -> dict:
+    queries = {
+        name: TENANT_QUERIES.get(name, lambda cid: {"company_id": cid})(company_id)
+        for name in TENANT_COLLECTIONS if name != "bookings"
+    }
+    employee_ids = await db.employees.distinct("id", {"company_id": company_id})
+    queries["bookings"] = [
+        {"employee_id": {"$in": employee_ids[i:i + EMPLOYEE_ID_CHUNK]}}
+        for i in range(0, len(employee_ids), EMPLOYEE_ID_CHUNK)
+    ]
+    return queries
+
+
+async def export_collection(db, name: str, queries, directory: Path, chunk_documents: int, batch_size: int) -> dict:
+    writer = ChunkWriter(directory, name, chunk_documents)
+    try:
+        for query in queries if isinstance(queries, list) else [queries]:
+            cursor = db[name].find(query, batch_size=batch_size)
+            batch = []
+            async for document in cursor:
+                batch.append(document)
+                if len(batch) >= batch_size:
+                    # Compression runs off the event loop so collections overlap
+                    await asyncio.to_thread(writer.write, batch)
+                    batch = []
+            if batch:
+                await asyncio.to_thread(writer.write, batch)
+    finally:
+        writer.close()
+    logger.info(f"Exported {writer.documents} {name} documents in {len(writer.chunks)} chunks")
+    return {"documents": writer.documents, "chunks": writer.chunks}
+
+
+async def export_tenant(
+    db,
+    company_id: str,
+    directory: Path,
+    chunk_documents: int = DEFAULT_CHUNK_DOCUMENTS,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    concurrency: int = DEFAULT_CONCURRENCY
+) -> dict:
+    directory.mkdir(parents=True, exist_ok=True)
+    if (directory / MANIFEST).exists():
+        raise FileExistsError(f"{directory} already holds an archive")
+    queries = await tenant_queries(db, company_id)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def export_one(name: str) -> dict:
+        async with semaphore:
+            return await export_collection(db, name, queries[name], directory, chunk_documents, batch_size)
+
+    results = await asyncio.gather(*(export_one(name) for name in TENANT_COLLECTIONS))
+    manifest = {
+        "company_id": company_id,
+        "format": ARCHIVE_FORMAT,
+        "exported_at": datetime.now(timezone.utc).isoformat(),
+        "collections": dict(zip(TENANT_COLLECTIONS, results)),
+    }
+    (directory / MANIFEST).write_text(json.dumps(manifest, indent=2))
+    return manifest
+
+
+async def insert_ignoring_duplicates(collection, documents: list) -> int:
+    try:
+        result = await collection.insert_many(documents, ordered=False)
+        return len(result.inserted_ids)
+    except BulkWriteError as exc:
+        if any(error["code"] != DUPLICATE_KEY_ERROR for error in exc.details["writeErrors"]):
+            raise
+        return exc.details["nInserted"]
+
+
+async def import_tenant(
+    db,
+    directory: Path,
+    resume: bool = False,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    concurrency: int = DEFAULT_CONCURRENCY
+) -> dict:
+    manifest = json.loads((directory / MANIFEST).read_text())
+    progress_path = directory / IMPORT_PROGRESS
+    completed = set(json.loads(progress_path.read_text())) if resume and progress_path.exists() else set()
+    semaphore = asyncio.Semaphore(concurrency)
+    inserted = {}
+
+    def save_progress():
+        progress_path.write_text(json.dumps(sorted(completed)))
+
+    async def import_chunk(name: str, chunk: str):
+        async with semaphore:
+            with gzip.open(directory / chunk, "rb") as chunk_file:
+                documents = bson.decode_file_iter(chunk_file)
+                while True:
+                    # Decompress one batch at a time, off the event loop
+                    batch = await asyncio.to_thread(list, itertools.islice(documents, batch_size))
+                    if not batch:
+                        break
+                    inserted[name] = inserted.get(name, 0) + await insert_ignoring_duplicates(db[name], batch)
+            completed.add(chunk)
+            save_progress()
+
+    await asyncio.gather(*(
+        import_chunk(name, chunk)
+        for name, entry in manifest["collections"].items()
+        for chunk in entry["chunks"]
+        if chunk not in completed
+    ))
+    for name, count in inserted.items():
+        logger.info(f"Imported {count} {name} documents")
+    return inserted
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Export or import one company's data")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export")
+    export_parser.add_argument("--company-id", required=True)
+    export_parser.add_argument("--out", required=True, type=Path, help="Archive directory to create")
+    export_parser.add_argument("--chunk-documents", type=int, default=DEFAULT_CHUNK_DOCUMENTS)
+    import_parser = commands.add_parser("import")
+    import_parser.add_argument("--archive", required=True, type=Path)
+    import_parser.add_argument("--resume", action="store_true", help="Skip chunks a previous run completed")
+    for command in (export_parser, import_parser):
+        command.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+        command.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    try:
+        if args.command == "export":
+            manifest = await export_tenant(db, args.company_id, args.out, args.chunk_documents, args.batch_size, args.concurrency)
+            total = sum(entry["documents"] for entry in manifest["collections"].values())
+            logger.info(f"Exported {total} documents for company {args.company_id} to {args.out}")
+        else:
+            inserted = await import_tenant(db, args.archive, args.resume, args.batch_size, args.concurrency)
+            logger.info(f"Imported {sum(inserted.values())} documents from {args.archive}")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    asyncio.run(main())
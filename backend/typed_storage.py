@@ -0,0 +1,93 @@
+"""Stored representations of timestamps and money.
+
+Timestamps are stored as BSON dates and money as integer cents in an
+``<field>_cents`` companion of the API field (``amount`` -> ``amount_cents``).
+The API keeps returning ISO 8601 strings and decimal amounts.
+
+Documents written before the storage migration (see migrate_storage.py)
+still hold ISO strings and float amounts, so every reader here accepts
+both forms until the migration has run everywhere.
+"""
+from datetime import datetime, timezone
+from typing import Annotated, Optional
+
+from pydantic import AfterValidator, PlainSerializer
+
+
+def to_millis(value: datetime) -> datetime:
+    # BSON dates hold milliseconds; anything finer is lost on write
+    return value.replace(microsecond=value.microsecond // 1000 * 1000)
+
+
+def utc_now() -> datetime:
+    return to_millis(datetime.now(timezone.utc))
+
+
+def as_utc(value: datetime) -> datetime:
+    # MongoDB returns naive datetimes that are always UTC
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def as_stored(value: datetime) -> datetime:
+    return to_millis(as_utc(value))
+
+
+def parse_timestamp(value) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return value if value is None else as_utc(value)
+    return as_utc(datetime.fromisoformat(value))
+
+
+# Model field type: parses ISO strings or BSON dates, dumps to a datetime
+# for storage and to the pre-migration ISO format in JSON responses. Values
+# are cut to BSON precision so a create response matches later reads.
+Timestamp = Annotated[
+    datetime,
+    AfterValidator(as_stored),
+    PlainSerializer(lambda value: value.isoformat(), return_type=str, when_used="json"),
+]
+
+
+def to_cents(amount) -> int:
+    return int(round((amount or 0) * 100))
+
+
+def from_cents(cents: int) -> float:
+    return cents / 100
+
+
+def amount_cents(document: dict, field: str = "amount") -> int:
+    cents_field = f"{field}_cents"
+    if cents_field in document:
+        return document[cents_field]
+    return to_cents(document.get(field))
+
+
+def running_total_cents(document: dict, field: str) -> int:
+    # Running totals are $inc'ed in <field>_cents; the migration folds any
+    # pre-migration float total into it, so both are added until then
+    return document.get(f"{field}_cents", 0) + to_cents(document.get(field))
+
+
+def money_document(document: dict, field: str = "amount") -> dict:
+    # Stored form of a model dump: the float amount becomes integer cents
+    document = dict(document)
+    document[f"{field}_cents"] = to_cents(document.pop(field))
+    return document
+
+
+def read_money(data, field: str = "amount"):
+    # Before-validator input: fill the API amount from stored cents
+    if isinstance(data, dict) and f"{field}_cents" in data and data.get(field) is None:
+        return {**data, field: from_cents(data[f"{field}_cents"])}
+    return data
+
+
+def date_range(field: str, bounds: dict) -> dict:
+    # Matches BSON dates and, until the migration is complete, the ISO
+    # strings written before it; the string branch is an empty index range
+    # once every document is migrated.
+    return {"$or": [
+        {field: bounds},
+        {field: {op: value.isoformat() for op, value in bounds.items()}},
+    ]}
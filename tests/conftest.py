@@ -0,0 +1,199 @@
+"""Fixtures for running backend/server.py in-process against a throwaway database.
+
+By default the app talks to an in-memory mongomock stand-in wrapped so that
+every collection operation is counted. Set TEST_MONGO_URL to run against a
+real (throwaway) MongoDB instead; commands are then counted through pymongo
+command monitoring.
+"""
+import os
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+import pytest
+from pymongo import MongoClient, monitoring
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+os.environ.setdefault("MONGO_URL", os.environ.get("TEST_MONGO_URL", "mongodb://localhost:27017"))
+os.environ.setdefault("DB_NAME", f"carequo_test_{uuid.uuid4().hex[:8]}")
+os.environ.setdefault("JWT_SECRET", "test-secret")
+os.environ.setdefault("CACHE_BUS_DIR", tempfile.mkdtemp(prefix="carequo-cache-bus-"))
+os.environ.setdefault("REPORTS_DIR", tempfile.mkdtemp(prefix="carequo-reports-"))
+os.environ.setdefault("PROFILES_DIR", tempfile.mkdtemp(prefix="carequo-profiles-"))
+# Keep background audit flushes out of per-request measurements
+os.environ.setdefault("AUDIT_FLUSH_INTERVAL_MS", "600000")
+os.environ.setdefault("BOOKING_REMINDERS_ENABLED", "false")
+
+import server  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from settings import Settings  # noqa: E402
+
+# Collection methods that each issue one database command
+COUNTED_METHODS = {
+    "find", "find_one", "aggregate", "distinct", "count_documents",
+    "insert_one", "insert_many", "update_one", "update_many", "replace_one",
+    "delete_one", "delete_many", "bulk_write",
+    "find_one_and_update", "find_one_and_delete", "find_one_and_replace",
+}
+IGNORED_COMMANDS = {"hello", "ismaster", "isMaster", "ping", "endSessions", "buildInfo", "saslStart", "saslContinue"}
+
+
+class CommandCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.commands = []
+
+    def reset(self):
+        self.commands = []
+
+    def record(self, name: str):
+        self.commands.append(name)
+
+    @property
+    def count(self) -> int:
+        return len(self.commands)
+
+    def started(self, event):
+        if event.command_name not in IGNORED_COMMANDS:
+            self.record(f"{event.command_name}:{event.command.get(event.command_name)}")
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+class CountingCollection:
+    def __init__(self, collection, counter: CommandCounter):
+        self._collection = collection
+        self._counter = counter
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name not in COUNTED_METHODS:
+            return attr
+
+        def counted(*args, **kwargs):
+            self._counter.record(f"{name}:{self._collection.name}")
+            return attr(*args, **kwargs)
+        return counted
+
+
+class CountingDatabase:
+    def __init__(self, database, counter: CommandCounter):
+        self._database = database
+        self._counter = counter
+
+    def __getattr__(self, name):
+        return CountingCollection(getattr(self._database, name), self._counter)
+
+    def __getitem__(self, name):
+        return CountingCollection(self._database[name], self._counter)
+
+
+def app_settings(**overrides) -> Settings:
+    # Minimum bcrypt cost keeps registration out of the timing budget
+    return Settings.from_env(bcrypt_rounds=4, **overrides)
+
+
+@pytest.fixture
+def command_counter():
+    return CommandCounter()
+
+
+@pytest.fixture
+def database(command_counter):
+    if os.environ.get("TEST_MONGO_URL"):
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(os.environ["TEST_MONGO_URL"], event_listeners=[command_counter])
+        yield client[os.environ["DB_NAME"]]
+        client.close()
+        with MongoClient(os.environ["TEST_MONGO_URL"]) as sync_client:
+            sync_client.drop_database(os.environ["DB_NAME"])
+    else:
+        from mongomock_motor import AsyncMongoMockClient
+        yield CountingDatabase(AsyncMongoMockClient()[os.environ["DB_NAME"]], command_counter)
+
+
+def clear_caches():
+    for cache in server.cache_bus.caches.values():
+        cache.invalidate("")
+
+
+@pytest.fixture
+def api(command_counter, database):
+    # A fresh app per test; creating one connects nothing until it starts
+    with TestClient(server.create_app(app_settings(), database)) as client:
+        yield Api(client, command_counter)
+
+
+class Api:
+    """TestClient wrapper that records DB commands and wall time per request."""
+
+    def __init__(self, client: TestClient, counter: CommandCounter):
+        self.client = client
+        self.counter = counter
+        self.last_commands = []
+        self.last_elapsed_ms = 0.0
+
+    def request(self, method: str, url: str, token: str = None, cold: bool = True, **kwargs):
+        headers = kwargs.pop("headers", {})
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        if cold:
+            clear_caches()
+        self.counter.reset()
+        started = time.perf_counter()
+        response = self.client.request(method, url, headers=headers, **kwargs)
+        self.last_elapsed_ms = (time.perf_counter() - started) * 1000
+        self.last_commands = list(self.counter.commands)
+        return response
+
+    def register(self, role: str, company_id: str = None, name: str = "Test User") -> dict:
+        response = self.request("POST", "/api/auth/register", json={
+            "email": f"{uuid.uuid4().hex[:10]}@example.com",
+            "password": "password123",
+            "name": name,
+            "role": role,
+            "company_id": company_id,
+        })
+        assert response.status_code == 200, response.text
+        return response.json()
+
+
+@pytest.fixture
+def tenant(api):
+    """A company with a super admin, an HR manager, one employee and a slotted partner."""
+    admin = api.register("super_admin")
+    company = api.request("POST", "/api/companies", token=admin["access_token"], json={
+        "name": "Acme",
+        "industry": "Tech",
+        "employee_count": 10,
+        "contact_email": "hr@acme.example.com",
+        "contact_phone": "5550100",
+        "address": "1 Main St",
+        "plan_type": "premium",
+    }).json()
+    hr = api.register("hr_manager", company["id"], name="Hannah Reviewer")
+    employee = api.register("employee", company["id"], name="Evan Employee")
+    partner = api.request("POST", "/api/wellness-partners", token=admin["access_token"], json={
+        "name": "Downtown Gym",
+        "service_type": "gym",
+        "description": "Gym",
+        "contact_email": "gym@example.com",
+        "contact_phone": "5550101",
+        "availability": "Weekdays",
+        "pricing": "Free",
+        "slot_templates": [{"weekday": day, "start_time": "09:00", "end_time": "12:00", "capacity": 2} for day in range(7)],
+    }).json()
+    return {
+        "company": company,
+        "admin": admin["access_token"],
+        "hr": hr["access_token"],
+        "employee": employee["access_token"],
+        "partner": partner,
+    }
@@ -0,0 +1,37 @@
+import subprocess
+import sys
+
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+
+import server
+from .conftest import BACKEND_DIR, app_settings
+
+
+def test_importing_server_stays_light():
+    # Report workers import pandas; API workers should not pay for it
+    loaded = subprocess.run(
+        [sys.executable, "-c", "import sys, server; print('pandas' in sys.modules)"],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    )
+    assert loaded.stdout.strip() == "False"
+
+
+def test_apps_in_one_process_keep_their_own_services():
+    first = server.create_app(app_settings(), AsyncMongoMockClient()["first"])
+    second = server.create_app(app_settings(access_token_expire_minutes=5), AsyncMongoMockClient()["second"])
+    assert first.state.services.user_cache is not second.state.services.user_cache
+
+    with TestClient(first) as first_client, TestClient(second) as second_client:
+        for client in (first_client, second_client):
+            # The email is free in each app's own database
+            registered = client.post("/api/auth/register", json={
+                "email": "someone@example.com", "password": "password123", "name": "Someone", "role": "super_admin",
+            })
+            assert registered.status_code == 200, registered.text
+            token = {"Authorization": f"Bearer {registered.json()['access_token']}"}
+            assert client.get("/api/auth/me", headers=token).status_code == 200
+
+    assert first.state.services.user_cache.metrics()["entries"] == 1
+    assert second.state.services.user_cache.metrics()["entries"] == 1
+    assert second.state.services.settings.access_token_expire_minutes == 5
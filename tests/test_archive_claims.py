@@ -0,0 +1,76 @@
+from datetime import timedelta
+
+import archive_claims
+import server
+from typed_storage import utc_now
+
+
+def closed_claims(api, tenant, count: int) -> list:
+    claims = []
+    for i in range(count):
+        claim = api.request("POST", "/api/claims", token=tenant["employee"], json={
+            "claim_type": "medical", "amount": 10.0 + i, "description": f"Visit {i}",
+        }).json()
+        api.request("PUT", f"/api/claims/{claim['id']}", token=tenant["hr"], json={"status": "approved" if i % 2 else "rejected"})
+        claims.append(claim["id"])
+    api.client.portal.call(server.db.claims.update_many, {}, {"$set": {"review_date": utc_now() - timedelta(days=120)}})
+    return claims
+
+
+def snapshot(api, tenant, claim_ids: list) -> tuple:
+    def view(claim: dict) -> dict:
+        return {key: value for key, value in claim.items() if key != "version"}
+
+    claims = [view(api.request("GET", f"/api/claims/{claim_id}", token=tenant["hr"]).json()) for claim_id in claim_ids]
+    listed = sorted((view(c) for c in api.request("GET", "/api/claims?include_archived=true", token=tenant["hr"]).json()),
+                    key=lambda claim: claim["id"])
+    stats = api.request("GET", "/api/dashboard/stats", token=tenant["hr"]).json()
+    return claims, listed, stats
+
+
+def test_archiving_closed_claims_changes_no_reads(api, tenant):
+    claim_ids = closed_claims(api, tenant, 3)
+    before = snapshot(api, tenant, claim_ids)
+
+    archived = api.client.portal.call(archive_claims.archive_closed_claims, server.db, 90, 2)
+
+    assert archived == 3
+    assert api.client.portal.call(server.db.claims.count_documents, {}) == 0
+    assert snapshot(api, tenant, claim_ids) == before
+    assert before[2]["total_claims"] == 3 and before[2]["approved_claims"] == 1
+
+
+class ReopenBeforeDelete:
+    # Reopens one claim between the archival run's read and its delete
+    def __init__(self, db, claim_id: str):
+        self.db = db
+        self.claim_id = claim_id
+
+    def __getattr__(self, name):
+        collection = getattr(self.db, name)
+        if name != "claims":
+            return collection
+        reopen = self
+
+        class Claims:
+            def __getattr__(self, attr):
+                return getattr(collection, attr)
+
+            async def delete_many(self, query):
+                await collection.update_one({"id": reopen.claim_id}, {"$set": {"status": "submitted", "review_date": None}})
+                return await collection.delete_many(query)
+
+        return Claims()
+
+
+def test_claims_reopened_mid_batch_stay_hot(api, tenant):
+    claim_ids = closed_claims(api, tenant, 2)
+
+    archived = api.client.portal.call(archive_claims.archive_closed_claims, ReopenBeforeDelete(server.db, claim_ids[0]), 90)
+
+    assert archived == 1
+    assert api.client.portal.call(server.db.claims_archive.distinct, "id") == [claim_ids[1]]
+    stats = api.client.portal.call(server.db.claims_archive_stats.find_one, {"company_id": tenant["company"]["id"]})
+    assert stats["total_claims"] == 1 and stats["approved_claims"] == 1
+    listed = api.request("GET", "/api/claims?include_archived=true", token=tenant["hr"]).json()
+    assert sorted(claim["id"] for claim in listed) == sorted(claim_ids)
@@ -0,0 +1,86 @@
+import asyncio
+import time
+import uuid
+
+from mongomock_motor import AsyncMongoMockClient
+from pymongo.errors import AutoReconnect
+
+import server
+from audit_log import AuditLogWriter
+from typed_storage import utc_now
+
+
+class FailingOnce:
+    # Stores the batch and then reports the write as failed, the way a
+    # dropped connection can
+    def __init__(self, collection):
+        self.collection = collection
+        self.failures = 1
+
+    async def insert_many(self, documents, **kwargs):
+        result = await self.collection.insert_many(documents, **kwargs)
+        if self.failures:
+            self.failures -= 1
+            raise AutoReconnect("connection closed")
+        return result
+
+
+def test_full_batch_is_flushed_without_waiting_for_the_interval():
+    async def scenario():
+        collection = AsyncMongoMockClient()["audit"]["audit_log"]
+        writer = AuditLogWriter(collection, flush_interval_ms=60000, max_batch=3)
+        writer.start()
+        for n in range(3):
+            writer.record({"n": n})
+        started = time.monotonic()
+        while writer.flushed_events < 3 and time.monotonic() - started < 1:
+            await asyncio.sleep(0.01)
+        await writer.stop()
+        return writer.metrics(), await collection.count_documents({})
+
+    metrics, stored = asyncio.run(scenario())
+    assert stored == 3 and metrics["flushes"] == 1 and metrics["buffered_events"] == 0
+
+
+def test_overflow_is_dropped_and_counted():
+    writer = AuditLogWriter(None, max_buffer=2)
+
+    assert [writer.record({"n": n}) for n in range(3)] == [True, True, False]
+    assert writer.metrics()["dropped_events"] == 1 and writer.metrics()["buffered_events"] == 2
+
+
+def test_failed_flush_is_retried_without_duplicates():
+    async def scenario():
+        collection = AsyncMongoMockClient()["audit"]["audit_log"]
+        writer = AuditLogWriter(FailingOnce(collection), max_batch=2, max_buffer=3)
+        for n in range(3):
+            writer.record({"n": n})
+        await writer.flush()
+        after_failure = writer.metrics()
+        await writer.flush()
+        return after_failure, writer.metrics(), await collection.count_documents({})
+
+    after_failure, metrics, stored = asyncio.run(scenario())
+    assert after_failure["failed_events"] == 2 and after_failure["buffered_events"] == 3
+    assert metrics["flushed_events"] == 3 and metrics["buffered_events"] == 0
+    assert stored == 3
+
+
+def test_pages_do_not_skip_events_sharing_a_timestamp(api, tenant):
+    company_id = tenant["company"]["id"]
+    shared = utc_now().replace(microsecond=0)
+    events = [{
+        "id": str(uuid.uuid4()), "entity_type": "claim", "entity_id": "c1", "action": "update",
+        "actor_id": "a1", "company_id": company_id, "changes": {"n": n}, "timestamp": shared,
+    } for n in range(5)]
+    api.client.portal.call(server.db.audit_log.insert_many, events)
+
+    seen, cursor = [], {}
+    for _ in range(5):
+        page = api.request("GET", "/api/audit-log", token=tenant["hr"], params={"entity_id": "c1", "limit": 2, **cursor}).json()
+        if not page:
+            break
+        seen.extend(event["id"] for event in page)
+        cursor = {"before": page[-1]["timestamp"], "before_id": page[-1]["id"]}
+
+    assert sorted(seen) == sorted(event["id"] for event in events) and len(seen) == 5
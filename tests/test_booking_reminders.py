@@ -0,0 +1,60 @@
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+
+import server
+from booking_reminders import ReminderScheduler
+
+
+class RecordingNotifier:
+    def __init__(self):
+        self.sent = []
+
+    async def notify(self, booking: dict, reminder: str):
+        self.sent.append((booking["id"], reminder))
+
+
+def book(api, tenant, day: date, booking_time: str) -> dict:
+    # Warm requests, so clearing the read caches does not reset the scheduler
+    response = api.request("POST", "/api/bookings", token=tenant["employee"], cold=False, json={
+        "partner_id": tenant["partner"]["id"], "service_type": "gym",
+        "booking_date": day.isoformat(), "booking_time": booking_time,
+    })
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_reminders_follow_bookings_and_leader_changes(api, tenant, monkeypatch):
+    call = api.client.portal.call
+    day = date.today() + timedelta(days=2)
+    clock = [datetime.combine(day, datetime.min.time(), tzinfo=timezone.utc) + timedelta(hours=7, minutes=57)]
+    notifier = RecordingNotifier()
+    first, second = (ReminderScheduler(server.db, notifier, clock=lambda: clock[0]) for _ in range(2))
+    monkeypatch.setitem(server.cache_bus.caches, first.name, first)
+
+    cancelled = book(api, tenant, day, "09:00")
+    call(first.tick)
+    call(second.tick)
+    assert first.is_leader and not second.is_leader
+    assert first.metrics()["queued"] == 1
+
+    # Changes after the window was loaded reach the leader through the bus
+    kept = book(api, tenant, day, "09:00")
+    response = api.request("POST", f"/api/bookings/{cancelled['id']}/cancel", token=tenant["employee"], cold=False)
+    assert response.status_code == 200 and response.json()["seat"] is None
+    assert api.request("POST", f"/api/bookings/{cancelled['id']}/cancel", token=tenant["employee"], cold=False).status_code == 409
+
+    async def settle():
+        await asyncio.gather(*list(first._refreshes))
+    call(settle)
+    assert first.windows_loaded == 1 and first.metrics()["queued"] == 1
+
+    clock[0] += timedelta(minutes=3, seconds=30)
+    call(first.tick)
+    assert notifier.sent == [(kept["id"], "1h")]
+
+    # The first leader stops renewing; the next one re-reads the grace period
+    # but does not send the reminder again
+    clock[0] += timedelta(seconds=45)
+    call(second.tick)
+    assert second.is_leader and second.skipped == 1
+    assert notifier.sent == [(kept["id"], "1h")]
@@ -0,0 +1,84 @@
+import asyncio
+from datetime import date, timedelta
+
+import server
+
+SLOT_DAY = (date.today() + timedelta(days=7)).isoformat()
+
+
+def book(api, token: str, partner_id: str, booking_time: str = "09:00"):
+    return api.request("POST", "/api/bookings", token=token, json={
+        "partner_id": partner_id, "service_type": "gym", "booking_date": SLOT_DAY, "booking_time": booking_time,
+    })
+
+
+def availability(api, tenant) -> dict:
+    slots = api.request("GET", f"/api/wellness-partners/{tenant['partner']['id']}/availability",
+                        token=tenant["employee"], params={"start_date": SLOT_DAY}).json()
+    return {slot["booking_time"]: (slot["capacity"], slot["available"]) for slot in slots}
+
+
+def test_full_slot_is_rejected(api, tenant):
+    partner_id = tenant["partner"]["id"]
+    seats = [book(api, tenant["employee"], partner_id).json()["seat"] for _ in range(2)]
+
+    full = book(api, tenant["employee"], partner_id)
+
+    assert sorted(seats) == [0, 1]
+    assert full.status_code == 409
+    assert book(api, tenant["employee"], partner_id, "09:30").status_code == 200
+
+
+def test_concurrent_bookings_get_different_seats(api, tenant):
+    partner_id = tenant["partner"]["id"]
+    employee_id = book(api, tenant["employee"], partner_id, "11:30").json()["employee_id"]
+
+    async def race():
+        bookings = [
+            server.Booking(employee_id=employee_id, partner_id=partner_id, service_type="gym",
+                           booking_date=SLOT_DAY, booking_time="10:00", status="scheduled")
+            for _ in range(3)
+        ]
+        return await asyncio.gather(*(server.reserve_seat(booking, 2) for booking in bookings), return_exceptions=True)
+
+    outcomes = api.client.portal.call(race)
+
+    assert sorted(outcome.seat for outcome in outcomes if isinstance(outcome, server.Booking)) == [0, 1]
+    assert [outcome.status_code for outcome in outcomes if isinstance(outcome, Exception)] == [409]
+
+
+def test_cancelled_seat_is_reused(api, tenant):
+    partner_id = tenant["partner"]["id"]
+    first, second = (book(api, tenant["employee"], partner_id).json() for _ in range(2))
+
+    cancelled = api.request("POST", f"/api/bookings/{first['id']}/cancel", token=tenant["employee"])
+    again = book(api, tenant["employee"], partner_id)
+
+    assert cancelled.status_code == 200 and cancelled.json()["seat"] is None
+    assert again.status_code == 200 and again.json()["seat"] == first["seat"] != second["seat"]
+
+
+def test_availability_counts_booked_seats(api, tenant):
+    partner_id = tenant["partner"]["id"]
+    before = availability(api, tenant)
+    booking = book(api, tenant["employee"], partner_id).json()
+    book(api, tenant["employee"], partner_id, "10:30")
+    book(api, tenant["employee"], partner_id, "10:30")
+
+    after = availability(api, tenant)
+    api.request("POST", f"/api/bookings/{booking['id']}/cancel", token=tenant["employee"])
+
+    assert len(before) == 6 and set(before.values()) == {(2, 2)}
+    assert after["09:00"] == (2, 1) and after["10:30"] == (2, 0) and after["11:00"] == (2, 2)
+    assert availability(api, tenant)["09:00"] == (2, 2)
+
+
+def test_slot_must_end_after_it_starts(api, tenant):
+    for start_time, end_time in (("12:00", "09:00"), ("09:00", "09:00")):
+        response = api.request("POST", "/api/wellness-partners", token=tenant["admin"], json={
+            "name": "Backwards Gym", "service_type": "gym", "description": "Gym",
+            "contact_email": "gym@example.com", "contact_phone": "5550102",
+            "availability": "Weekdays", "pricing": "Free",
+            "slot_templates": [{"weekday": 0, "start_time": start_time, "end_time": end_time}],
+        })
+        assert response.status_code == 422, (start_time, end_time)
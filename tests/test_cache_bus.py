@@ -0,0 +1,59 @@
+import asyncio
+
+from cache_bus import CLEAR_ALL, InvalidationBus, LocalCache
+
+
+def test_value_loaded_before_an_invalidation_is_not_stored():
+    cache = LocalCache("users")
+    generation = cache.generation("u1")
+    # A writer invalidates while the reader is still loading the old document
+    cache.invalidate("u1")
+    cache.set("u1", {"name": "old"}, generation)
+    assert cache.get("u1") is None and cache.metrics()["discarded"] == 1
+
+    cache.set("u1", {"name": "new"}, cache.generation("u1"))
+    assert cache.get("u1") == {"name": "new"}
+
+    generation = cache.generation("u1")
+    cache.invalidate(CLEAR_ALL)
+    cache.set("u1", {"name": "old"}, generation)
+    assert cache.get("u1") is None
+
+
+def test_forgotten_generations_still_fail_older_loads():
+    cache = LocalCache("users", max_entries=2)
+    generation = cache.generation("u1")
+    for key in ("u1", "u2", "u3"):
+        cache.invalidate(key)
+
+    cache.set("u1", "old", generation)
+
+    assert cache.get("u1") is None and cache.metrics()["discarded"] == 1
+
+
+def test_invalidation_reaches_another_bus_over_its_socket(tmp_path):
+    async def scenario():
+        writer_cache, reader_cache = LocalCache("users"), LocalCache("users")
+        writer, reader = InvalidationBus(str(tmp_path), [writer_cache]), InvalidationBus(str(tmp_path), [reader_cache])
+        writer.start()
+        reader.start()
+        try:
+            reader_cache.set("u1", "cached")
+            generation = reader_cache.generation("u2")
+            writer.publish("users", "u1")
+            writer.publish("users", "u2")
+            for _ in range(100):
+                if reader.received == 2:
+                    break
+                await asyncio.sleep(0.01)
+            # The reader's in-flight load of u2 started before the write
+            reader_cache.set("u2", "old", generation)
+            return writer.sent, reader.received, reader_cache.get("u1"), reader_cache.get("u2")
+        finally:
+            writer.close()
+            reader.close()
+
+    sent, received, first, second = asyncio.run(scenario())
+    assert sent == 2 and received == 2
+    assert first is None and second is None
+    assert not list(tmp_path.glob("*.sock"))
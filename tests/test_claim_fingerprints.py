@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from pydantic import ValidationError
+from pymongo.errors import ExecutionTimeout, WriteError
+
+import backfill_claim_fingerprints
+import server
+from claim_fingerprints import claim_fingerprint
+from .conftest import app_settings
+
+
+def submit(api, tenant, **fields):
+    payload = {"claim_type": "dental", "amount": 80.0, "description": "Cleaning", "service_date": "2026-09-01",
+               "documents": ["data:image/png;base64,AAAA BBBB"], **fields}
+    return api.request("POST", "/api/claims", token=tenant["employee"], json=payload)
+
+
+def test_resubmitted_claims_are_flagged_or_rejected(api, tenant, monkeypatch):
+    original = submit(api, tenant).json()
+    assert original["duplicate_of"] is None
+
+    # Same receipt with different whitespace and claim type casing
+    duplicate = submit(api, tenant, claim_type="Dental ", documents=["data:image/png;base64,AAAABBBB"])
+    assert duplicate.json()["duplicate_of"] == original["id"]
+    assert [c for c in api.last_commands if "claim_fingerprints" in c] == ["find_one_and_update:claim_fingerprints"]
+    assert submit(api, tenant, service_date="2026-09-02").json()["duplicate_of"] is None
+
+    monkeypatch.setattr(server.settings, "claim_duplicate_policy", "reject")
+    rejected = submit(api, tenant)
+    assert rejected.status_code == 409 and original["id"] in rejected.json()["detail"]
+
+    # Outside the lookback the fingerprint moves to the new claim
+    monkeypatch.setattr(server.settings, "claim_duplicate_lookback_days", 0)
+    again = submit(api, tenant)
+    assert again.status_code == 200 and again.json()["duplicate_of"] is None
+
+
+def test_backfill_keeps_the_earliest_claim(api, tenant):
+    call = api.client.portal.call
+    now = datetime.now(timezone.utc)
+    base = {"employee_id": "e1", "company_id": tenant["company"]["id"], "claim_type": "vision", "amount_cents": 5000,
+            "description": "Glasses", "status": "approved", "documents": [], "service_date": "2026-08-01"}
+    call(server.db.claims.insert_many, [
+        {**base, "id": "b", "submission_date": now - timedelta(days=3)},
+        {**base, "id": "c", "submission_date": now - timedelta(days=1)},
+    ])
+    call(server.db.claims_archive.insert_many, [{**base, "id": "a", "submission_date": (now - timedelta(days=5)).isoformat()}])
+
+    assert call(backfill_claim_fingerprints.backfill_claim_fingerprints, server.db, 1) == 3
+    stored = call(server.db.claim_fingerprints.find_one, {"_id": claim_fingerprint({**base, "submission_date": now})})
+    assert stored["claim_id"] == "a"
+
+
+def test_failed_insert_releases_the_fingerprint(api, tenant, monkeypatch):
+    original = submit(api, tenant).json()
+    monkeypatch.setattr(server.settings, "claim_duplicate_lookback_days", 0)
+
+    async def failing_insert(collection, document):
+        raise WriteError("document failed validation", 121)
+
+    with monkeypatch.context() as patched:
+        patched.setattr(server.insert_batcher, "insert", failing_insert)
+        with pytest.raises(WriteError):
+            submit(api, tenant)
+
+    # The fingerprint is gone rather than left pointing at the lost claim
+    monkeypatch.setattr(server.settings, "claim_duplicate_lookback_days", 90)
+    resubmitted = submit(api, tenant).json()
+    assert resubmitted["duplicate_of"] is None
+    stored = api.client.portal.call(server.db.claim_fingerprints.find_one, {})
+    assert stored["claim_id"] == resubmitted["id"] != original["id"]
+
+
+def test_timed_out_insert_keeps_the_fingerprint(api, tenant, monkeypatch):
+    async def slow_insert(collection, document):
+        # The batch may still store the claim after the caller gave up
+        raise ExecutionTimeout("Insert did not complete before the request deadline", 50)
+
+    monkeypatch.setattr(server.insert_batcher, "insert", slow_insert)
+    response = submit(api, tenant)
+
+    assert response.status_code == 503
+    assert api.client.portal.call(server.db.claim_fingerprints.count_documents, {}) == 1
+
+
+def test_duplicate_policy_is_validated():
+    with pytest.raises(ValidationError):
+        app_settings(claim_duplicate_policy="block")
+    settings = app_settings(claim_duplicate_policy="reject")
+    with pytest.raises(ValidationError):
+        settings.claim_duplicate_policy = "ignore"
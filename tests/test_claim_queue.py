@@ -0,0 +1,63 @@
+import server
+
+
+def submit(api, tenant, description):
+    response = api.request("POST", "/api/claims", token=tenant["employee"], json={
+        "claim_type": "medical", "amount": 40.0, "description": description,
+    })
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_reviewers_lease_distinct_claims_in_priority_order(api, tenant, monkeypatch):
+    oldest, urgent, newest = (submit(api, tenant, name)["id"] for name in ("oldest", "urgent", "newest"))
+    api.request("PATCH", f"/api/claims/{urgent}", token=tenant["hr"], json={"priority": 0})
+    other_hr = api.register("hr_manager", tenant["company"]["id"], name="Olive Reviewer")["access_token"]
+
+    first = api.request("POST", "/api/claims/next", token=tenant["hr"]).json()
+    second = api.request("POST", "/api/claims/next", token=other_hr).json()
+    assert (first["id"], second["id"]) == (urgent, oldest)
+    assert api.last_commands[-1] == "find_one_and_update:claims"
+
+    # Only the lease holder may review or renew
+    taken = api.request("PUT", f"/api/claims/{oldest}", token=tenant["hr"], json={"status": "approved"})
+    assert taken.status_code == 409
+    assert api.request("POST", f"/api/claims/{oldest}/lease", token=tenant["hr"]).status_code == 409
+    renewed = api.request("POST", f"/api/claims/{oldest}/lease", token=other_hr).json()
+    assert renewed["lease_expires_at"] >= second["lease_expires_at"]
+
+    reviewed = api.request("PUT", f"/api/claims/{urgent}", token=tenant["hr"], json={"status": "approved"}).json()
+    assert reviewed["leased_by"] is None
+
+    # Released and expired leases go back to the queue
+    assert api.request("DELETE", f"/api/claims/{oldest}/lease", token=other_hr).status_code == 200
+    monkeypatch.setattr(server.settings, "claim_lease_seconds", 0)
+    assert api.request("POST", "/api/claims/next", token=tenant["hr"]).json()["id"] == oldest
+    monkeypatch.setattr(server.settings, "claim_lease_seconds", 600)
+    assert api.request("POST", "/api/claims/next", token=other_hr).json()["id"] == oldest
+    assert api.request("POST", "/api/claims/next", token=tenant["hr"]).json()["id"] == newest
+
+    assert api.request("PUT", f"/api/claims/{oldest}", token=other_hr, json={"status": "rejected"}).status_code == 200
+    api.request("PUT", f"/api/claims/{newest}", token=tenant["hr"], json={"status": "approved"})
+    assert api.request("POST", "/api/claims/next", token=tenant["hr"]).status_code == 204
+
+
+def test_lease_changes_advance_the_claim_version(api, tenant):
+    claim_id = submit(api, tenant, "leased")["id"]
+    before = api.request("GET", f"/api/claims/{claim_id}", token=tenant["hr"])
+
+    leased = api.request("POST", "/api/claims/next", token=tenant["hr"])
+    assert leased.json()["version"] == before.json()["version"] + 1
+    assert leased.headers["ETag"] != before.headers["ETag"]
+
+    # The pre-lease ETag no longer matches, and the lease response's does
+    stale = api.request("GET", f"/api/claims/{claim_id}", token=tenant["hr"], headers={"If-None-Match": before.headers["ETag"]})
+    assert stale.status_code == 200 and stale.json()["leased_by"] is not None
+    current = api.request("GET", f"/api/claims/{claim_id}", token=tenant["hr"], headers={"If-None-Match": leased.headers["ETag"]})
+    assert current.status_code == 304
+
+    renewed = api.request("POST", f"/api/claims/{claim_id}/lease", token=tenant["hr"])
+    assert renewed.json()["version"] == leased.json()["version"] + 1 and renewed.headers["ETag"] != leased.headers["ETag"]
+    api.request("DELETE", f"/api/claims/{claim_id}/lease", token=tenant["hr"])
+    released = api.request("GET", f"/api/claims/{claim_id}", token=tenant["hr"]).json()
+    assert released["version"] == renewed.json()["version"] + 1 and released["leased_by"] is None
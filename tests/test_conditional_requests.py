@@ -0,0 +1,63 @@
+import pytest
+
+
+def submit_claim(api, tenant) -> dict:
+    return api.request("POST", "/api/claims", token=tenant["employee"], json={
+        "claim_type": "medical", "amount": 25.0, "description": "Physio",
+    }).json()
+
+
+def resource_urls(api, tenant) -> list:
+    employee = api.request("GET", "/api/employees", token=tenant["hr"]).json()[0]
+    return [
+        f"/api/companies/{tenant['company']['id']}",
+        f"/api/employees/{employee['id']}",
+        f"/api/claims/{submit_claim(api, tenant)['id']}",
+        f"/api/wellness-partners/{tenant['partner']['id']}",
+    ]
+
+
+def test_matching_if_none_match_returns_not_modified(api, tenant):
+    for url in resource_urls(api, tenant):
+        first = api.request("GET", url, token=tenant["hr"])
+        etag = first.headers["ETag"]
+
+        cached = api.request("GET", url, token=tenant["hr"], headers={"If-None-Match": f'W/"0", {etag}'})
+
+        assert first.status_code == 200, url
+        assert cached.status_code == 304 and cached.headers["ETag"] == etag and not cached.content, url
+
+
+@pytest.mark.parametrize("kind", ["employee", "claim"])
+def test_update_serves_a_new_etag(api, tenant, kind):
+    if kind == "employee":
+        employee_id = api.request("GET", "/api/employees", token=tenant["hr"]).json()[0]["id"]
+        url, change = f"/api/employees/{employee_id}", {"department": "Finance"}
+    else:
+        url, change = f"/api/claims/{submit_claim(api, tenant)['id']}", {"reviewer_notes": "Checked"}
+    etag = api.request("GET", url, token=tenant["hr"]).headers["ETag"]
+
+    updated = api.request("PATCH", url, token=tenant["hr"], json=change, headers={"If-Match": etag})
+    refreshed = api.request("GET", url, token=tenant["hr"], headers={"If-None-Match": etag})
+
+    assert updated.status_code == 200, updated.text
+    assert refreshed.status_code == 200
+    assert refreshed.headers["ETag"] == updated.headers["ETag"] != etag
+    assert refreshed.json()["version"] == updated.json()["version"]
+
+
+@pytest.mark.parametrize("method, body", [
+    ("PUT", {"status": "approved"}),
+    ("PATCH", {"reviewer_notes": "Second look"}),
+])
+def test_stale_if_match_on_a_claim_is_rejected(api, tenant, method, body):
+    claim = submit_claim(api, tenant)
+    url = f"/api/claims/{claim['id']}"
+    stale = f'"{claim["version"]}"'
+    api.request("PATCH", url, token=tenant["hr"], json={"priority": 1}, headers={"If-Match": stale})
+
+    response = api.request(method, url, token=tenant["hr"], json=body, headers={"If-Match": stale})
+
+    assert response.status_code == 412
+    current = api.request("GET", url, token=tenant["hr"]).json()
+    assert current["status"] == "submitted" and current["reviewer_notes"] is None
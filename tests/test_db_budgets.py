@@ -0,0 +1,103 @@
+"""Per-route database command budgets.
+
+Every request is measured with cold in-process caches, so a budget is the
+worst case a route may cost. Lower a budget when a change makes a route
+cheaper; raising one needs a reason in the commit message.
+"""
+import os
+import uuid
+
+import pytest
+
+MAX_RESPONSE_MS = float(os.environ.get("TEST_MAX_RESPONSE_MS", "250"))
+
+
+def claim_payload():
+    return {"claim_type": "medical", "amount": 120.5, "description": "Clinic visit"}
+
+
+@pytest.fixture
+def claim(api, tenant):
+    return api.request("POST", "/api/claims", token=tenant["employee"], json=claim_payload()).json()
+
+
+# (name, method, url template, token, request kwargs, max DB commands)
+ROUTE_BUDGETS = [
+    ("me", "GET", "/api/auth/me", "hr", {}, 1),
+    ("company", "GET", "/api/companies/{company_id}", "hr", {}, 2),
+    ("employees", "GET", "/api/employees", "hr", {}, 2),
+    ("claims_hr", "GET", "/api/claims", "hr", {}, 2),
+    ("claims_employee", "GET", "/api/claims", "employee", {}, 3),
+    ("claims_expanded", "GET", "/api/claims?expand=employee,reviewer", "hr", {}, 4),
+    ("claims_archived", "GET", "/api/claims?include_archived=true", "hr", {}, 3),
+    ("claim", "GET", "/api/claims/{claim_id}", "hr", {}, 2),
+    ("create_claim", "POST", "/api/claims", "employee", {"json": claim_payload()}, 4),
+    ("claims_next", "POST", "/api/claims/next", "hr", {}, 2),
+    ("update_claim", "PUT", "/api/claims/{claim_id}", "hr", {"json": {"status": "approved"}}, 4),
+    ("patch_claim", "PATCH", "/api/claims/{claim_id}", "hr", {"json": {"reviewer_notes": "Checked"}}, 2),
+    ("patch_employee", "PATCH", "/api/employees/{employee_id}", "hr", {"json": {"phone": "5550199"}}, 2),
+    ("patch_employee_department", "PATCH", "/api/employees/{employee_id}", "hr", {"json": {"department": "Sales"}}, 3),
+    ("partners", "GET", "/api/wellness-partners", "employee", {}, 1),
+    ("availability", "GET", "/api/wellness-partners/{partner_id}/availability?start_date=2026-10-19&end_date=2026-10-25", "employee", {}, 2),
+    ("create_booking", "POST", "/api/bookings", "employee", {"json": {"partner_id": "{partner_id}", "service_type": "gym", "booking_date": "2026-10-20", "booking_time": "09:00"}}, 5),
+    ("bookings_expanded", "GET", "/api/bookings?expand=partner", "employee", {}, 4),
+    ("financials", "GET", "/api/financials", "hr", {}, 2),
+    ("dashboard", "GET", "/api/dashboard/stats", "hr", {}, 6),
+    ("quote", "GET", "/api/pricing/quote", "hr", {}, 3),
+    ("audit_log", "GET", "/api/audit-log", "hr", {}, 2),
+]
+
+
+def fill(value, context: dict):
+    if isinstance(value, str):
+        return value.format(**context)
+    if isinstance(value, dict):
+        return {key: fill(item, context) for key, item in value.items()}
+    return value
+
+
+@pytest.mark.parametrize(
+    "method, url, token, kwargs, budget",
+    [route[1:] for route in ROUTE_BUDGETS],
+    ids=[route[0] for route in ROUTE_BUDGETS]
+)
+def test_route_stays_within_db_budget(api, tenant, claim, method, url, token, kwargs, budget):
+    context = {
+        "company_id": tenant["company"]["id"],
+        "partner_id": tenant["partner"]["id"],
+        "claim_id": claim["id"],
+        "employee_id": claim["employee_id"],
+    }
+    response = api.request(method, fill(url, context), token=tenant[token], **fill(kwargs, context))
+
+    assert response.status_code == 200, response.text
+    assert len(api.last_commands) <= budget, f"{len(api.last_commands)} DB commands: {api.last_commands}"
+    assert api.last_elapsed_ms <= MAX_RESPONSE_MS
+
+
+def test_register_employee_budget(api, tenant):
+    api.register("employee", tenant["company"]["id"])
+
+    # users lookup + insert, employee insert, roster version bump + change log
+    assert len(api.last_commands) <= 5, api.last_commands
+
+
+def test_warm_cache_skips_user_lookup(api, tenant):
+    api.request("GET", "/api/auth/me", token=tenant["hr"])
+    api.request("GET", "/api/auth/me", token=tenant["hr"], cold=False)
+
+    assert api.last_commands == []
+
+
+def test_expand_batches_lookups_regardless_of_page_size(api, tenant):
+    for _ in range(20):
+        api.request("POST", "/api/claims", token=tenant["employee"], json=claim_payload())
+    for _ in range(3):
+        other = api.register("employee", tenant["company"]["id"], name=f"Other {uuid.uuid4().hex[:4]}")
+        api.request("POST", "/api/claims", token=other["access_token"], json=claim_payload())
+
+    response = api.request("GET", "/api/claims?expand=employee,reviewer", token=tenant["hr"])
+
+    assert len(response.json()) == 23
+    assert all(c["employee"]["name"] for c in response.json())
+    assert len(api.last_commands) <= 4, api.last_commands
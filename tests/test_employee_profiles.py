@@ -0,0 +1,63 @@
+import asyncio
+
+import server
+
+
+def test_first_claim_creates_profile_with_one_employee_round_trip(api, tenant):
+    response = api.request("POST", "/api/claims", token=tenant["hr"], json={
+        "claim_type": "medical", "amount": 10, "description": "First claim",
+    })
+
+    assert response.status_code == 200
+    employee_commands = [c for c in api.last_commands if c.endswith(":employees")]
+    assert employee_commands == ["find_one_and_update:employees"]
+
+
+def test_concurrent_get_or_create_yields_single_profile(api, tenant):
+    user = api.register("company_admin", tenant["company"]["id"], name="Concurrent User")["user"]
+
+    async def create_twice():
+        return await asyncio.gather(server.get_or_create_employee(user), server.get_or_create_employee(user))
+
+    first, second = api.client.portal.call(create_twice)
+
+    assert first["id"] == second["id"]
+    assert api.client.portal.call(server.db.employees.count_documents, {"user_id": user["id"]}) == 1
+
+
+def test_create_employee_rejects_second_profile_for_user(api, tenant):
+    me = api.request("GET", "/api/auth/me", token=tenant["employee"]).json()
+    response = api.request("POST", "/api/employees", token=tenant["hr"], json={
+        "user_id": me["id"],
+        "employee_id": "E-DUP",
+        "department": "Ops",
+        "designation": "Analyst",
+        "date_of_joining": "2020-01-01",
+        "date_of_birth": "1990-01-01",
+        "phone": "5550100",
+        "emergency_contact": "5550101",
+    })
+
+    assert response.status_code == 409
+
+
+def test_patch_employee_updates_only_given_fields(api, tenant):
+    employee = api.request("GET", "/api/employees", token=tenant["hr"]).json()[0]
+
+    response = api.request("PATCH", f"/api/employees/{employee['id']}", token=tenant["hr"], json={
+        "department": "Finance", "phone": None,
+    }, headers={"If-Match": f'"{employee["version"]}"'})
+
+    assert response.status_code == 200, response.text
+    patched = response.json()
+    assert patched["department"] == "Finance"
+    assert patched["phone"] == employee["phone"]
+    assert patched["version"] == employee["version"] + 1
+    assert response.headers["ETag"] == f'"{patched["version"]}"'
+    found = api.request("GET", "/api/employees/search?q=finance", token=tenant["hr"]).json()
+    assert [e["id"] for e in found] == [employee["id"]]
+
+    stale = api.request("PATCH", f"/api/employees/{employee['id']}", token=tenant["hr"], json={
+        "designation": "Lead",
+    }, headers={"If-Match": f'"{employee["version"]}"'})
+    assert stale.status_code == 412
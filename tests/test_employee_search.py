@@ -0,0 +1,51 @@
+def add_employee(api, tenant, name, department="Engineering"):
+    user = api.register("hr_manager", tenant["company"]["id"], name=name)
+    response = api.request("POST", "/api/employees", token=tenant["hr"], json={
+        "user_id": user["user"]["id"],
+        "employee_id": f"E-{name.split()[0].upper()}",
+        "department": department,
+        "designation": "Engineer",
+        "date_of_joining": "2020-01-01",
+        "date_of_birth": "1990-01-01",
+        "phone": "5550100",
+        "emergency_contact": "5550101",
+    })
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_search_orders_name_prefix_matches_first(api, tenant):
+    add_employee(api, tenant, "Zoë Anders")
+    add_employee(api, tenant, "Anders Zimmer")
+    add_employee(api, tenant, "Bob Stone", department="Andersen Labs")
+
+    response = api.request("GET", "/api/employees/search?q=anders", token=tenant["hr"])
+
+    assert response.status_code == 200
+    assert [e["name"] for e in response.json()] == ["Anders Zimmer", "Zoë Anders", "Bob Stone"]
+    assert len(api.last_commands) <= 2, api.last_commands
+
+
+def test_search_matches_accent_insensitive_and_employee_ids(api, tenant):
+    add_employee(api, tenant, "Zoë Anders")
+
+    assert [e["name"] for e in api.request("GET", "/api/employees/search?q=zoe", token=tenant["hr"]).json()] == ["Zoë Anders"]
+    assert [e["employee_id"] for e in api.request("GET", "/api/employees/search?q=e-zo", token=tenant["hr"]).json()] == ["E-ZOË"]
+
+
+def test_search_is_scoped_to_company_and_role(api, tenant):
+    assert api.request("GET", "/api/employees/search?q=evan", token=tenant["employee"]).status_code == 403
+    assert [e["name"] for e in api.request("GET", "/api/employees/search?q=evan", token=tenant["hr"]).json()] == ["Evan Employee"]
+
+
+def test_patch_rewrites_search_terms_in_the_same_write(api, tenant):
+    employee = add_employee(api, tenant, "Bob Stone")
+
+    response = api.request("PATCH", f"/api/employees/{employee['id']}", token=tenant["hr"], json={"department": "Finance"})
+
+    assert response.status_code == 200, response.text
+    assert response.json()["version"] == employee["version"] + 1
+    writes = [command for command in api.last_commands if command.split(":")[0] != "find_one"]
+    assert writes == ["find_one_and_update:employees"], api.last_commands
+    assert [e["name"] for e in api.request("GET", "/api/employees/search?q=finance", token=tenant["hr"]).json()] == ["Bob Stone"]
+    assert api.request("GET", "/api/employees/search?q=engineering", token=tenant["hr"]).json() == []
@@ -0,0 +1,52 @@
+from datetime import datetime, timezone
+
+import mongomock
+
+import generate_data
+import server
+from ledger import stored_totals
+from typed_storage import amount_cents
+
+
+def settings(seed: int = 7) -> dict:
+    as_of = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    partners = generate_data.generate_partners(seed, 5, as_of)
+    return {
+        "seed": seed,
+        "as_of": as_of,
+        "years": 1.0,
+        "claims_per_employee": 3.0,
+        "bookings_per_employee": 2.0,
+        "partners": [(partner["id"], partner["service_type"]) for partner in partners],
+        "password_hash": "hash",
+        "batch_size": 50,
+    }
+
+
+def test_generation_is_deterministic_and_matches_stored_models():
+    first = generate_data.generate_company(settings(), 3, 40)
+    assert first == generate_data.generate_company(settings(), 3, 40)
+    assert first["companies"][0]["id"] != generate_data.generate_company(settings(8), 3, 40)["companies"][0]["id"]
+    assert len(first["users"]) == 42 and len(first["employees"]) == 40
+
+    for model, name in [(server.Company, "companies"), (server.Employee, "employees"), (server.Claim, "claims"),
+                        (server.Booking, "bookings"), (server.Financial, "financials")]:
+        for document in first[name]:
+            model(**document)
+    assert all(claim["review_date"] is not None for claim in first["claims"] if claim["status"] == "approved")
+
+    # Ledger totals and sequences agree with the generated entries
+    financials = first["financials"]
+    assert [entry["sequence"] for entry in financials] == list(range(1, len(financials) + 1))
+    assert first["ledger_accounts"][0]["sequence"] == len(financials)
+    payout_ids = {entry["reference_id"]: entry["id"] for entry in financials if entry["transaction_type"] == "claim_payout"}
+    assert payout_ids == {claim["id"]: claim["payout_id"] for claim in first["claims"] if claim["status"] == "approved"}
+    for checkpoint in first["ledger_checkpoints"]:
+        covered = financials[:checkpoint["sequence"]]
+        assert stored_totals(checkpoint)["total_payouts_cents"] == sum(
+            amount_cents(entry) for entry in covered if entry["transaction_type"] == "claim_payout"
+        )
+
+    db = mongomock.MongoClient().db
+    counts = generate_data.write_documents(db, first, 50)
+    assert counts["claims"] == db.claims.count_documents({}) == len(first["claims"])
@@ -0,0 +1,104 @@
+import asyncio
+import time
+
+import pymongo
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+from pymongo.errors import DuplicateKeyError, ExecutionTimeout
+
+from insert_batcher import InsertBatcher
+from load_control import request_deadline
+
+
+class RecordingCollection:
+    # Notes the time budget each insert_many ran under
+    def __init__(self, collection):
+        self.collection = collection
+        self.timeouts = []
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    async def insert_many(self, documents, **kwargs):
+        self.timeouts.append(pymongo._csot.get_timeout())
+        return await self.collection.insert_many(documents, **kwargs)
+
+
+def test_concurrent_inserts_share_one_batch():
+    async def scenario():
+        collection = AsyncMongoMockClient()["batcher"]["items"]
+        batcher = InsertBatcher(window_ms=20)
+        ids = await asyncio.gather(*(batcher.insert(collection, {"n": n}) for n in range(5)))
+        return ids, await collection.count_documents({}), batcher.metrics()
+
+    ids, stored, metrics = asyncio.run(scenario())
+    assert len(set(ids)) == 5 and stored == 5
+    assert metrics["batches"] == 1 and metrics["batch_size_histogram"] == {"8": 1}
+
+
+def test_each_caller_gets_its_own_outcome():
+    async def scenario():
+        collection = AsyncMongoMockClient()["batcher"]["items"]
+        await collection.create_index("id", unique=True)
+        batcher = InsertBatcher(window_ms=20)
+        return await asyncio.gather(
+            batcher.insert(collection, {"id": "a"}),
+            batcher.insert(collection, {"id": "a"}),
+            batcher.insert(collection, {"id": "b"}),
+            return_exceptions=True
+        )
+
+    first, duplicate, other = asyncio.run(scenario())
+    assert isinstance(duplicate, DuplicateKeyError)
+    assert not isinstance(first, Exception) and not isinstance(other, Exception)
+
+
+def test_drain_writes_pending_inserts_without_waiting_for_the_window():
+    async def scenario():
+        collection = AsyncMongoMockClient()["batcher"]["items"]
+        batcher = InsertBatcher(window_ms=60000)
+        pending = [asyncio.ensure_future(batcher.insert(collection, {"n": n})) for n in range(3)]
+        await asyncio.sleep(0)
+        started = time.monotonic()
+        await batcher.drain()
+        await asyncio.gather(*pending)
+        return time.monotonic() - started, await collection.count_documents({})
+
+    elapsed, stored = asyncio.run(scenario())
+    assert stored == 3 and elapsed < 1
+
+
+async def insert_with_deadline(batcher, collection, seconds):
+    if seconds is not None:
+        request_deadline.set(time.monotonic() + seconds)
+    with pymongo.timeout(seconds):
+        return await batcher.insert(collection, {"deadline": seconds})
+
+
+def test_batch_runs_under_the_loosest_deadline():
+    async def scenario(deadlines):
+        collection = RecordingCollection(AsyncMongoMockClient()["batcher"]["items"])
+        batcher = InsertBatcher(window_ms=20)
+        await asyncio.gather(*(insert_with_deadline(batcher, collection, seconds) for seconds in deadlines))
+        return collection.timeouts
+
+    [timeout] = asyncio.run(scenario([2, 30, 10]))
+    assert timeout == pytest.approx(30, abs=0.5)
+    assert asyncio.run(scenario([2, None])) == [None]
+
+
+def test_a_short_deadline_only_times_out_its_own_caller():
+    async def scenario():
+        collection = AsyncMongoMockClient()["batcher"]["items"]
+        batcher = InsertBatcher(window_ms=100)
+        outcomes = await asyncio.gather(
+            *(insert_with_deadline(batcher, collection, seconds) for seconds in (30, 0.01, 30)),
+            return_exceptions=True
+        )
+        return outcomes, await collection.count_documents({})
+
+    (first, short, last), stored = asyncio.run(scenario())
+    assert isinstance(short, ExecutionTimeout) and short.timeout
+    assert not isinstance(first, Exception) and not isinstance(last, Exception)
+    # The timed-out caller's document is written with the rest of the batch
+    assert stored == 3
@@ -0,0 +1,74 @@
+from datetime import date, datetime, timedelta, timezone
+
+import ledger
+import server
+
+
+def post(api, token, transaction_type, amount):
+    response = api.request("POST", "/api/financials", token=token, json={
+        "transaction_type": transaction_type, "amount": amount, "description": transaction_type,
+    })
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_balance_comes_from_running_totals_and_checkpoints(api, tenant, monkeypatch):
+    admin = api.register("company_admin", tenant["company"]["id"])["access_token"]
+    monkeypatch.setattr(server.ledger, "checkpoint_interval", 2)
+    for amount in (1000, 250, 500, 125, 400):
+        post(api, admin, "premium_payment" if amount >= 400 else "claim_payout", amount)
+
+    current = api.request("GET", "/api/financials/balance", token=admin)
+    assert current.json()["sequence"] == 5
+    assert current.json()["net_balance"] == 1900 - 375
+    assert len(api.last_commands) <= 3, api.last_commands
+
+    today = api.request("GET", f"/api/financials/balance?as_of={date.today().isoformat()}", token=admin).json()
+    assert {k: today[k] for k in ("sequence", "total_premiums", "total_payouts")} == {"sequence": 5, "total_premiums": 1900, "total_payouts": 375}
+    assert len(api.last_commands) <= 3, api.last_commands
+
+    yesterday = (date.today() - timedelta(days=1)).isoformat()
+    assert api.request("GET", f"/api/financials/balance?as_of={yesterday}", token=admin).json()["net_balance"] == 0
+
+    stats = api.request("GET", "/api/dashboard/stats", token=admin).json()
+    assert stats["net_balance"] == 1525
+
+
+def test_balances_are_derived_from_entries(api, tenant, monkeypatch):
+    admin = api.register("company_admin", tenant["company"]["id"])["access_token"]
+    company_id = tenant["company"]["id"]
+    monkeypatch.setattr(server.ledger, "checkpoint_interval", 2)
+    for amount in (1000, 500, 400, 800):
+        post(api, admin, "premium_payment", amount)
+    checkpoints = api.client.portal.call(server.db.ledger_checkpoints.find({"company_id": company_id}).to_list, None)
+    assert [(c["sequence"], c["total_premiums_cents"]) for c in checkpoints] == [(2, 150000)]
+
+    # A post that took its sequence but never inserted its entry
+    api.client.portal.call(server.db.ledger_accounts.update_one, {"company_id": company_id}, {"$inc": {"sequence": 1}})
+    assert api.client.portal.call(server.ledger.current_balance, company_id)["total_premiums"] == 2700
+
+    # An entry sequenced after the checkpoint but dated before it still
+    # counts towards balances as of the checkpoint's date
+    checkpoint_date = checkpoints[0]["transaction_date"]
+    api.client.portal.call(server.db.financials.update_one, {"company_id": company_id, "sequence": 3}, {"$set": {
+        "transaction_date": checkpoint_date - timedelta(seconds=1),
+    }})
+    balance = api.client.portal.call(server.ledger.balance_as_of, company_id, checkpoint_date)
+    assert balance["total_premiums"] == 1900
+
+
+def test_rebuild_numbers_legacy_entries(api, tenant):
+    company_id = tenant["company"]["id"]
+    legacy = [
+        {"id": f"f{i}", "company_id": company_id, "transaction_type": "premium_payment", "amount": 100.0,
+         "description": "legacy", "transaction_date": f"2024-01-0{i}T00:00:00+00:00"}
+        for i in range(1, 6)
+    ]
+    api.client.portal.call(server.db.financials.insert_many, legacy)
+
+    api.client.portal.call(ledger.rebuild_ledger, server.db, 2)
+    balance = api.client.portal.call(server.ledger.balance_as_of, company_id, datetime(2024, 1, 3, 23, 59, tzinfo=timezone.utc))
+
+    assert balance["sequence"] == 3
+    assert balance["total_premiums"] == 300
+    assert api.client.portal.call(server.ledger.current_balance, company_id)["total_premiums"] == 500
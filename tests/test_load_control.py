@@ -0,0 +1,74 @@
+import asyncio
+import time
+
+from pymongo.errors import ExecutionTimeout
+
+import server
+from load_control import RouteClass
+
+
+def test_route_classes():
+    assert server.route_class_for("POST", "/api/auth/login") == "auth"
+    assert server.route_class_for("GET", "/api/dashboard/stats") == "analytics"
+    assert server.route_class_for("POST", "/api/reports") == "analytics"
+    assert server.route_class_for("PATCH", "/api/claims/abc") == "writes"
+    assert server.route_class_for("GET", "/api/claims") == "reads"
+
+
+def test_queued_requests_are_admitted_in_order_and_shed_at_deadline():
+    async def scenario():
+        route = RouteClass("reads", max_concurrency=1, deadline_ms=1000)
+        deadline = time.monotonic() + 1
+        assert await route.acquire(deadline)
+        second = asyncio.ensure_future(route.acquire(deadline))
+        await asyncio.sleep(0)
+        assert route.metrics()["queued"] == 1
+
+        route.release()
+        assert await second
+        assert route.in_flight == 1
+
+        assert not await route.acquire(time.monotonic() + 0.01)
+        assert route.metrics()["queued"] == 0
+        route.release()
+        assert route.in_flight == 0
+        return route.metrics()
+
+    metrics = asyncio.run(scenario())
+    assert (metrics["admitted"], metrics["shed"]) == (2, 1)
+
+
+def test_sustained_queueing_sheds_without_waiting_until_a_fast_admission():
+    async def scenario():
+        route = RouteClass("writes", max_concurrency=1, deadline_ms=1000, queue_target_ms=1, queue_interval_ms=5)
+        deadline = time.monotonic() + 1
+        await route.acquire(deadline)
+        for _ in range(2):
+            waiter = asyncio.ensure_future(route.acquire(deadline))
+            await asyncio.sleep(0.01)
+            route.release()
+            await waiter
+        assert route.overloaded
+
+        started = time.monotonic()
+        assert not await route.acquire(deadline)
+        assert time.monotonic() - started < 0.01
+
+        route.release()
+        assert await route.acquire(deadline)
+        assert not route.overloaded
+
+    asyncio.run(scenario())
+
+
+def test_database_deadline_maps_to_503(api, tenant, monkeypatch):
+    async def slow_partner(partner_id):
+        raise ExecutionTimeout("operation exceeded time limit", 50)
+    monkeypatch.setattr(server, "find_partner", slow_partner)
+    timeouts = server.load_controller.route_classes["reads"].timeouts
+
+    response = api.request("GET", f"/api/wellness-partners/{tenant['partner']['id']}", token=tenant["employee"])
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert server.load_controller.route_classes["reads"].timeouts == timeouts + 1
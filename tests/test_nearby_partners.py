@@ -0,0 +1,54 @@
+import os
+
+import pytest
+
+# (name, service_type, [lng, lat], service radius in km)
+PARTNERS = [
+    ("Harbour Gym", "gym", [-0.0870, 51.5050], None),
+    ("Bridge Gym", "gym", [-0.0760, 51.5080], 2),
+    ("Camden Gym", "gym", [-0.1430, 51.5390], 1),
+    ("Oxford Gym", "gym", [-1.2577, 51.7520], None),
+    ("Borough Therapy", "mental_health", [-0.0900, 51.5030], None),
+]
+
+
+def create_partner(api, token, name, service_type, coordinates, radius_km):
+    response = api.request("POST", "/api/wellness-partners", token=token, json={
+        "name": name,
+        "service_type": service_type,
+        "description": name,
+        "contact_email": "partner@example.com",
+        "contact_phone": "5550102",
+        "availability": "Daily",
+        "pricing": "Free",
+        "location": {"type": "Point", "coordinates": coordinates},
+        "service_radius_km": radius_km,
+    })
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_partner_location_is_validated(api, tenant):
+    response = api.request("POST", "/api/wellness-partners", token=tenant["admin"], json={
+        "name": "Nowhere Gym", "service_type": "gym", "description": "", "contact_email": "gym@example.com",
+        "contact_phone": "5550103", "availability": "", "pricing": "",
+        "location": {"type": "Point", "coordinates": [51.5, -190]},
+    })
+
+    assert response.status_code == 422
+
+
+@pytest.mark.skipif(not os.environ.get("TEST_MONGO_URL"), reason="$geoNear needs a real MongoDB")
+def test_nearby_partners_are_ordered_filtered_and_paginated(api, tenant):
+    for partner in PARTNERS:
+        create_partner(api, tenant["admin"], *partner)
+
+    url = "/api/wellness-partners/nearby?lng=-0.0877&lat=51.5055&service_type=gym&max_distance_km=20"
+    first = api.request("GET", url + "&limit=1", token=tenant["employee"]).json()
+    both = api.request("GET", url, token=tenant["employee"]).json()
+    second = api.request("GET", url + "&limit=1&offset=1", token=tenant["employee"]).json()
+
+    # Camden Gym is within 20 km but its 1 km service radius does not reach the point
+    assert [p["name"] for p in both] == ["Harbour Gym", "Bridge Gym"]
+    assert both[0]["distance_km"] < both[1]["distance_km"]
+    assert [first[0]["name"], second[0]["name"]] == ["Harbour Gym", "Bridge Gym"]
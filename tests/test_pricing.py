@@ -0,0 +1,53 @@
+from datetime import date
+
+import server
+from pricing import UNKNOWN_AGE_BAND, PricingEngine, RosterSnapshot, age_bands, parse_birth_dates
+
+
+def test_age_band_edges():
+    as_of = date(2026, 3, 1)
+    births = parse_birth_dates(["2000-03-01", "2000-03-02", "1960-03-01", "1960-03-02", "not a date", "2027-01-01", None])
+
+    # Turning 26 or 66 on as_of moves an employee into the next band
+    assert age_bands(births, as_of).tolist() == [1, 0, 5, 4, UNKNOWN_AGE_BAND, UNKNOWN_AGE_BAND, UNKNOWN_AGE_BAND]
+    # Born on Feb 29: a year older on Mar 1 of non-leap years
+    leapling = parse_birth_dates(["2000-02-29"])
+    assert age_bands(leapling, date(2026, 2, 28)).tolist() == [0]
+    assert age_bands(leapling, date(2026, 3, 1)).tolist() == [1]
+
+
+def test_last_change_per_employee_wins():
+    snapshot = RosterSnapshot(1, date(2026, 3, 1), {"a": 1, "b": 2})
+    snapshot.apply([
+        {"roster_version": 2, "employee_id": "a", "action": "upsert", "status": "active", "date_of_birth": "1990-01-01"},
+        {"roster_version": 3, "employee_id": "a", "action": "upsert", "status": "active", "date_of_birth": "1950-01-01"},
+        {"roster_version": 4, "employee_id": "b", "action": "upsert", "status": "active", "date_of_birth": "1990-01-01"},
+        {"roster_version": 5, "employee_id": "b", "action": "delete"},
+    ])
+
+    assert snapshot.member_bands == {"a": 5}
+    assert snapshot.band_counts.tolist() == [0, 0, 0, 0, 0, 1]
+    assert snapshot.roster_version == 5
+
+
+def test_incremental_requote_matches_full_reload(api, tenant):
+    hr = tenant["hr"]
+    for name in ("Second Employee", "Third Employee"):
+        api.register("employee", tenant["company"]["id"], name=name)
+    employees = api.request("GET", "/api/employees", token=hr).json()
+    assert api.request("GET", "/api/pricing/quote", token=hr).json()["employee_count"] == len(employees)
+
+    for date_of_birth in ("1990-05-01", "1955-05-01"):
+        response = api.request("PATCH", f"/api/employees/{employees[0]['id']}", token=hr, json={"date_of_birth": date_of_birth})
+        assert response.status_code == 200, response.text
+    api.request("PATCH", f"/api/employees/{employees[1]['id']}", token=hr, json={"date_of_birth": "1980-05-01"})
+    api.request("DELETE", f"/api/employees/{employees[1]['id']}", token=hr)
+
+    incremental = api.request("GET", "/api/pricing/quote", token=hr).json()
+    assert [c for c in api.last_commands if "employees" in c] == []
+    company = api.client.portal.call(server.db.companies.find_one, {"id": tenant["company"]["id"]}, {"_id": 0})
+    reloaded = api.client.portal.call(PricingEngine(server.db).quote, company)
+
+    assert incremental == reloaded
+    assert incremental["employee_count"] == len(employees) - 1
+    assert incremental["bands"][-1]["employees"] == 1
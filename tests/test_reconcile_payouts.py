@@ -0,0 +1,103 @@
+from datetime import timedelta
+
+import reconcile_payouts
+import server
+from typed_storage import utc_now
+
+
+def test_approval_posts_one_payout(api, tenant):
+    claim = api.request("POST", "/api/claims", token=tenant["employee"], json={
+        "claim_type": "dental", "amount": 75.25, "description": "Filling",
+    }).json()
+    approved = api.request("PUT", f"/api/claims/{claim['id']}", token=tenant["hr"], json={"status": "approved"}).json()
+    api.request("PUT", f"/api/claims/{claim['id']}", token=tenant["hr"], json={"status": "approved", "reviewer_notes": "Again"})
+
+    payouts = api.client.portal.call(server.db.financials.find({"reference_id": claim["id"]}, {"_id": 0}).to_list, None)
+    assert [(p["id"], p["transaction_type"], p["amount_cents"]) for p in payouts] == [(approved["payout_id"], "claim_payout", 7525)]
+    balance = api.request("GET", "/api/financials/balance", token=tenant["hr"]).json()
+    assert balance["total_payouts"] == 75.25
+
+
+def test_reapproving_a_paid_claim_pays_nothing(api, tenant):
+    call = api.client.portal.call
+    company_id = tenant["company"]["id"]
+    # Approved and paid before approvals posted payouts: no payout_id
+    call(server.db.claims.insert_one, {
+        "id": "legacy", "employee_id": "e1", "company_id": company_id, "claim_type": "vision", "amount_cents": 4000,
+        "description": "Glasses", "status": "approved", "documents": [], "submission_date": utc_now(),
+        "review_date": utc_now(), "version": 1,
+    })
+    call(server.db.financials.insert_one, {
+        "id": "legacy-payout", "company_id": company_id, "transaction_type": "claim_payout", "amount_cents": 4000,
+        "description": "Payout", "reference_id": "legacy", "transaction_date": utc_now(),
+    })
+
+    response = api.request("PUT", "/api/claims/legacy", token=tenant["hr"], json={"status": "approved", "reviewer_notes": "Checked"})
+    assert response.status_code == 200, response.text
+    assert call(server.db.financials.count_documents, {"reference_id": "legacy"}) == 1
+
+    # A claim paid on approval is not paid again after a rejection
+    claim = api.request("POST", "/api/claims", token=tenant["employee"], json={
+        "claim_type": "dental", "amount": 20.0, "description": "Filling",
+    }).json()
+    for status in ("approved", "rejected", "approved"):
+        api.request("PUT", f"/api/claims/{claim['id']}", token=tenant["hr"], json={"status": status})
+    assert call(server.db.financials.count_documents, {"reference_id": claim["id"]}) == 1
+
+
+def test_reconciliation_reports_and_repairs_mismatches(api, tenant):
+    call = api.client.portal.call
+    company_id = tenant["company"]["id"]
+    reviewed = utc_now() - timedelta(days=30)
+    base = {"employee_id": "e1", "company_id": company_id, "claim_type": "vision", "description": "Glasses",
+            "status": "approved", "review_date": reviewed, "submission_date": reviewed}
+
+    def payout(entry_id, claim_id, cents):
+        return {"id": entry_id, "company_id": company_id, "transaction_type": "claim_payout", "amount_cents": cents,
+                "description": "Payout", "reference_id": claim_id, "transaction_date": reviewed}
+
+    call(server.db.claims.insert_many, [
+        {**base, "id": "matched", "amount_cents": 1000},
+        {**base, "id": "twice", "amount_cents": 2000},
+        {**base, "id": "short", "amount_cents": 3000},
+        {**base, "id": "recent", "amount_cents": 500, "review_date": utc_now()},
+        {**base, "id": "rejected", "amount_cents": 800, "status": "rejected"},
+    ])
+    call(server.db.claims_archive.insert_many, [{**base, "id": "archived", "amount": 40.0}])
+    call(server.db.financials.insert_many, [
+        payout("p1", "matched", 1000), payout("p2", "twice", 2000), payout("p3", "twice", 2000),
+        payout("p4", "short", 2500), payout("p5", "rejected", 800),
+    ])
+
+    found = []
+    counts = call(reconcile_payouts.reconcile_payouts, server.db, 2, company_id, found.append, utc_now() - timedelta(minutes=10))
+    assert {k: counts.get(k, 0) for k in ("claims", "missing", "duplicate", "amount", "orphan", "repaired")} == {
+        "claims": 5, "missing": 2, "duplicate": 1, "amount": 2, "orphan": 1, "repaired": 1,
+    }
+    assert {(f["kind"], f["claim_id"]) for f in found} == {
+        ("missing", "recent"), ("missing", "archived"), ("duplicate", "twice"), ("amount", "twice"),
+        ("amount", "short"), ("orphan", "rejected"),
+    }
+
+    # The archived claim was paid; the recently reviewed one is left to the API
+    repaired = call(server.db.financials.find_one, {"reference_id": "archived"})
+    assert repaired["amount_cents"] == 4000 and repaired["sequence"] == 1
+    assert call(server.db.claims_archive.find_one, {"id": "archived"})["payout_id"] == repaired["id"]
+    again = call(reconcile_payouts.reconcile_payouts, server.db, 2, company_id)
+    assert again.get("missing") == 1 and "repaired" not in again
+
+
+def test_a_payout_is_posted_once(api, tenant):
+    call = api.client.portal.call
+    claim = api.request("POST", "/api/claims", token=tenant["employee"], json={
+        "claim_type": "dental", "amount": 30.0, "description": "Checkup",
+    }).json()
+    approved = api.request("PUT", f"/api/claims/{claim['id']}", token=tenant["hr"], json={"status": "approved"}).json()
+
+    # A repair that read the claim before the API posted its payout
+    stored = call(server.db.claims.find_one, {"id": claim["id"]}, {"_id": 0})
+    assert call(reconcile_payouts.repair_missing_payout, server.db.claims, server.ledger, stored) is False
+
+    assert call(server.db.financials.count_documents, {"reference_id": claim["id"]}) == 1
+    assert call(server.db.financials.find_one, {"reference_id": claim["id"]})["id"] == approved["payout_id"]
+    assert api.request("GET", "/api/financials/balance", token=tenant["hr"]).json()["total_payouts"] == 30.0
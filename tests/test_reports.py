@@ -0,0 +1,188 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import mongomock
+import pandas as pd
+import pytest
+
+import reports
+import server
+
+FORMATS = ["csv", "xlsx", "parquet"]
+
+
+def read_report(path, fmt: str) -> pd.DataFrame:
+    if fmt == "xlsx":
+        return pd.read_excel(path, engine="openpyxl")
+    if fmt == "parquet":
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
+
+
+def claim(claim_id: str, employee_id: str, cents: int, status: str, day: int) -> dict:
+    submitted = datetime(2024, 3, day, 9, tzinfo=timezone.utc)
+    return {
+        "id": claim_id, "company_id": "acme", "employee_id": employee_id, "claim_type": "medical",
+        "amount_cents": cents, "status": status, "submission_date": submitted,
+        "review_date": submitted if status == "approved" else None, "version": 1,
+    }
+
+
+@pytest.fixture
+def report_db():
+    db = mongomock.MongoClient()["reports"]
+    db.companies.insert_one({"id": "acme", "roster_version": 3})
+    db.companies.insert_one({"id": "empty", "roster_version": 0})
+    db.employees.insert_many([
+        {"id": "e1", "company_id": "acme", "department": "Engineering"},
+        {"id": "e2", "company_id": "acme", "department": "Sales"},
+    ])
+    db.claims.insert_many([
+        claim("c1", "e1", 10000, "approved", 1),
+        claim("c2", "e2", 2550, "pending", 20),
+    ])
+    db.claims_archive.insert_one(claim("c0", "e1", 5000, "approved", 2))
+    db.financials.insert_many([
+        {"id": "f1", "company_id": "acme", "transaction_type": "premium_payment", "amount_cents": 50000,
+         "transaction_date": datetime(2024, 3, 1, tzinfo=timezone.utc)},
+        {"id": "f2", "company_id": "acme", "transaction_type": "claim_payout", "amount_cents": 15000,
+         "transaction_date": datetime(2024, 3, 3, tzinfo=timezone.utc)},
+    ])
+    db.wellness_partners.insert_one({"id": "p1", "name": "Downtown Gym"})
+    db.bookings.insert_many([
+        {"id": "b1", "employee_id": "e1", "partner_id": "p1", "service_type": "gym", "status": "confirmed", "booking_date": "2024-03-05"},
+        {"id": "b2", "employee_id": "e2", "partner_id": "p1", "service_type": "gym", "status": "cancelled", "booking_date": "2024-04-05"},
+    ])
+    return db
+
+
+@pytest.mark.parametrize("fmt", FORMATS)
+@pytest.mark.parametrize("report_type", reports.REPORT_TYPES)
+def test_every_report_builds_in_every_format(report_db, tmp_path, report_type, fmt):
+    path = tmp_path / f"{report_type}.{fmt}"
+    reports.render_report(report_db, report_type, fmt, "acme", {}, str(path))
+    assert len(read_report(path, fmt)) > 0
+
+    empty = tmp_path / f"empty.{fmt}"
+    reports.render_report(report_db, report_type, fmt, "empty", {}, str(empty))
+    assert empty.exists()
+    assert not list(tmp_path.glob("*.tmp.*"))
+
+
+def test_claim_reports_include_archived_claims(report_db):
+    by_department = reports.claims_by_department(report_db, "acme", {}).set_index(["department", "status"])
+    assert by_department.loc[("Engineering", "approved"), "claims"] == 2
+    assert by_department.loc[("Engineering", "approved"), "total_amount"] == 150.0
+
+    payouts = reports.premium_vs_payout(report_db, "acme", {}).set_index("month")
+    assert payouts.loc["2024-03"].to_dict() == {
+        "premiums": 500.0, "payouts": 150.0, "approved_claims": 150.0, "net_balance": 350.0,
+    }
+
+
+def test_date_range_includes_the_whole_end_day(report_db):
+    march_first = {"start_date": "2024-03-01", "end_date": "2024-03-01"}
+    by_department = reports.claims_by_department(report_db, "acme", march_first)
+    assert by_department[["department", "status", "claims"]].values.tolist() == [["Engineering", "approved", 1]]
+
+    bookings = reports.wellness_utilization(report_db, "acme", {"start_date": "2024-04-01"})
+    assert bookings["status"].tolist() == ["cancelled"]
+
+
+def test_archiving_a_claim_moves_the_watermark(api, tenant):
+    api.request("POST", "/api/claims", token=tenant["employee"], json={
+        "claim_type": "medical", "amount": 40.0, "description": "Checkup",
+    })
+    api.client.portal.call(server.insert_batcher.drain)
+    company_id = tenant["company"]["id"]
+    before = api.client.portal.call(reports.data_watermark, server.db, "claims_by_department", company_id)
+
+    stored = api.client.portal.call(server.db.claims.find_one, {"company_id": company_id}, {"_id": 0})
+    api.client.portal.call(server.db.claims_archive.insert_one, stored)
+    api.client.portal.call(server.db.claims.delete_one, {"id": stored["id"]})
+
+    after = api.client.portal.call(reports.data_watermark, server.db, "claims_by_department", company_id)
+    assert before != after
+
+
+def wait_for_job(api, token, job_id) -> dict:
+    for _ in range(100):
+        job = api.request("GET", f"/api/reports/{job_id}", token=token).json()
+        if job["status"] not in ("queued", "running"):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"Report job {job_id} did not finish")
+
+
+def test_same_report_is_served_from_cache(api, tenant, monkeypatch):
+    builds = []
+
+    def build_report(mongo_url, db_name, report_type, fmt, company_id, params, path):
+        builds.append(report_type)
+        pd.DataFrame({"report": [report_type]}).to_csv(path, index=False)
+        return path
+
+    monkeypatch.setattr(server, "get_report_pool", lambda: ThreadPoolExecutor(max_workers=1))
+    monkeypatch.setattr(reports, "build_report", build_report)
+    request = {"report_type": "claims_by_department", "format": "csv", "start_date": "2024-01-01", "end_date": "2024-12-31"}
+
+    first = api.request("POST", "/api/reports", token=tenant["hr"], json=request).json()
+    assert wait_for_job(api, tenant["hr"], first["id"])["status"] == "completed"
+    download = api.request("GET", f"/api/reports/{first['id']}/download", token=tenant["hr"])
+    assert download.status_code == 200
+    assert download.headers["content-type"].startswith("text/csv")
+
+    again = api.request("POST", "/api/reports", token=tenant["hr"], json=request).json()
+    assert again["status"] == "completed" and again["cache_key"] == first["cache_key"]
+    assert builds == ["claims_by_department"]
+    stored = api.client.portal.call(server.db.report_jobs.find_one, {"id": again["id"]})
+    assert isinstance(stored["created_at"], datetime) and stored["completed_at"] == stored["created_at"]
+
+    # New data means a new report
+    api.request("POST", "/api/claims", token=tenant["employee"], json={
+        "claim_type": "medical", "amount": 40.0, "description": "Checkup",
+    })
+    api.client.portal.call(server.insert_batcher.drain)
+    changed = api.request("POST", "/api/reports", token=tenant["hr"], json=request).json()
+    assert changed["cache_key"] != first["cache_key"]
+    assert wait_for_job(api, tenant["hr"], changed["id"])["status"] == "completed"
+    assert len(builds) == 2
+
+
+def test_department_change_moves_the_watermark(api, tenant):
+    company_id = tenant["company"]["id"]
+    employee_id = api.request("GET", "/api/employees", token=tenant["hr"]).json()[0]["id"]
+    before = api.client.portal.call(reports.data_watermark, server.db, "claims_by_department", company_id)
+
+    response = api.request("PATCH", f"/api/employees/{employee_id}", token=tenant["hr"], json={"department": "Finance"})
+    assert response.status_code == 200, response.text
+
+    after = api.client.portal.call(reports.data_watermark, server.db, "claims_by_department", company_id)
+    assert after != before and after["roster_version"] == before["roster_version"]
+
+
+def test_invalid_dates_are_rejected_at_submit(api, tenant):
+    for dates in ({"start_date": "2024-13-01"}, {"end_date": "soon"}, {"start_date": "2024-06-01", "end_date": "2024-05-01"}):
+        response = api.request("POST", "/api/reports", token=tenant["hr"], json={"report_type": "claims_by_department", "format": "csv", **dates})
+        assert response.status_code == 400, dates
+    assert api.client.portal.call(server.db.report_jobs.count_documents, {}) == 0
+
+
+def test_a_job_lost_with_its_worker_is_rebuilt(api, tenant, monkeypatch):
+    monkeypatch.setattr(server, "get_report_pool", lambda: ThreadPoolExecutor(max_workers=1))
+    monkeypatch.setattr(reports, "build_report", lambda *args: pd.DataFrame({"report": [1]}).to_csv(args[-1], index=False))
+    request = {"report_type": "wellness_utilization", "format": "csv", "start_date": "2023-01-01"}
+    company_id = tenant["company"]["id"]
+    watermark = api.client.portal.call(reports.data_watermark, server.db, "wellness_utilization", company_id)
+    key = reports.cache_key("wellness_utilization", "csv", company_id, {"start_date": "2023-01-01", "end_date": None}, watermark)
+    # Left running by a process that has since restarted
+    lost = server.ReportJob(company_id=company_id, requested_by="someone", report_type="wellness_utilization", format="csv",
+                            cache_key=key, status="running", updated_at=datetime(2024, 1, 1, tzinfo=timezone.utc))
+    api.client.portal.call(server.db.report_jobs.insert_one, lost.model_dump())
+
+    job = api.request("POST", "/api/reports", token=tenant["hr"], json=request).json()
+
+    assert job["id"] != lost.id and job["cache_key"] == key
+    assert wait_for_job(api, tenant["hr"], job["id"])["status"] == "completed"
+    assert api.client.portal.call(server.db.report_jobs.find_one, {"id": lost.id})["status"] == "failed"
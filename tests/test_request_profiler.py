@@ -0,0 +1,50 @@
+import asyncio
+import time
+
+from request_profiler import AWAIT_FRAME, ProfilingMiddleware, SamplingProfiler
+
+
+def test_profile_records_running_and_awaiting_stacks(tmp_path):
+    def spin(seconds):
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            pass
+
+    async def handler(scope, receive, send):
+        spin(0.03)
+        await asyncio.sleep(0.03)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    profiler = SamplingProfiler(tmp_path, interval_ms=1, max_files=1)
+    middleware = ProfilingMiddleware(handler, profiler, authorize=lambda headers: False, sample_rate=1.0)
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    async def request():
+        await middleware({"type": "http", "method": "GET", "path": "/api/dashboard", "headers": []}, None, send)
+    asyncio.run(request())
+    asyncio.run(request())
+
+    profiles = profiler.list_profiles()
+    assert len(profiles) == 1 and profiles[0]["status"] == 200
+    assert dict(sent[-2]["headers"])[b"x-profile-id"].decode() == profiles[0]["id"]
+    assert profiles[0]["cpu_ms"] > 0 and profiles[0]["waiting_ms"] > 0
+    folded = profiler.profile_path(profiles[0]["id"]).read_text()
+    assert any(line.split(";")[-1].startswith("test_profile_records_running_and_awaiting_stacks.<locals>.spin") for line in folded.splitlines())
+    assert any(line.rsplit(" ", 1)[0].endswith(AWAIT_FRAME) for line in folded.splitlines())
+
+
+def test_only_super_admins_can_request_a_profile(api, tenant):
+    headers = {"X-Profile": "1"}
+    assert "x-profile-id" not in api.request("GET", "/api/dashboard/stats", token=tenant["hr"], headers=dict(headers)).headers
+    response = api.request("GET", "/api/wellness-partners", token=tenant["admin"], headers=dict(headers))
+    profile_id = response.headers["x-profile-id"]
+
+    listed = api.request("GET", "/api/profiles", token=tenant["admin"]).json()
+    assert profile_id in [profile["id"] for profile in listed]
+    assert api.request("GET", f"/api/profiles/{profile_id}", token=tenant["admin"]).status_code == 200
+    assert api.request("GET", "/api/profiles", token=tenant["hr"]).status_code == 403
+    assert api.request("GET", "/api/profiles/..%2Fserver", token=tenant["admin"]).status_code == 404
@@ -0,0 +1,51 @@
+import json
+
+import server
+import tenant_archive
+
+
+def test_export_import_round_trip_and_resume(api, tenant, tmp_path):
+    company_id = tenant["company"]["id"]
+    for amount in (10, 20, 30):
+        api.request("POST", "/api/claims", token=tenant["employee"], json={
+            "claim_type": "medical", "amount": amount, "description": "Round trip",
+        })
+    api.request("POST", "/api/bookings", token=tenant["employee"], json={
+        "partner_id": tenant["partner"]["id"], "service_type": "gym", "booking_date": "2026-10-20", "booking_time": "09:00",
+    })
+    api.client.portal.call(server.insert_batcher.drain)
+    call = api.client.portal.call
+
+    def tenant_counts():
+        queries = call(tenant_archive.tenant_queries, server.db, company_id)
+        return {
+            name: sum([call(server.db[name].count_documents, q) for q in (query if isinstance(query, list) else [query])])
+            for name, query in queries.items()
+        }
+
+    before = tenant_counts()
+    manifest = call(tenant_archive.export_tenant, server.db, company_id, tmp_path, 2, 2, 3)
+    assert manifest["collections"]["claims"]["documents"] == 3
+    assert len(manifest["collections"]["claims"]["chunks"]) == 2
+
+    for name in tenant_archive.TENANT_COLLECTIONS:
+        call(server.db[name].delete_many, {})
+    # Simulate a run that completed the first claims chunk and died
+    first_chunk = manifest["collections"]["claims"]["chunks"][0]
+    (tmp_path / tenant_archive.IMPORT_PROGRESS).write_text(json.dumps([first_chunk]))
+    resumed = call(tenant_archive.import_tenant, server.db, tmp_path, True, 2, 3)
+    assert resumed["claims"] == 1
+
+    # A full re-run over existing documents skips the duplicates
+    call(tenant_archive.import_tenant, server.db, tmp_path, False, 2, 3)
+    after = tenant_counts()
+    assert after == before
+    claim = call(server.db.claims.find_one, {"company_id": company_id, "amount_cents": 1000})
+    assert claim is not None
+    assert before["claim_fingerprints"] == 3
+
+    # Duplicate detection carries over with the tenant
+    resubmitted = api.request("POST", "/api/claims", token=tenant["employee"], json={
+        "claim_type": "medical", "amount": 10, "description": "Round trip",
+    }).json()
+    assert resubmitted["duplicate_of"] == claim["id"]
@@ -0,0 +1,105 @@
+from datetime import datetime
+
+import migrate_storage
+import server
+
+
+def legacy_claim(company_id: str, employee_id: str) -> dict:
+    return {
+        "id": "legacy-claim",
+        "employee_id": employee_id,
+        "company_id": company_id,
+        "claim_type": "dental",
+        "amount": 80.1,
+        "description": "Written before typed storage",
+        "status": "approved",
+        "documents": [],
+        "submission_date": "2024-03-01T09:30:00.250000+00:00",
+        "review_date": "2024-03-02T10:00:00+00:00",
+        "version": 1,
+    }
+
+
+def test_new_writes_are_typed_and_api_shape_is_unchanged(api, tenant):
+    created = api.request("POST", "/api/claims", token=tenant["employee"], json={
+        "claim_type": "medical", "amount": 19.99, "description": "Typed",
+    }).json()
+    api.client.portal.call(server.insert_batcher.drain)
+
+    stored = api.client.portal.call(server.db.claims.find_one, {"id": created["id"]})
+    assert stored["amount_cents"] == 1999 and "amount" not in stored
+    assert isinstance(stored["submission_date"], datetime)
+
+    claim = api.request("GET", f"/api/claims/{created['id']}", token=tenant["hr"]).json()
+    assert claim["amount"] == 19.99
+    assert datetime.fromisoformat(claim["submission_date"]).utcoffset().total_seconds() == 0
+
+
+def test_create_responses_match_later_reads(api, tenant):
+    created = api.request("POST", "/api/claims", token=tenant["employee"], json={
+        "claim_type": "medical", "amount": 12.5, "description": "Precision",
+    }).json()
+    api.client.portal.call(server.insert_batcher.drain)
+    admin = api.register("company_admin", tenant["company"]["id"])["access_token"]
+    financial = api.request("POST", "/api/financials", token=admin, json={
+        "transaction_type": "premium_payment", "amount": 100.0, "description": "Premium",
+    }).json()
+
+    claim = api.request("GET", f"/api/claims/{created['id']}", token=tenant["hr"]).json()
+    listed = api.request("GET", "/api/financials", token=admin).json()
+
+    assert claim["submission_date"] == created["submission_date"]
+    assert datetime.fromisoformat(created["submission_date"]).microsecond % 1000 == 0
+    assert [entry["transaction_date"] for entry in listed] == [financial["transaction_date"]]
+    supplied = server.Financial(company_id="c1", transaction_type="premium_payment", amount=1, description="Premium",
+                                transaction_date="2024-03-01T09:30:00.123456+00:00")
+    assert supplied.transaction_date.microsecond == 123000
+
+def test_legacy_documents_read_the_same_before_and_after_migration(api, tenant):
+    employee_id = api.request("GET", "/api/employees", token=tenant["hr"]).json()[0]["id"]
+    api.client.portal.call(server.db.claims.insert_one, legacy_claim(tenant["company"]["id"], employee_id))
+    api.client.portal.call(server.db.claims_archive_stats.insert_one, {
+        "company_id": tenant["company"]["id"], "total_claims": 1, "approved_claims": 1, "rejected_claims": 0,
+        "total_claim_amount": 10.5, "approved_claim_amount": 10.5,
+    })
+
+    def snapshot():
+        claim = api.request("GET", "/api/claims/legacy-claim", token=tenant["hr"]).json()
+        stats = api.request("GET", "/api/dashboard/stats", token=tenant["hr"]).json()
+        claim.pop("version")
+        return claim, stats["total_claim_amount"]
+
+    before = snapshot()
+    for name in migrate_storage.TYPED_FIELDS:
+        api.client.portal.call(migrate_storage.migrate_collection, server.db, name, 1)
+    after = snapshot()
+
+    stored = api.client.portal.call(server.db.claims.find_one, {"id": "legacy-claim"})
+    assert stored["amount_cents"] == 8010 and isinstance(stored["review_date"], datetime)
+    assert before == after
+    assert after[0]["amount"] == 80.1
+    assert after[0]["submission_date"] == "2024-03-01T09:30:00.250000+00:00"
+    assert after[1] == 90.6
+    for name in migrate_storage.TYPED_FIELDS:
+        assert api.client.portal.call(migrate_storage.remaining_legacy, server.db, name) == 0
+
+
+def test_audit_and_roster_timestamps_are_typed(api, tenant):
+    employee_id = api.request("GET", "/api/employees", token=tenant["hr"]).json()[0]["id"]
+    for department in ("Sales", "Support"):
+        response = api.request("PATCH", f"/api/employees/{employee_id}", token=tenant["hr"], json={"department": department})
+        assert response.status_code == 200, response.text
+    api.client.portal.call(server.audit_log.flush)
+
+    change = api.client.portal.call(server.db.roster_changes.find_one, {"employee_id": employee_id})
+    assert isinstance(change["timestamp"], datetime)
+    events = api.client.portal.call(server.db.audit_log.find({"entity_id": employee_id}).to_list, None)
+    assert len(events) == 2 and all(isinstance(event["timestamp"], datetime) for event in events)
+
+    # The timestamp of the last event on a page is the cursor for the next
+    first_page = api.request("GET", f"/api/audit-log?entity_id={employee_id}&limit=1", token=tenant["hr"]).json()
+    next_page = api.request("GET", f"/api/audit-log?entity_id={employee_id}&limit=1", token=tenant["hr"],
+                            params={"before": first_page[0]["timestamp"]}).json()
+    assert first_page[0]["changes"]["department"] == "Support"
+    assert [event["changes"]["department"] for event in next_page] == ["Sales"]
+    assert api.request("GET", "/api/audit-log?before=yesterday", token=tenant["hr"]).status_code == 400